@@ -17,8 +17,8 @@ class ChatRequest(BaseModel):
     )
     context: Optional[Dict[str, Any]] = Field(
         None,
-        description="Optional context for the conversation",
-        example={"user_id": "12345", "session_id": "abc123"}
+        description="Optional context for the conversation; locale and expertise_level personalize the system prompt; prompt_variant (full or compact) picks its size",
+        example={"user_id": "12345", "session_id": "abc123", "locale": "en-GB", "expertise_level": "beginner"}
     )
     
     @validator('message')
@@ -38,6 +38,13 @@ class ChatResponse(BaseModel):
     timestamp: str = Field(..., description="Response timestamp")
     validation: Optional[Dict[str, Any]] = Field(None, description="Response validation details")
 
+class AutoChatResponse(ChatResponse):
+    """Response model for automatically routed chatbot interactions"""
+    routing: Dict[str, Any] = Field(
+        ...,
+        description="Chatbot chosen by the local intent router, with confidence and alternatives"
+    )
+
 class BatchChatRequest(BaseModel):
     """Request model for batch chatbot interactions"""
     requests: List[Dict[str, Any]] = Field(
@@ -66,6 +73,7 @@ class HealthCheckResponse(BaseModel):
     healthy_chatbots: int = Field(..., description="Number of healthy chatbots")
     uptime: str = Field(..., description="System uptime")
     timestamp: str = Field(..., description="Health check timestamp")
+    details: Optional[Dict[str, Dict[str, Any]]] = Field(None, description="Recent traffic, last probe and reason behind each chatbot's status")
 
 class MetricsResponse(BaseModel):
     """Metrics response model"""
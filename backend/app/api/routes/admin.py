@@ -0,0 +1,179 @@
+"""
+FastAPI routes for operator endpoints
+"""
+
+from fastapi import APIRouter, HTTPException, status, Depends, Header, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
+from chatbots import get_prompt_registry, reload_chatbot_prompts
+from core.request_samples import request_samples
+from core.loop_monitor import loop_monitor
+from core.profiling import cpu_profiler, memory_profiler, collapsed_stacks, parse_key_type
+from config import settings
+from typing import Optional
+import logging
+import secrets
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Allow the request only with the configured admin token; hide the endpoints when none is set"""
+    if not settings.admin_token:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, settings.admin_token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid admin token")
+
+# Create router
+router = APIRouter(prefix="/api/admin", tags=["Admin"], dependencies=[Depends(require_admin)])
+
+@router.get("/prompts", summary="Loaded Prompts")
+async def get_prompts():
+    """
+    Loaded Prompts
+    
+    Returns the prompt registry version and where each chatbot's prompt came from.
+    """
+    registry = get_prompt_registry()
+    return {
+        "version": registry.version,
+        "prompt_dir": settings.prompt_dir,
+        "tokenizer": registry.tokenizer,
+        "chatbots": {
+            entry.chatbot_type: {
+                "source": entry.source,
+                "description": entry.description,
+                "prompt_tokens": entry.token_count,
+                "compact_prompt_tokens": entry.compact_token_count
+            }
+            for entry in registry
+        }
+    }
+
+@router.post("/prompts/reload", summary="Reload Prompts")
+def reload_prompts():
+    """
+    Reload Prompts
+    
+    Re-reads the prompt directory and swaps in rebuilt chains for changed chatbots only.
+    Requests already in progress finish on the chains they started with. Runs in the
+    threadpool since it reads files and builds chains.
+    """
+    if not settings.prompt_dir:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="PROMPT_DIR is not configured")
+    try:
+        result = reload_chatbot_prompts()
+    except (OSError, ValueError) as e:
+        logger.error(f"Prompt reload failed: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Prompt reload failed: {str(e)}")
+    return {**result, "timestamp": datetime.now().isoformat()}
+
+@router.get("/debug/requests", summary="Slow and Failed Requests")
+async def get_request_samples(limit: int = Query(50, ge=1, le=500), chatbot_type: Optional[str] = None):
+    """
+    Slow and Failed Requests
+    
+    The slowest chat requests of each five-minute slot over the last hour, slowest first,
+    and the most recent failed requests, newest first. Each has its stage breakdown,
+    chatbot, model, token counts, trace id when traced, and the start of the message.
+    Samples are kept in memory by the worker that served them.
+    """
+    return {**request_samples.get_samples(limit, chatbot_type), "timestamp": datetime.now().isoformat()}
+
+@router.get("/debug/event-loop", summary="Event Loop Lag")
+async def get_event_loop_status():
+    """
+    Event Loop Lag
+    
+    How late this worker's event loop runs scheduled callbacks (percentiles over all
+    time and the last one and five minutes). With LOOP_BLOCK_THRESHOLD_SECONDS set, also
+    the most recent callbacks that blocked the loop longer than that, each with a stack
+    sample of the blocking code, innermost frame last.
+    """
+    return {**loop_monitor.get_status(), "timestamp": datetime.now().isoformat()}
+
+def profiling_error(e: Exception) -> HTTPException:
+    """A bad argument is a 400; a profile already running (or not started) is a 409"""
+    if isinstance(e, ValueError):
+        return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+@router.get("/debug/profile/cpu", summary="CPU Profile", response_class=PlainTextResponse)
+def get_cpu_profile(seconds: float = 10.0, interval_ms: float = 10.0, include_idle: bool = False,
+                    format: str = Query("collapsed", pattern="^(collapsed|json)$")):
+    """
+    CPU Profile
+    
+    Samples the stacks of every thread in this worker for `seconds` and returns collapsed
+    stacks ("thread;outer;...;inner count" per line) for flamegraph.pl or speedscope, or
+    JSON with format=json. Runs in the threadpool so the event loop is sampled too. Only
+    one profile runs at a time; a second request gets 409.
+    """
+    try:
+        profile = cpu_profiler.profile(seconds, interval_ms / 1000, include_idle)
+    except (ValueError, RuntimeError) as e:
+        raise profiling_error(e)
+    if format == "json":
+        return JSONResponse({**profile, "stacks": dict(profile["stacks"].most_common())})
+    return PlainTextResponse(collapsed_stacks(profile), headers={
+        "X-Profile-Samples": str(profile["samples"]),
+        "X-Profile-Seconds": f"{profile['seconds']:.3f}"
+    })
+
+@router.get("/debug/memory", summary="Memory Tracing Status")
+async def get_memory_status():
+    """
+    Memory Tracing Status
+    
+    Whether tracemalloc is tracing, since when, and how much memory it currently tracks.
+    """
+    return memory_profiler.get_status()
+
+@router.post("/debug/memory/start", summary="Start Memory Tracing")
+def start_memory_tracing(frames: int = 10):
+    """
+    Start Memory Tracing
+    
+    Starts tracemalloc with `frames` frames per allocation. Every allocation is slower
+    while tracing, so it stops by itself after MEMORY_TRACE_MAX_SECONDS.
+    """
+    try:
+        memory_profiler.start(frames)
+    except (ValueError, RuntimeError) as e:
+        raise profiling_error(e)
+    return memory_profiler.get_status()
+
+@router.post("/debug/memory/snapshot", summary="Memory Snapshot")
+def take_memory_snapshot(group_by: str = "lineno", limit: int = Query(25, ge=1, le=500)):
+    """
+    Memory Snapshot
+    
+    Takes a snapshot of traced allocations, keeps it as the baseline for diffs, and
+    returns the largest allocation sites grouped by lineno, filename or traceback.
+    """
+    try:
+        return memory_profiler.snapshot(parse_key_type(group_by), limit)
+    except (ValueError, RuntimeError) as e:
+        raise profiling_error(e)
+
+@router.get("/debug/memory/diff", summary="Memory Growth")
+def get_memory_diff(group_by: str = "lineno", limit: int = Query(25, ge=1, le=500), rebase: bool = False):
+    """
+    Memory Growth
+    
+    Compares current allocations with the baseline snapshot, largest growth first. With
+    rebase=true the current snapshot becomes the new baseline.
+    """
+    try:
+        return memory_profiler.diff(parse_key_type(group_by), limit, rebase)
+    except (ValueError, RuntimeError) as e:
+        raise profiling_error(e)
+
+@router.post("/debug/memory/stop", summary="Stop Memory Tracing")
+def stop_memory_tracing():
+    """
+    Stop Memory Tracing
+    
+    Stops tracemalloc and drops the baseline snapshot.
+    """
+    memory_profiler.stop()
+    return memory_profiler.get_status()
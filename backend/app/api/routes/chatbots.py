@@ -3,10 +3,11 @@ FastAPI routes for all chatbot endpoints
 """
 
 from fastapi import APIRouter, HTTPException, status, Depends
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from api.models.schemas import (
     ChatRequest, 
     ChatResponse, 
+    AutoChatResponse,
     BatchChatRequest, 
     BatchChatResponse,
     HealthCheckResponse,
@@ -16,12 +17,20 @@ from api.models.schemas import (
 from chatbots import (
     get_chatbot_response,
     get_chatbot_response_async,
+    get_auto_chatbot_response,
     get_batch_chatbot_responses,
     get_available_chatbot_types,
-    test_all_chatbots,
     get_chatbot_metrics,
-    get_system_health
+    get_system_health,
+    get_prompt_token_counts,
+    get_prompt_registry,
+    get_experiment_results,
+    get_prometheus_metrics,
+    get_chatbot_health,
+    get_slo_status
 )
+from core.timing import mark_request_validated, mark_request_handled
+from core.prometheus import CONTENT_TYPE as PROMETHEUS_CONTENT_TYPE
 from typing import Dict, Any
 import logging
 import time
@@ -43,13 +52,15 @@ def format_chatbot_response(response_data: Dict[str, Any]) -> ChatResponse:
         response=response_data.get("response"),
         chatbot_type=response_data.get("chatbot_type", "unknown"),
         error=response_data.get("error"),
-        duration=response_data.get("duration", 0.0),
-        timestamp=response_data.get("timestamp", datetime.now().isoformat()),
+        duration=response_data.get("duration") or 0.0,
+        # Error responses carry timestamp None
+        timestamp=response_data.get("timestamp") or datetime.now().isoformat(),
         validation=response_data.get("validation")
     )
 
 async def handle_chatbot_request(chatbot_type: str, request: ChatRequest) -> ChatResponse:
     """Handle individual chatbot requests with error handling"""
+    mark_request_validated()
     try:
         # Log the request
         logger.info(f"Processing {chatbot_type} request: {request.message[:50]}...")
@@ -62,8 +73,10 @@ async def handle_chatbot_request(chatbot_type: str, request: ChatRequest) -> Cha
         )
         
         # Format and return response
-        return format_chatbot_response(response_data)
-        
+        response = format_chatbot_response(response_data)
+        mark_request_handled()
+        return response
+    
     except Exception as e:
         logger.error(f"Error processing {chatbot_type} request: {str(e)}")
         raise HTTPException(
@@ -146,6 +159,43 @@ async def entertainment_chat(request: ChatRequest):
     """
     return await handle_chatbot_request("entertainment", request)
 
+# Automatic routing endpoint
+@router.post("/auto", response_model=AutoChatResponse, summary="Automatic Chatbot Selection")
+async def auto_chat(request: ChatRequest):
+    """
+    Automatically Routed Chat
+    
+    Classifies the message locally (no LLM call) into one of the available chatbot types
+    and sends it to that chatbot. The chosen type, its confidence and the runner-up types
+    are returned in `routing`. Messages below the confidence floor go to the configured
+    fallback chatbot, or get a request to clarify (`chatbot_type` "auto") when none is set.
+    """
+    mark_request_validated()
+    try:
+        logger.info(f"Processing auto-routed request: {request.message[:50]}...")
+        
+        response_data = await get_auto_chatbot_response(request.message, request.context)
+        
+        response = AutoChatResponse(
+            **format_chatbot_response(response_data).model_dump(),
+            routing=response_data["routing"]
+        )
+        mark_request_handled()
+        return response
+    
+    except ValueError as e:
+        logger.error(f"Auto routing unavailable: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Error processing auto-routed request: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error while processing auto-routed request"
+        )
+
 # Batch processing endpoint
 @router.post("/batch", response_model=BatchChatResponse, summary="Batch Chat Processing")
 async def batch_chat(request: BatchChatRequest):
@@ -174,7 +224,7 @@ async def batch_chat(request: BatchChatRequest):
             successful_requests=successful_count,
             total_duration=total_duration
         )
-        
+    
     except Exception as e:
         logger.error(f"Error processing batch request: {str(e)}")
         raise HTTPException(
@@ -188,34 +238,27 @@ async def health_check():
     """
     System Health Check
     
-    Get the current health status of all chatbots and system components.
+    Get the current health status of all chatbots and system components. Chatbot status
+    comes from recent traffic (error rate and p90 latency over five minutes) or, without
+    enough traffic, from the last background probe. This endpoint never calls the LLM.
     """
     try:
-        # Get system health
-        health_data = get_system_health()
-        
-        # Test all chatbots
-        test_results = await test_all_chatbots()
+        health_data = get_chatbot_health()
         
         # Calculate uptime
         uptime_delta = datetime.now() - SYSTEM_START_TIME
         uptime_str = f"{uptime_delta.days}d {uptime_delta.seconds//3600}h {(uptime_delta.seconds//60)%60}m"
         
-        # Format chatbot statuses
-        chatbot_statuses = {
-            chatbot_type: "healthy" if status else "unhealthy"
-            for chatbot_type, status in test_results.items()
-        }
-        
         return HealthCheckResponse(
             status=health_data["status"],
-            chatbots=chatbot_statuses,
-            total_chatbots=health_data["total_chatbots"],
-            healthy_chatbots=sum(test_results.values()),
+            chatbots={chatbot_type: health["status"] for chatbot_type, health in health_data["chatbots"].items()},
+            total_chatbots=len(health_data["chatbots"]),
+            healthy_chatbots=health_data["healthy"],
             uptime=uptime_str,
-            timestamp=datetime.now().isoformat()
+            timestamp=datetime.now().isoformat(),
+            details=health_data["chatbots"]
         )
-        
+    
     except Exception as e:
         logger.error(f"Error in health check: {str(e)}")
         raise HTTPException(
@@ -223,8 +266,28 @@ async def health_check():
             detail="Error performing health check"
         )
 
+@router.get("/slo", summary="Service Level Objectives")
+async def get_slo():
+    """
+    Service Level Objectives
+    
+    Per-chatbot availability and latency attainment of the background canaries over
+    5m, 30m, 1h and 6h windows, error budget burn rates, and any burn-rate alerts.
+    Canaries run only when HEALTH_PROBE_SECONDS is set; each worker reports its own.
+    """
+    try:
+        return {"slo": get_slo_status(), "timestamp": datetime.now().isoformat()}
+    
+    except Exception as e:
+        logger.error(f"Error getting SLO status: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error retrieving SLO status"
+        )
+
+# Metrics routes read every worker's metrics file, so they are plain functions run in the threadpool
 @router.get("/metrics", response_model=MetricsResponse, summary="System Metrics")
-async def get_metrics():
+def get_metrics():
     """
     Get System Performance Metrics
     
@@ -238,7 +301,7 @@ async def get_metrics():
             chatbot_metrics=chatbot_metrics,
             system_health=system_health
         )
-        
+    
     except Exception as e:
         logger.error(f"Error getting metrics: {str(e)}")
         raise HTTPException(
@@ -246,6 +309,47 @@ async def get_metrics():
             detail="Error retrieving system metrics"
         )
 
+@router.get("/metrics/prometheus", summary="Prometheus Metrics", response_class=PlainTextResponse)
+def get_prometheus_metrics_text():
+    """
+    Prometheus Metrics
+    
+    Request and error counts, latency and stage histograms, token counts, cache hit
+    ratios and load gauges in the Prometheus text exposition format, for scraping.
+    """
+    try:
+        return PlainTextResponse(get_prometheus_metrics(), media_type=PROMETHEUS_CONTENT_TYPE)
+    
+    except Exception as e:
+        logger.error(f"Error rendering Prometheus metrics: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error rendering metrics"
+        )
+
+@router.get("/experiments", summary="Prompt Experiment Results")
+async def get_experiments():
+    """
+    Prompt Experiment Results
+    
+    Per-variant latency, output tokens, validator issues and error rates for each
+    running prompt experiment, with differences and test statistics against the baseline.
+    """
+    try:
+        experiments = get_experiment_results()
+        return {
+            "experiments": experiments,
+            "total_count": len(experiments),
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    except Exception as e:
+        logger.error(f"Error getting experiment results: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error retrieving experiment results"
+        )
+
 @router.get("/types", summary="Available Chatbot Types")
 async def get_chatbot_types():
     """
@@ -255,6 +359,9 @@ async def get_chatbot_types():
     """
     try:
         types = get_available_chatbot_types()
+        prompt_tokens = get_prompt_token_counts()
+        compact_prompt_tokens = get_prompt_token_counts("compact")
+        registry = get_prompt_registry()
         
         # Add descriptions for each type
         type_descriptions = {
@@ -270,10 +377,13 @@ async def get_chatbot_types():
         
         return {
             "available_types": types,
-            "descriptions": {t: type_descriptions.get(t, "No description available") for t in types},
+            "descriptions": {t: registry.get(t).description if t in registry and registry.get(t).description
+                             else type_descriptions.get(t, "No description available") for t in types},
+            "prompt_tokens": {t: prompt_tokens.get(t) for t in types},
+            "compact_prompt_tokens": {t: compact_prompt_tokens.get(t) for t in types},
             "total_count": len(types)
         }
-        
+    
     except Exception as e:
         logger.error(f"Error getting chatbot types: {str(e)}")
         raise HTTPException(
@@ -2,18 +2,30 @@ from .prompt_templates import (
     PromptTemplates,
     get_prompt_template,
     get_all_prompt_templates,
-    get_available_chatbot_types as get_prompt_types
+    get_available_chatbot_types as get_prompt_types,
+    get_prompt_registry,
+    get_prompt_token_counts
 )
 from .handlers import (
     chatbot_manager,
     get_chatbot_response,
     get_chatbot_response_async,
+    get_auto_chatbot_response,
+    classify_chatbot_intent,
     get_batch_chatbot_responses,     # ✅ Add this missing import
     get_available_chatbot_types,
     test_all_chatbots,
     get_chatbot_metrics,            # ✅ Add this missing import
     get_system_health,              # ✅ Add this missing import
-    enhanced_chatbot_manager        # ✅ Add this too if needed
+    enhanced_chatbot_manager,       # ✅ Add this too if needed
+    reload_chatbot_prompts,
+    get_experiment_results,
+    get_prometheus_metrics,
+    get_chatbot_health,
+    get_slo_status,
+    is_chatbot_system_ready,
+    start_health_probes,
+    stop_health_probes
 )
 
 __all__ = [
@@ -21,13 +33,25 @@ __all__ = [
     "get_prompt_template", 
     "get_all_prompt_templates",
     "get_prompt_types",
+    "get_prompt_registry",
+    "get_prompt_token_counts",
     "chatbot_manager",
     "get_chatbot_response",
     "get_chatbot_response_async",
+    "get_auto_chatbot_response",
+    "classify_chatbot_intent",
     "get_batch_chatbot_responses",   # ✅ Add to exports
     "get_available_chatbot_types",
     "test_all_chatbots",
     "get_chatbot_metrics",          # ✅ Add to exports
     "get_system_health",            # ✅ Add to exports
-    "enhanced_chatbot_manager"      # ✅ Add if needed
+    "enhanced_chatbot_manager",     # ✅ Add if needed
+    "reload_chatbot_prompts",
+    "get_experiment_results",
+    "get_prometheus_metrics",
+    "get_chatbot_health",
+    "get_slo_status",
+    "is_chatbot_system_ready",
+    "start_health_probes",
+    "stop_health_probes"
 ]
@@ -0,0 +1,120 @@
+"""
+Synthetic canary requests
+
+Every chatbot gets one canary prompt per interval, sent straight to its chain
+as a synthetic call so the LLM call, retrieval and prompt are exercised
+without the local fast paths and without counting as user traffic. Canaries are spread evenly over the interval with a little jitter, so
+workers started together don't probe in lockstep, and each one waits on a
+token bucket so canaries can never exceed a fixed share of the LLM quota.
+Each chatbot rotates through its own prompts; results go to every registered
+callback (health and SLO tracking).
+"""
+
+from core.ratelimit import TokenBucket
+from typing import Dict, Any, Callable, List, Optional, Tuple
+import asyncio
+import json
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)
+
+# (chatbot_type, success, duration, error)
+CanaryCallback = Callable[[str, bool, float, Optional[str]], None]
+
+def load_canary_prompts(path: str) -> Dict[str, List[str]]:
+    """Read {"chatbot_type": ["prompt", ...]} from a JSON file"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return {chatbot_type: [str(prompt) for prompt in prompts] for chatbot_type, prompts in data.items() if prompts}
+
+def canary_prompts_from_examples(examples: List[Tuple[str, str]], per_label: int = 5) -> Dict[str, List[str]]:
+    """The first few labeled intent examples of each chatbot type"""
+    prompts: Dict[str, List[str]] = {}
+    for text, label in examples:
+        texts = prompts.setdefault(label, [])
+        if len(texts) < per_label:
+            texts.append(text)
+    return prompts
+
+class CanaryScheduler:
+    """Sends each chatbot a rotating canary prompt once per interval"""
+    
+    def __init__(self, get_chatbots: Callable[[], Dict[str, Any]], interval: float,
+                 prompts: Optional[Dict[str, List[str]]] = None, default_prompt: str = "Hello, please reply briefly.",
+                 limiter: Optional[TokenBucket] = None, callbacks: Optional[List[CanaryCallback]] = None,
+                 jitter: float = 0.1):
+        self.get_chatbots = get_chatbots
+        self.interval = interval
+        self.prompts = prompts or {}
+        self.default_prompt = default_prompt
+        self.limiter = limiter
+        self.callbacks = list(callbacks or [])
+        self.jitter = jitter
+        self.sent: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+    
+    def next_prompt(self, chatbot_type: str) -> str:
+        prompts = self.prompts.get(chatbot_type)
+        if not prompts:
+            return self.default_prompt
+        return prompts[self.sent.get(chatbot_type, 0) % len(prompts)]
+    
+    def _report(self, chatbot_type: str, success: bool, duration: float, error: Optional[str]):
+        for callback in self.callbacks:
+            try:
+                callback(chatbot_type, success, duration, error)
+            except Exception as e:
+                logger.error(f"❌ Canary callback failed for {chatbot_type}: {str(e)}")
+    
+    async def probe(self, chatbot_type: str, chatbot: Any):
+        """Send one canary straight to the chain, past the local fast paths"""
+        prompt = self.next_prompt(chatbot_type)
+        self.sent[chatbot_type] = self.sent.get(chatbot_type, 0) + 1
+        if self.limiter is not None:
+            await self.limiter.acquire()
+        started = time.time()
+        try:
+            result = await chatbot.invoke(prompt, synthetic=True)
+        except Exception as e:
+            self._report(chatbot_type, False, time.time() - started, str(e))
+            logger.error(f"❌ Canary for {chatbot_type} raised: {str(e)}")
+            return
+        self._report(chatbot_type, result["success"], result["duration"], result.get("error"))
+        if not result["success"]:
+            logger.warning(f"⚠️ Canary for {chatbot_type} failed: {result.get('error')}")
+    
+    def _spacing(self, chatbots: int) -> float:
+        spacing = self.interval / max(chatbots, 1)
+        return spacing * (1 + random.uniform(-self.jitter, self.jitter))
+    
+    async def run(self):
+        """Probe every chatbot once per interval, one at a time and evenly spaced"""
+        while True:
+            chatbots = list(self.get_chatbots().items())
+            for chatbot_type, chatbot in chatbots:
+                await asyncio.sleep(self._spacing(len(chatbots)))
+                await self.probe(chatbot_type, chatbot)
+            if not chatbots:
+                await asyncio.sleep(self.interval)
+    
+    def start(self):
+        """Start canaries on the running event loop (no-op when disabled)"""
+        if self.interval <= 0 or self._task is not None:
+            return
+        if self.limiter is not None and self.limiter.rate <= 0:
+            logger.info("Canaries disabled: canary rate limit is 0")
+            return
+        self._task = asyncio.get_running_loop().create_task(self.run())
+        logger.info(f"✅ Canaries every {self.interval}s per chatbot")
+    
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
@@ -0,0 +1,192 @@
+"""
+Crisis and emergency fast path for the medical and mental health chatbots
+
+Curated phrase lists are compiled once into a single trie-shaped regular
+expression, so one C-level scan of the message finds any phrase from any
+category in microseconds, before the chain (and the LLM) is ever called.
+
+Each category has two lists. "phrases" are first-person statements of intent
+or an emergency in progress ("I want to kill myself", "can't breathe"); they
+return the resources at once. "keywords" only name a topic ("suicide rate",
+"heart attack", "seizure") and are usually questions, so the resources are
+put in front of the LLM's answer instead of replacing it.
+"""
+
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+import json
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+DEFAULT_PHRASES_PATH = os.path.join(DATA_DIR, "crisis_phrases.json")
+
+# Categories checked for each chatbot, in priority order
+DEFAULT_CHATBOT_CATEGORIES = {
+    "mental_health": ["self_harm", "medical_emergency"],
+    "medical": ["self_harm", "medical_emergency"]
+}
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# Trie characters that must match a class of input characters, so lowercasing is the only pass over a message
+CHAR_CLASSES = {
+    " ": r"\s+",
+    "'": "['‘’]"
+}
+
+def normalize_text(text: str) -> str:
+    """Lowercase, straighten quotes and collapse whitespace"""
+    text = text.lower().replace("’", "'").replace("‘", "'")
+    return WHITESPACE_PATTERN.sub(" ", text)
+
+class PhraseMatcher:
+    """Multi-pattern phrase matcher compiled from a trie into one regular expression
+    
+    Shared prefixes are factored out ("kill myself|killing myself" becomes
+    "kill(?:ing)? myself"-style groups), so the regex engine walks the trie
+    instead of trying every phrase at every position.
+    """
+    
+    def __init__(self, phrases: Dict[str, str]):
+        """phrases maps each phrase to the label it reports"""
+        self._labels: Dict[str, str] = {}
+        trie: Dict[str, Any] = {}
+        
+        for phrase, label in phrases.items():
+            normalized = normalize_text(phrase).strip()
+            if not normalized:
+                continue
+            # The first label registered for a phrase wins
+            self._labels.setdefault(normalized, label)
+            node = trie
+            for char in normalized:
+                node = node.setdefault(char, {})
+            node[""] = True
+        
+        if self._labels:
+            self._pattern = re.compile(r"\b(?:" + self._trie_to_regex(trie) + r")\b")
+        else:
+            self._pattern = None
+    
+    def _trie_to_regex(self, node: Dict[str, Any]) -> str:
+        terminal = "" in node
+        branches = [
+            CHAR_CLASSES.get(char, re.escape(char)) + self._trie_to_regex(child)
+            for char, child in sorted(node.items())
+            if char != ""
+        ]
+        if not branches:
+            return ""
+        
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if terminal:
+            return "(?:" + body + ")?"
+        return body
+    
+    def __len__(self) -> int:
+        return len(self._labels)
+    
+    def find_all(self, text: str) -> List[Tuple[str, str]]:
+        """Get (phrase, label) for every phrase occurring in the text"""
+        if self._pattern is None:
+            return []
+        results = []
+        for match in self._pattern.findall(text.lower()):
+            phrase = normalize_text(match)
+            results.append((phrase, self._labels[phrase]))
+        return results
+    
+    def search(self, text: str) -> Optional[Tuple[str, str]]:
+        """Get the first (phrase, label) occurring in the text, if any"""
+        if self._pattern is None:
+            return None
+        match = self._pattern.search(text.lower())
+        if match is None:
+            return None
+        phrase = normalize_text(match.group(0))
+        return phrase, self._labels[phrase]
+
+class CrisisDetector:
+    """Detects self-harm and medical-emergency intent and supplies crisis resources"""
+    
+    def __init__(self, categories: Dict[str, Dict[str, Any]],
+                 chatbot_categories: Optional[Dict[str, List[str]]] = None):
+        self.resources = {name: category["resources"] for name, category in categories.items()}
+        self.chatbot_categories = chatbot_categories or DEFAULT_CHATBOT_CATEGORIES
+        self._matchers: Dict[str, PhraseMatcher] = {}
+        
+        # Normalized keywords; a phrase listed both ways counts as a statement of intent
+        intent_phrases = {normalize_text(phrase).strip() for category in categories.values()
+                          for phrase in category.get("phrases", [])}
+        self._keywords = {normalize_text(keyword).strip() for category in categories.values()
+                          for keyword in category.get("keywords", [])} - intent_phrases
+        
+        for chatbot_type, category_names in self.chatbot_categories.items():
+            phrases: Dict[str, str] = {}
+            for name in category_names:
+                category = categories.get(name, {})
+                for phrase in category.get("phrases", []) + category.get("keywords", []):
+                    phrases.setdefault(phrase, name)
+            self._matchers[chatbot_type] = PhraseMatcher(phrases)
+        
+        self._lock = threading.Lock()
+        self.metrics: Dict[str, Dict[str, int]] = {}
+    
+    def handles(self, chatbot_type: str) -> bool:
+        """Whether crisis detection runs for a chatbot"""
+        return chatbot_type in self._matchers
+    
+    def detect(self, chatbot_type: str, user_input: str) -> Optional[Dict[str, Any]]:
+        """Get the highest-priority crisis match in a message, if any
+        
+        Statements of intent win over keywords, then categories go in priority
+        order; "immediate" tells whether the match was a statement of intent.
+        """
+        matcher = self._matchers.get(chatbot_type)
+        if matcher is None:
+            return None
+        
+        matches = matcher.find_all(user_input)
+        result = None
+        if matches:
+            priority = self.chatbot_categories[chatbot_type]
+            phrase, category = min(matches, key=lambda match: (match[0] in self._keywords, priority.index(match[1])))
+            result = {
+                "category": category,
+                "matched_phrase": phrase,
+                "immediate": phrase not in self._keywords,
+                "resources": self.resources[category]
+            }
+        
+        with self._lock:
+            counters = self.metrics.setdefault(chatbot_type, {"checked": 0, "matched": 0})
+            counters["checked"] += 1
+            if result is not None:
+                counters["matched"] += 1
+                counters[result["category"]] = counters.get(result["category"], 0) + 1
+        
+        return result
+    
+    def get_metrics(self, chatbot_type: str) -> Dict[str, Any]:
+        """Get crisis match counters for a chatbot"""
+        with self._lock:
+            return dict(self.metrics.get(chatbot_type, {"checked": 0, "matched": 0}))
+
+def load_crisis_categories(path: str = DEFAULT_PHRASES_PATH) -> Dict[str, Dict[str, Any]]:
+    """Read curated phrase lists and resources"""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def create_crisis_detector(path: Optional[str] = None,
+                           chatbot_types: Optional[Iterable[str]] = None) -> CrisisDetector:
+    """Create a detector from a phrase file, limited to the given chatbot types"""
+    chatbot_categories = {
+        chatbot_type: categories
+        for chatbot_type, categories in DEFAULT_CHATBOT_CATEGORIES.items()
+        if chatbot_types is None or chatbot_type in chatbot_types
+    }
+    return CrisisDetector(load_crisis_categories(path or DEFAULT_PHRASES_PATH), chatbot_categories)
@@ -2,11 +2,36 @@
 Enhanced chatbot handlers with improved chain management
 """
 
-from core.chains import create_enhanced_chatbot_chain, get_enhanced_chatbot_chain, EnhancedChatbotChain
-from chatbots.prompt_templates import PromptTemplates
-from typing import Dict, Any, List, Optional
+from core.chains import create_enhanced_chatbot_chain, get_enhanced_chatbot_chain, EnhancedChatbotChain, brownout_policy, enhanced_chain_factory
+from chatbots.prompt_templates import PromptTemplates, get_prompt_registry, set_prompt_registry
+from chatbots.prompt_loader import load_prompt_registry, PromptDirectoryWatcher
+from chatbots.relevance import create_off_topic_gate, OffTopicGate
+from chatbots.crisis import create_crisis_detector, CrisisDetector
+from chatbots.health import HealthMonitor
+from chatbots.canary import CanaryScheduler, load_canary_prompts, canary_prompts_from_examples
+from retrieval.faq import FAQStore
+from retrieval.bm25 import BM25Index
+from retrieval.dense import DenseIndex
+from retrieval.segments import SegmentedIndex, is_segmented_index
+from retrieval.hybrid import HybridRetriever, RetrievalCache, create_reranker
+from routing.intent import create_intent_router, IntentRouter, load_examples
+from core.experiments import load_experiments
+from core.timing import get_stage_timer, untimed, stage_metrics
+from utils.tracing import start_span
+from core.prometheus import MetricsWriter
+from core.metrics import counts_percentiles, LogHistogram
+from core.shared_metrics import collect_metrics, get_worker_summary
+from core.loop_monitor import loop_monitor
+from core.slo import SLOTracker
+from core.ratelimit import TokenBucket
+from config import settings
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime
 import logging
+import os
 import asyncio
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -15,10 +40,62 @@ class EnhancedChatbotManager:
     
     def __init__(self):
         self.chatbots: Dict[str, EnhancedChatbotChain] = {}
+        self.intent_router: Optional[IntentRouter] = None
+        self.off_topic_gate: Optional[OffTopicGate] = None
+        self.crisis_detector: Optional[CrisisDetector] = None
+        self.faq_store: Optional[FAQStore] = None
+        self.retrieval_cache: Optional[RetrievalCache] = None
+        self.prompt_watcher: Optional[PromptDirectoryWatcher] = None
+        self._reload_lock = threading.Lock()
+        self.health_monitor = HealthMonitor(
+            lambda: self.chatbots,
+            probe_seconds=settings.health_probe_seconds,
+            min_requests=settings.health_min_requests,
+            degraded_error_rate=settings.health_degraded_error_rate,
+            unhealthy_error_rate=settings.health_unhealthy_error_rate,
+            latency_seconds=settings.health_latency_seconds
+        )
+        self.slo_tracker = SLOTracker(
+            availability_target=settings.slo_availability_target,
+            latency_seconds=settings.slo_latency_seconds,
+            latency_target=settings.slo_latency_target
+        )
+        self.canary_scheduler = CanaryScheduler(
+            lambda: self.chatbots,
+            interval=settings.health_probe_seconds,
+            prompts=self._load_canary_prompts(),
+            default_prompt=settings.health_probe_message,
+            limiter=TokenBucket(settings.canary_max_per_minute / 60.0),
+            callbacks=[self.health_monitor.record_probe, self.slo_tracker.record]
+        )
         self._initialize_all_chatbots()
+        self._initialize_intent_router()
+        self._initialize_crisis_detector()
+        self._initialize_faq_store()
+        self._initialize_retrieval()
+        self._initialize_experiments()
+        self._initialize_prompt_watcher()
+    
+    def _load_canary_prompts(self) -> Dict[str, List[str]]:
+        """Canary prompts from canary_prompts_path, or a few intent examples per chatbot"""
+        if settings.health_probe_seconds <= 0:
+            return {}
+        try:
+            if settings.canary_prompts_path:
+                return load_canary_prompts(settings.canary_prompts_path)
+            return canary_prompts_from_examples(load_examples())
+        except Exception as e:
+            logger.warning(f"⚠️ No canary prompts loaded, using the probe message: {str(e)}")
+            return {}
     
     def _initialize_all_chatbots(self):
         """Initialize all chatbot chains with their respective prompt templates"""
+        if settings.prompt_dir:
+            try:
+                set_prompt_registry(load_prompt_registry(settings.prompt_dir))
+                logger.info(f"✅ Loaded prompts from {settings.prompt_dir}")
+            except Exception as e:
+                logger.error(f"❌ Failed to load prompts from {settings.prompt_dir}, using built-in prompts: {str(e)}")
         chatbot_types = PromptTemplates.get_available_types()
         
         logger.info(f"Initializing {len(chatbot_types)} chatbots...")
@@ -26,7 +103,8 @@ class EnhancedChatbotManager:
         for chatbot_type in chatbot_types:
             try:
                 prompt = PromptTemplates.get_prompt_by_type(chatbot_type)
-                chain = create_enhanced_chatbot_chain(chatbot_type, prompt)
+                compact_prompt = PromptTemplates.get_prompt_by_type(chatbot_type, "compact")
+                chain = create_enhanced_chatbot_chain(chatbot_type, prompt, compact_prompt)
                 self.chatbots[chatbot_type] = chain
                 logger.info(f"✅ Initialized {chatbot_type} chatbot")
             except Exception as e:
@@ -34,13 +112,268 @@ class EnhancedChatbotManager:
         
         logger.info(f"Successfully initialized {len(self.chatbots)}/{len(chatbot_types)} chatbots")
     
+    def _initialize_intent_router(self):
+        """Load the local intent classifier used by automatic chatbot selection"""
+        try:
+            self.intent_router = create_intent_router(
+                list(self.chatbots.keys()),
+                settings.intent_model_path,
+                min_confidence=settings.intent_min_confidence,
+                fallback_type=settings.intent_fallback_type
+            )
+            logger.info(f"✅ Initialized intent router over {len(self.intent_router.chatbot_types)} chatbots")
+        except Exception as e:
+            logger.error(f"❌ Failed to initialize intent router: {str(e)}")
+            return
+        
+        try:
+            self.off_topic_gate = create_off_topic_gate(
+                self.intent_router.classifier,
+                list(self.chatbots.keys()),
+                mode=settings.off_topic_mode,
+                min_confidence=settings.off_topic_min_confidence,
+                max_relevance=settings.off_topic_max_relevance
+            )
+            logger.info(f"✅ Initialized off-topic gate in {settings.off_topic_mode} mode")
+        except Exception as e:
+            logger.error(f"❌ Failed to initialize off-topic gate: {str(e)}")
+    
+    def _initialize_crisis_detector(self):
+        """Compile the crisis phrase matchers used before the medical and mental health chains"""
+        if not settings.crisis_detection_enabled:
+            return
+        try:
+            self.crisis_detector = create_crisis_detector(settings.crisis_phrases_path, self.chatbots.keys())
+            logger.info("✅ Initialized crisis detector")
+        except Exception as e:
+            logger.error(f"❌ Failed to initialize crisis detector: {str(e)}")
+    
+    def _initialize_faq_store(self):
+        """Load the offline-built FAQ answer store, if one is configured"""
+        if not settings.faq_store_path:
+            return
+        try:
+            self.faq_store = FAQStore.load(settings.faq_store_path, settings.faq_min_similarity)
+            logger.info(f"✅ Initialized FAQ store for {len(self.faq_store.indexes)} chatbots")
+        except Exception as e:
+            logger.error(f"❌ Failed to load FAQ store: {str(e)}")
+    
+    def _open_index(self, chatbot_type: str, backend: str):
+        """Open a chatbot's BM25 or dense index (plain or segmented), or None if it has none"""
+        index_path = os.path.join(settings.retrieval_index_dir, chatbot_type, backend)
+        if is_segmented_index(index_path):
+            index = SegmentedIndex(index_path, nprobe=settings.retrieval_nprobe)
+            index.start_maintenance(settings.retrieval_refresh_seconds, settings.retrieval_merge_max_segments)
+            return index
+        if not os.path.exists(os.path.join(index_path, "meta.json")):
+            return None
+        if backend == "dense":
+            return DenseIndex(index_path, nprobe=settings.retrieval_nprobe)
+        return BM25Index(index_path)
+    
+    def _initialize_retrieval(self):
+        """Attach per-chatbot indexes found under the retrieval index directory"""
+        if not settings.retrieval_index_dir:
+            return
+        backend = settings.retrieval_backend
+        if backend not in ("bm25", "dense", "hybrid"):
+            logger.error(f"❌ Unknown retrieval backend: {backend}")
+            return
+        if backend == "hybrid":
+            self.retrieval_cache = RetrievalCache(settings.retrieval_cache_size)
+            try:
+                reranker = create_reranker(settings.retrieval_reranker)
+            except Exception as e:
+                logger.error(f"❌ Failed to load reranker, continuing without one: {str(e)}")
+                reranker = None
+        
+        for chatbot_type, chatbot in self.chatbots.items():
+            try:
+                if backend == "hybrid":
+                    keyword_index = self._open_index(chatbot_type, "bm25")
+                    dense_index = self._open_index(chatbot_type, "dense")
+                    if keyword_index is None and dense_index is None:
+                        continue
+                    index = HybridRetriever(
+                        chatbot_type, keyword_index, dense_index, reranker, self.retrieval_cache,
+                        budget_ms=settings.retrieval_budget_ms, candidates=settings.retrieval_candidates
+                    )
+                else:
+                    index = self._open_index(chatbot_type, backend)
+                    if index is None:
+                        continue
+                chatbot.set_retriever(index, settings.retrieval_top_k)
+                logger.info(f"✅ Attached {backend} retrieval index to {chatbot_type} chatbot")
+            except Exception as e:
+                logger.error(f"❌ Failed to load retrieval index for {chatbot_type}: {str(e)}")
+    
+    def _initialize_experiments(self):
+        """Attach prompt A/B experiments to their chatbots"""
+        if not settings.experiments_path:
+            return
+        registry = get_prompt_registry()
+        prompts = {entry.chatbot_type: {"full": entry.prompt, "compact": entry.compact_prompt} for entry in registry}
+        try:
+            experiments = load_experiments(settings.experiments_path, prompts)
+        except Exception as e:
+            logger.error(f"❌ Failed to load experiments from {settings.experiments_path}: {str(e)}")
+            return
+        for chatbot_type, experiment in experiments.items():
+            if chatbot_type not in self.chatbots:
+                logger.error(f"❌ Experiment {experiment.name} targets unknown chatbot {chatbot_type}")
+                continue
+            self.chatbots[chatbot_type].set_experiment(experiment)
+            logger.info(f"✅ Running experiment {experiment.name} on {chatbot_type} with {len(experiment.variants)} variants")
+    
+    def get_experiment_results(self) -> List[Dict[str, Any]]:
+        """Per-variant comparison of every running experiment"""
+        return [chatbot.experiment.compare() for chatbot in self.chatbots.values() if chatbot.experiment is not None]
+    
+    def _initialize_prompt_watcher(self):
+        """Reload prompts when files in the prompt directory change"""
+        if not settings.prompt_dir or settings.prompt_reload_seconds <= 0:
+            return
+        try:
+            self.prompt_watcher = PromptDirectoryWatcher(settings.prompt_dir, self.reload_prompts, settings.prompt_reload_seconds)
+            self.prompt_watcher.start()
+            logger.info(f"✅ Watching {settings.prompt_dir} for prompt changes")
+        except Exception as e:
+            logger.error(f"❌ Failed to watch prompt directory: {str(e)}")
+    
+    def reload_prompts(self) -> Dict[str, Any]:
+        """Reload the prompt directory, rebuilding only chatbots whose definitions changed
+        
+        The new chains are built before anything is swapped, and self.chatbots is
+        replaced in one assignment; requests already holding a chain finish on it.
+        """
+        with self._reload_lock:
+            current = get_prompt_registry()
+            registry = load_prompt_registry(settings.prompt_dir, current.version + 1)
+            changed = [
+                chatbot_type for chatbot_type in registry.types
+                if chatbot_type not in self.chatbots
+                or chatbot_type not in current
+                or registry.get(chatbot_type) != current.get(chatbot_type)
+            ]
+            removed = [chatbot_type for chatbot_type in self.chatbots if chatbot_type not in registry]
+            if not changed and not removed:
+                return {"version": current.version, "changed": [], "removed": []}
+            
+            chatbots = dict(self.chatbots)
+            for chatbot_type in changed:
+                entry = registry.get(chatbot_type)
+                chatbots[chatbot_type] = enhanced_chain_factory.replace_chain(chatbot_type, entry.prompt, entry.compact_prompt)
+            for chatbot_type in removed:
+                del chatbots[chatbot_type]
+                enhanced_chain_factory.remove_chain(chatbot_type)
+            
+            set_prompt_registry(registry)
+            self.chatbots = chatbots
+            if self.intent_router is not None:
+                # Disabled chatbots stop competing, so /auto falls through to the runner-up
+                self.intent_router.set_chatbot_types(list(chatbots))
+            if self.off_topic_gate is not None:
+                self.off_topic_gate.update_redirects({
+                    chatbot_type: registry.get(chatbot_type).off_topic_response for chatbot_type in changed
+                    if chatbot_type in self.off_topic_gate.redirects and registry.get(chatbot_type).off_topic_response
+                })
+            logger.info(f"🔄 Reloaded prompts (version {registry.version}): changed {changed or 'none'}, removed {removed or 'none'}")
+            return {"version": registry.version, "changed": changed, "removed": removed}
+    
+    def _local_response(self, chatbot: EnhancedChatbotChain, text: str, short_circuit: str, **extra) -> Dict[str, Any]:
+        """Build a chain-shaped response for an answer produced without the LLM"""
+        validation = chatbot.validator.validate_response(text, chatbot.chatbot_type)
+        response = {
+            "success": True,
+            "response": validation["formatted_response"],
+            "chatbot_type": chatbot.chatbot_type,
+            "error": None,
+            "validation": validation,
+            "duration": 0.0,
+            "timestamp": datetime.now().isoformat(),
+            "short_circuit": short_circuit
+        }
+        response.update(extra)
+        return response
+    
+    def _run_fast_paths(self, chatbot: EnhancedChatbotChain, user_input: str) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+        """Run the local checks that may answer without the LLM
+        
+        Returns a finished response (or None to continue to the chain) and the
+        state that _finish_chain_response needs afterwards.
+        """
+        chatbot_type = chatbot.chatbot_type
+        state: Dict[str, Any] = {"crisis": None, "off_topic": None}
+        
+        # Crisis detection runs first: a crisis message must never be treated as off-topic
+        if self.crisis_detector is not None and self.crisis_detector.handles(chatbot_type):
+            try:
+                state["crisis"] = self.crisis_detector.detect(chatbot_type, user_input)
+            except Exception as e:
+                logger.error(f"Crisis detection failed for {chatbot_type}: {str(e)}")
+        
+        crisis = state["crisis"]
+        if crisis is not None:
+            logger.warning(f"Crisis fast path triggered for {chatbot_type} ({crisis['category']})")
+            if not crisis["immediate"] or settings.crisis_continue_with_llm:
+                # Keywords are usually questions: answer them, with the resources first
+                return None, state
+            return self._local_response(
+                chatbot, crisis["resources"], "crisis",
+                crisis={"category": crisis["category"], "matched_phrase": crisis["matched_phrase"]}
+            ), state
+        
+        if self.faq_store is not None and self.faq_store.handles(chatbot_type):
+            try:
+                faq_hit = self.faq_store.lookup(chatbot_type, user_input)
+            except Exception as e:
+                logger.error(f"FAQ lookup failed for {chatbot_type}: {str(e)}")
+                faq_hit = None
+            if faq_hit is not None:
+                return self._local_response(
+                    chatbot, faq_hit["answer"], "faq",
+                    faq={"question": faq_hit["question"], "similarity": faq_hit["similarity"], "match": faq_hit["match"]}
+                ), state
+        
+        if self.off_topic_gate is not None and self.off_topic_gate.enabled:
+            try:
+                state["off_topic"] = self.off_topic_gate.check(chatbot_type, user_input)
+            except Exception as e:
+                logger.error(f"Off-topic check failed for {chatbot_type}: {str(e)}")
+        
+        if state["off_topic"] is not None and self.off_topic_gate.should_short_circuit(state["off_topic"]):
+            return self._local_response(chatbot, self.off_topic_gate.get_redirect(chatbot_type), "off_topic"), state
+        
+        return None, state
+    
+    def _finish_chain_response(self, chatbot: EnhancedChatbotChain, state: Dict[str, Any], response: Dict[str, Any]) -> Dict[str, Any]:
+        """Apply fast-path follow-ups to a response that came from the chain"""
+        crisis = state["crisis"]
+        if crisis is not None:
+            # Crisis resources always lead, even if the LLM call failed
+            crisis_info = {"category": crisis["category"], "matched_phrase": crisis["matched_phrase"]}
+            if not response.get("success"):
+                return self._local_response(chatbot, crisis["resources"], "crisis", crisis=crisis_info)
+            response["response"] = f"{crisis['resources']}\n\n{response['response']}"
+            response["crisis"] = crisis_info
+            return response
+        
+        decision = state["off_topic"]
+        if decision is not None and self.off_topic_gate.mode == "shadow" and response.get("success"):
+            self.off_topic_gate.record_shadow_outcome(chatbot.chatbot_type, decision, response.get("response"))
+        return response
+    
     def get_chatbot(self, chatbot_type: str) -> EnhancedChatbotChain:
         """Get a specific chatbot instance"""
         if chatbot_type not in self.chatbots:
+            if chatbot_type not in get_prompt_registry():
+                # Unknown, or disabled by a prompt reload: nothing to rebuild
+                raise ValueError(f"Chatbot type '{chatbot_type}' not available")
             # Try to create it if it doesn't exist
             try:
                 prompt = PromptTemplates.get_prompt_by_type(chatbot_type)
-                chain = create_enhanced_chatbot_chain(chatbot_type, prompt)
+                compact_prompt = PromptTemplates.get_prompt_by_type(chatbot_type, "compact")
+                chain = create_enhanced_chatbot_chain(chatbot_type, prompt, compact_prompt)
                 self.chatbots[chatbot_type] = chain
                 logger.info(f"Created missing chatbot: {chatbot_type}")
             except Exception as e:
@@ -55,28 +388,100 @@ class EnhancedChatbotManager:
     
     async def chat(self, chatbot_type: str, user_input: str, context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Send a message to a specific chatbot with optional context"""
-        try:
-            chatbot = self.get_chatbot(chatbot_type)
-            response = await chatbot.invoke(user_input, context)
-            return response
-        except Exception as e:
-            logger.error(f"Error in {chatbot_type} chat: {str(e)}")
-            return {
-                "success": False,
-                "response": None,
-                "chatbot_type": chatbot_type,
-                "error": str(e),
-                "validation": None,
-                "duration": 0,
-                "timestamp": None
-            }
+        timer = get_stage_timer()
+        with start_span("chatbot.chat", {"chatbot.type": chatbot_type, "input.chars": len(user_input)}) as span:
+            try:
+                chatbot = self.get_chatbot(chatbot_type)
+                
+                started = time.perf_counter()
+                with start_span("fast_paths") as fast_path_span:
+                    local_response, state = self._run_fast_paths(chatbot, user_input)
+                    if local_response is not None:
+                        fast_path_span.set_attribute("fast_path.short_circuit", local_response["short_circuit"])
+                    fast_path_span.set_attribute("crisis.matched", state["crisis"] is not None)
+                if timer is not None:
+                    timer.chatbot_type = chatbot_type
+                    timer.add("fast_paths", time.perf_counter() - started)
+                    timer.details["input"] = user_input
+                if local_response is not None:
+                    span.set_attribute("chatbot.short_circuit", local_response["short_circuit"])
+                    if timer is not None:
+                        timer.details["short_circuit"] = local_response["short_circuit"]
+                    return local_response
+                
+                response = await chatbot.invoke(user_input, context)
+                span.set_attribute("chatbot.prompt_variant", response.get("prompt_variant"))
+                if timer is not None:
+                    timer.details["prompt_variant"] = response.get("prompt_variant")
+                if not response["success"]:
+                    span.record_error(response["error"])
+                    if timer is not None:
+                        timer.details["error"] = response["error"]
+                return self._finish_chain_response(chatbot, state, response)
+            except Exception as e:
+                span.record_error(e)
+                if timer is not None:
+                    timer.details["error"] = str(e)
+                logger.error(f"Error in {chatbot_type} chat: {str(e)}")
+                return {
+                    "success": False,
+                    "response": None,
+                    "chatbot_type": chatbot_type,
+                    "error": str(e),
+                    "validation": None,
+                    "duration": 0,
+                    "timestamp": None
+                }
+    
+    def classify_intent(self, user_input: str) -> Dict[str, Any]:
+        """Pick the best chatbot type for a message without calling the LLM"""
+        if self.intent_router is None:
+            raise ValueError("Automatic chatbot selection is not available")
+        return self.intent_router.route(user_input)
+    
+    def _clarify_response(self, routing: Dict[str, Any]) -> Dict[str, Any]:
+        """Ask the user for more detail when no chatbot is a confident match"""
+        suggestions = [alternative["chatbot_type"] for alternative in routing["alternatives"]] or self.get_available_chatbots()
+        names = ", ".join(chatbot_type.replace("_", " ") for chatbot_type in suggestions)
+        return {
+            "success": True,
+            "response": (
+                "I'm not sure which of our assistants fits your message best. "
+                f"Could you tell me a little more about what you need help with? For example: {names}."
+            ),
+            "chatbot_type": "auto",
+            "error": None,
+            "validation": None,
+            "duration": 0.0,
+            "timestamp": datetime.now().isoformat(),
+            "short_circuit": "clarify"
+        }
+    
+    async def auto_chat(self, user_input: str, context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Classify a message locally and send it to the chosen chatbot"""
+        routing = self.classify_intent(user_input)
+        if routing["chatbot_type"] is None:
+            response = self._clarify_response(routing)
+            timer = get_stage_timer()
+            if timer is not None:
+                timer.details["input"] = user_input
+                timer.details["short_circuit"] = "clarify"
+        else:
+            response = await self.chat(routing["chatbot_type"], user_input, context)
+        response["routing"] = routing
+        return response
     
     def chat_sync(self, chatbot_type: str, user_input: str, context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Synchronous version of chat"""
         try:
             chatbot = self.get_chatbot(chatbot_type)
+            
+            local_response, state = self._run_fast_paths(chatbot, user_input)
+            if local_response is not None:
+                return local_response
+            
             response = chatbot.invoke_sync(user_input, context)
-            return response
+            return self._finish_chain_response(chatbot, state, response)
         except Exception as e:
             logger.error(f"Error in {chatbot_type} chat: {str(e)}")
             return {
@@ -114,7 +519,9 @@ class EnhancedChatbotManager:
         if not tasks:
             return []
         
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        # Sub-requests run concurrently, so their stages would overlap in one request's timings
+        with untimed():
+            results = await asyncio.gather(*tasks, return_exceptions=True)
         
         # Process results and handle exceptions
         processed_results = []
@@ -160,9 +567,126 @@ class EnhancedChatbotManager:
         """Get performance metrics for all chatbots"""
         metrics = {}
         for chatbot_type, chatbot in self.chatbots.items():
-            metrics[chatbot_type] = chatbot.get_metrics()
+            metrics[chatbot_type] = dict(chatbot.get_metrics())
+            metrics[chatbot_type]["stages"] = stage_metrics.get_metrics(chatbot_type)
+            if self.off_topic_gate is not None:
+                metrics[chatbot_type]["off_topic"] = self.off_topic_gate.get_metrics(chatbot_type)
+            if self.crisis_detector is not None and self.crisis_detector.handles(chatbot_type):
+                metrics[chatbot_type]["crisis"] = self.crisis_detector.get_metrics(chatbot_type)
+            if self.faq_store is not None and self.faq_store.handles(chatbot_type):
+                metrics[chatbot_type]["faq"] = self.faq_store.get_metrics(chatbot_type)
+            if isinstance(chatbot.retriever, HybridRetriever):
+                metrics[chatbot_type]["retrieval"] = chatbot.retriever.get_metrics()
+            metrics[chatbot_type]["prompt_variants"] = chatbot.get_prompt_variant_metrics()
+        if settings.metrics_dir:
+            self._add_worker_totals(metrics)
         return metrics
     
+    def _add_worker_totals(self, metrics: Dict[str, Any]):
+        """Add invocation counts, percentiles and tokens summed over every worker process"""
+        merged = collect_metrics()
+        workers = get_worker_summary(merged["workers"])
+        shape = LogHistogram()
+        for key, series in merged["histograms"].items():
+            kind, chatbot_type = key.split("|")[:2]
+            if kind != "request":
+                continue
+            count = sum(series["counts"])
+            totals = {
+                "workers": workers["workers"],
+                "total_invocations": count,
+                "successful_invocations": count - series["errors"],
+                "average_duration": series["total"] / count if count else 0.0
+            }
+            totals.update(counts_percentiles(shape, series["counts"], count, float("inf")))
+            metrics.setdefault(chatbot_type, {})["all_workers"] = totals
+        for key, (input_tokens, output_tokens) in merged["counters"].items():
+            totals = metrics.setdefault(key.split("|")[1], {}).setdefault("all_workers", {"workers": workers["workers"]})
+            totals["input_tokens"] = input_tokens
+            totals["output_tokens"] = output_tokens
+    
+    def get_prometheus_metrics(self) -> str:
+        """Counters, histograms and gauges in the Prometheus text format"""
+        writer = MetricsWriter()
+        # Requests, latencies and tokens are summed over all worker processes
+        merged = collect_metrics()
+        for key, series in merged["histograms"].items():
+            kind, chatbot_type, *rest = key.split("|")
+            labels = (("chatbot", chatbot_type),)
+            if kind == "request":
+                writer.counter("requests_total", "LLM chain invocations", sum(series["counts"]), labels)
+                writer.counter("request_errors_total", "LLM chain invocations that failed", series["errors"], labels)
+                writer.histogram_counts("request_duration_seconds", "LLM chain latency", series["counts"], series["total"], labels)
+            elif kind == "stage":
+                writer.histogram_counts("stage_duration_seconds", "Request time by pipeline stage", series["counts"],
+                                        series["total"], labels + (("stage", rest[0]),))
+            elif kind == "loop":
+                writer.histogram_counts("event_loop_lag_seconds", "How late event loop callbacks start",
+                                        series["counts"], series["total"])
+        for key, (input_tokens, output_tokens) in merged["counters"].items():
+            labels = (("chatbot", key.split("|")[1]),)
+            writer.counter("tokens_total", "LLM tokens used", input_tokens, labels + (("direction", "input"),))
+            writer.counter("tokens_total", "LLM tokens used", output_tokens, labels + (("direction", "output"),))
+        workers = get_worker_summary(merged["workers"])
+        writer.gauge("workers", "Worker processes whose metrics are included", workers["workers"])
+        writer.gauge("workers_alive", "Included worker processes still running", workers["alive"])
+        
+        # Everything below describes the worker answering the scrape
+        for chatbot_type, chatbot in list(self.chatbots.items()):
+            labels = (("chatbot", chatbot_type),)
+            for variant, count in chatbot.get_prompt_variant_metrics().items():
+                writer.counter("prompt_variant_requests_total", "Chain calls by prompt variant", count,
+                               labels + (("variant", variant),))
+            
+            caches = {}
+            for variant, renderer in chatbot.prompt_renderers.items():
+                info = renderer.get_cache_info()
+                caches[f"prompt_{variant}"] = (info["hits"], info["misses"])
+            if isinstance(chatbot.retriever, HybridRetriever) and chatbot.retriever.cache is not None:
+                info = chatbot.retriever.cache.get_metrics(chatbot_type)
+                caches["retrieval"] = (info["hits"], info["misses"])
+            if self.faq_store is not None and self.faq_store.handles(chatbot_type):
+                info = self.faq_store.get_metrics(chatbot_type)
+                hits = info["exact_hits"] + info["ngram_hits"]
+                caches["faq"] = (hits, info["lookups"] - hits)
+            for cache, (hits, misses) in caches.items():
+                cache_labels = labels + (("cache", cache),)
+                writer.counter("cache_hits_total", "Cache hits", hits, cache_labels)
+                writer.counter("cache_misses_total", "Cache misses", misses, cache_labels)
+                writer.gauge("cache_hit_ratio", "Cache hits over lookups", hits / (hits + misses) if hits + misses else 0.0,
+                             cache_labels)
+            
+            if self.off_topic_gate is not None:
+                writer.counter("off_topic_short_circuits_total", "Messages answered with the off-topic redirect",
+                               self.off_topic_gate.get_metrics(chatbot_type)["short_circuited"], labels)
+            if self.crisis_detector is not None and self.crisis_detector.handles(chatbot_type):
+                writer.counter("crisis_matches_total", "Messages that matched a crisis phrase",
+                               self.crisis_detector.get_metrics(chatbot_type)["matched"], labels)
+        
+        # In-flight chain calls are the closest thing to a queue depth; there is no request queue
+        brownout = brownout_policy.get_status()
+        writer.gauge("in_flight_requests", "LLM chain calls in progress", brownout["in_flight"])
+        writer.gauge("brownout_active", "Whether compact prompts are forced by load", brownout["active"])
+        writer.counter("brownout_activations_total", "Times the load brownout switched on", brownout["activations"])
+        writer.gauge("chatbots_available", "Chatbots loaded", len(self.chatbots))
+        writer.gauge("event_loop_lag_max_seconds", "Longest event loop lag seen by this worker", loop_monitor.max_lag)
+        if loop_monitor.debug:
+            writer.counter("event_loop_blocks_total", "Callbacks that blocked the event loop past the threshold",
+                           loop_monitor.blocks_detected)
+        
+        # Canary results are per worker: each worker runs its own canaries
+        for chatbot_type, slo in self.slo_tracker.get_status().items():
+            for window, values in slo["windows"].items():
+                for objective in ("availability", "latency"):
+                    writer.gauge("slo_burn_rate", "Error budget burn rate of canary calls (1.0 spends it exactly)",
+                                 values[f"{objective}_burn_rate"],
+                                 (("chatbot", chatbot_type), ("objective", objective), ("window", window)))
+        writer.counter("canaries_sent_total", "Canary prompts sent", sum(self.canary_scheduler.sent.values()))
+        if self.canary_scheduler.limiter is not None:
+            writer.counter("canaries_throttled_total", "Canaries delayed by the canary rate limit",
+                           self.canary_scheduler.limiter.throttled)
+        return writer.render()
+    
     def get_health_status(self) -> Dict[str, Any]:
         """Get overall health status of the chatbot system"""
         total_bots = len(self.chatbots)
@@ -173,7 +697,10 @@ class EnhancedChatbotManager:
             "available_chatbots": available_bots,
             "health_percentage": (available_bots / total_bots * 100) if total_bots > 0 else 0,
             "status": "healthy" if available_bots == total_bots else "degraded",
-            "chatbot_types": list(self.chatbots.keys())
+            "chatbot_types": list(self.chatbots.keys()),
+            "brownout": brownout_policy.get_status(),
+            "event_loop": loop_monitor.get_status(include_blocks=False),
+            "workers": get_worker_summary(collect_metrics()["workers"]) if settings.metrics_dir else None
         }
 
 # Global enhanced chatbot manager instance
@@ -188,6 +715,14 @@ async def get_chatbot_response_async(chatbot_type: str, user_input: str, context
     """Get asynchronous response from a chatbot with optional context"""
     return await enhanced_chatbot_manager.chat(chatbot_type, user_input, context)
 
+async def get_auto_chatbot_response(user_input: str, context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Get asynchronous response from the chatbot picked by the local intent router"""
+    return await enhanced_chatbot_manager.auto_chat(user_input, context)
+
+def classify_chatbot_intent(user_input: str) -> Dict[str, Any]:
+    """Classify a message into a chatbot type with a confidence score"""
+    return enhanced_chatbot_manager.classify_intent(user_input)
+
 async def get_batch_chatbot_responses(requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """Get responses from multiple chatbots in parallel"""
     return await enhanced_chatbot_manager.batch_chat(requests)
@@ -204,9 +739,39 @@ def get_chatbot_metrics() -> Dict[str, Any]:
     """Get performance metrics for all chatbots"""
     return enhanced_chatbot_manager.get_all_metrics()
 
+def get_chatbot_health() -> Dict[str, Any]:
+    """Get cached per-chatbot health without calling the LLM"""
+    return enhanced_chatbot_manager.health_monitor.get_health()
+
+def is_chatbot_system_ready() -> bool:
+    return enhanced_chatbot_manager.health_monitor.is_ready()
+
+def get_slo_status() -> Dict[str, Any]:
+    """Get per-chatbot SLO attainment, burn rates and alerts"""
+    return enhanced_chatbot_manager.slo_tracker.get_status()
+
+def start_health_probes():
+    """Start background canaries; call from the running event loop"""
+    enhanced_chatbot_manager.canary_scheduler.start()
+
+async def stop_health_probes():
+    await enhanced_chatbot_manager.canary_scheduler.stop()
+
+def get_prometheus_metrics() -> str:
+    """Get metrics in the Prometheus text format"""
+    return enhanced_chatbot_manager.get_prometheus_metrics()
+
 def get_system_health() -> Dict[str, Any]:
     """Get overall system health status"""
     return enhanced_chatbot_manager.get_health_status()
 
+def get_experiment_results() -> List[Dict[str, Any]]:
+    """Get per-variant results of running prompt experiments"""
+    return enhanced_chatbot_manager.get_experiment_results()
+
+def reload_chatbot_prompts() -> Dict[str, Any]:
+    """Reload prompts from the prompt directory"""
+    return enhanced_chatbot_manager.reload_prompts()
+
 # Maintain backward compatibility
 chatbot_manager = enhanced_chatbot_manager
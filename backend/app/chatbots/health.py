@@ -0,0 +1,89 @@
+"""
+Passive chatbot health
+
+Health comes from signals the chatbots already produce: the error rate and
+p90 latency of real traffic over the last five minutes. A chatbot without
+enough recent traffic falls back to its last canary result (see
+chatbots/canary.py), so a health check never calls the LLM itself.
+"""
+
+from typing import Dict, Any, Callable, Optional
+import time
+
+HEALTHY, DEGRADED, UNHEALTHY, UNKNOWN = "healthy", "degraded", "unhealthy", "unknown"
+
+class HealthMonitor:
+    """Derives per-chatbot health from recent traffic and cached probe results"""
+    
+    def __init__(self, get_chatbots: Callable[[], Dict[str, Any]], probe_seconds: float = 0.0,
+                 min_requests: int = 5, degraded_error_rate: float = 0.1, unhealthy_error_rate: float = 0.5,
+                 latency_seconds: float = 10.0):
+        self.get_chatbots = get_chatbots
+        self.probe_seconds = probe_seconds
+        self.min_requests = min_requests
+        self.degraded_error_rate = degraded_error_rate
+        self.unhealthy_error_rate = unhealthy_error_rate
+        self.latency_seconds = latency_seconds
+        self.probes: Dict[str, Dict[str, Any]] = {}
+    
+    def record_probe(self, chatbot_type: str, success: bool, duration: float, error: Optional[str] = None):
+        self.probes[chatbot_type] = {"success": success, "duration": duration, "error": error, "checked_at": time.time()}
+    
+    def _probe_is_fresh(self, probe: Dict[str, Any]) -> bool:
+        # A probe older than three cycles no longer says anything about the chatbot
+        return self.probe_seconds > 0 and time.time() - probe["checked_at"] <= 3 * self.probe_seconds
+    
+    def chatbot_health(self, chatbot_type: str, chatbot: Any) -> Dict[str, Any]:
+        tracker = chatbot.metrics.trackers.get(chatbot_type)
+        recent = tracker.window("5m") if tracker is not None else {"count": 0, "error_rate": 0.0, "p90": 0.0}
+        probe = self.probes.get(chatbot_type)
+        health = {
+            "requests_5m": recent["count"],
+            "error_rate_5m": recent["error_rate"],
+            "p90_5m": recent["p90"],
+            "probe": probe
+        }
+        
+        if recent["count"] >= self.min_requests:
+            if recent["error_rate"] >= self.unhealthy_error_rate:
+                status, reason = UNHEALTHY, f"{recent['error_rate']:.0%} of recent requests failed"
+            elif recent["error_rate"] >= self.degraded_error_rate:
+                status, reason = DEGRADED, f"{recent['error_rate']:.0%} of recent requests failed"
+            elif recent["p90"] > self.latency_seconds:
+                status, reason = DEGRADED, f"p90 latency {recent['p90']:.1f}s"
+            else:
+                status, reason = HEALTHY, "recent requests succeeding"
+        elif probe is not None and self._probe_is_fresh(probe):
+            status = HEALTHY if probe["success"] else UNHEALTHY
+            reason = "last probe succeeded" if probe["success"] else f"last probe failed: {probe['error']}"
+        else:
+            status, reason = UNKNOWN, "no recent traffic or probe"
+        health["status"] = status
+        health["reason"] = reason
+        return health
+    
+    def get_health(self) -> Dict[str, Any]:
+        """Per-chatbot health and an overall status; never calls the LLM"""
+        chatbots = {chatbot_type: self.chatbot_health(chatbot_type, chatbot)
+                    for chatbot_type, chatbot in list(self.get_chatbots().items())}
+        statuses = [health["status"] for health in chatbots.values()]
+        if not statuses or all(status == UNHEALTHY for status in statuses):
+            overall = UNHEALTHY
+        elif any(status in (UNHEALTHY, DEGRADED) for status in statuses):
+            overall = DEGRADED
+        else:
+            overall = HEALTHY
+        return {
+            "status": overall,
+            "chatbots": chatbots,
+            "healthy": sum(1 for status in statuses if status in (HEALTHY, UNKNOWN)),
+            "probe_seconds": self.probe_seconds
+        }
+    
+    def is_ready(self) -> bool:
+        """Ready to serve: chatbots are loaded and not every one of them is failing"""
+        chatbots = self.get_chatbots()
+        if not chatbots:
+            return False
+        return any(self.chatbot_health(chatbot_type, chatbot)["status"] != UNHEALTHY
+                   for chatbot_type, chatbot in list(chatbots.items()))
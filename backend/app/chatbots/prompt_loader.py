@@ -0,0 +1,140 @@
+"""
+Chatbot definitions loaded from a prompt directory
+
+Every <chatbot_type>.md file in the directory defines a chatbot, or replaces
+the built-in prompt of the same type. Optional companions:
+
+- <chatbot_type>.compact.md: a hand-written compact variant (otherwise derived)
+- <chatbot_type>.json: {"description": "...", "enabled": true}
+
+A type whose JSON sets "enabled": false is removed, even if it is built in.
+Loading validates everything before anything is swapped in, so a broken
+file leaves the running prompts untouched.
+"""
+
+from chatbots.prompt_templates import PromptEntry, PromptRegistry, get_builtin_prompts
+from core.prompting import PromptRenderer
+from typing import Dict, Any, Callable, Optional, Tuple
+import json
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+CHATBOT_TYPE_PATTERN = re.compile(r"^[a-z][a-z0-9_]{0,39}$")
+DEFINITION_SUFFIXES = (".compact.md", ".md", ".json")
+
+def split_definition_name(filename: str) -> Optional[Tuple[str, str]]:
+    """(chatbot_type, suffix) for a definition file, or None for anything else"""
+    for suffix in DEFINITION_SUFFIXES:
+        if filename.endswith(suffix):
+            chatbot_type = filename[:-len(suffix)]
+            return (chatbot_type, suffix) if CHATBOT_TYPE_PATTERN.match(chatbot_type) else None
+    return None
+
+def directory_signature(path: str) -> Tuple[Tuple[str, int, int], ...]:
+    """Names, sizes and mtimes of the definition files; cheap enough to poll"""
+    signature = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_file() and split_definition_name(entry.name):
+                stat = entry.stat()
+                signature.append((entry.name, stat.st_size, stat.st_mtime_ns))
+    return tuple(sorted(signature))
+
+def read_prompt_directory(path: str) -> Dict[str, Dict[str, Any]]:
+    """Definitions found in a directory, keyed by chatbot type"""
+    definitions: Dict[str, Dict[str, Any]] = {}
+    for filename in sorted(os.listdir(path)):
+        parts = split_definition_name(filename)
+        if parts is None:
+            continue
+        chatbot_type, suffix = parts
+        with open(os.path.join(path, filename), "r", encoding="utf-8") as f:
+            content = f.read()
+        definition = definitions.setdefault(chatbot_type, {})
+        if suffix == ".md":
+            definition["prompt"] = content.strip()
+            definition["source"] = os.path.join(path, filename)
+        elif suffix == ".compact.md":
+            definition["compact_prompt"] = content.strip()
+        else:
+            try:
+                metadata = json.loads(content)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"Invalid JSON in {filename}: {str(e)}")
+            if not isinstance(metadata, dict):
+                raise ValueError(f"{filename} must contain a JSON object")
+            definition["description"] = metadata.get("description")
+            definition["enabled"] = bool(metadata.get("enabled", True))
+    return definitions
+
+def load_prompt_registry(path: Optional[str], version: int = 1) -> PromptRegistry:
+    """Built-in prompts overlaid with a directory's definitions; raises ValueError if any are invalid"""
+    prompts = {chatbot_type: {"prompt": prompt} for chatbot_type, prompt in get_builtin_prompts().items()}
+    if path:
+        for chatbot_type, definition in read_prompt_directory(path).items():
+            if not definition.get("enabled", True):
+                prompts.pop(chatbot_type, None)
+                continue
+            if "prompt" not in definition and chatbot_type not in prompts:
+                raise ValueError(f"{chatbot_type} has metadata or a compact prompt but no {chatbot_type}.md")
+            merged = dict(prompts.get(chatbot_type, {}))
+            merged.update(definition)
+            prompts[chatbot_type] = merged
+    
+    entries = []
+    for chatbot_type, definition in prompts.items():
+        if not definition["prompt"]:
+            raise ValueError(f"Empty prompt for {chatbot_type}")
+        entry = PromptEntry.from_prompt(
+            chatbot_type, definition["prompt"], definition.get("compact_prompt"),
+            definition.get("description"), definition.get("source", "builtin")
+        )
+        # Unknown placeholders fail here rather than when the chain is rebuilt
+        PromptRenderer(entry.prompt)
+        PromptRenderer(entry.compact_prompt)
+        entries.append(entry)
+    return PromptRegistry(entries, version)
+
+class PromptDirectoryWatcher:
+    """Polls a prompt directory and calls back when its definition files change"""
+    
+    def __init__(self, path: str, on_change: Callable[[], Any], interval: float = 2.0):
+        self.path = path
+        self.on_change = on_change
+        self.interval = interval
+        self._signature = directory_signature(path)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def poll(self) -> bool:
+        """Reload if anything changed since the last poll"""
+        signature = directory_signature(self.path)
+        if signature == self._signature:
+            return False
+        self._signature = signature
+        self.on_change()
+        return True
+    
+    def start(self):
+        if self._thread is not None:
+            return
+        
+        def run():
+            while not self._stop.wait(self.interval):
+                try:
+                    self.poll()
+                except Exception as e:
+                    logger.error(f"❌ Prompt reload from {self.path} failed: {str(e)}")
+        
+        self._thread = threading.Thread(target=run, name="prompt-watcher", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
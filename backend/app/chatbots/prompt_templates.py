@@ -6,7 +6,31 @@ Each template defines the personality, expertise, and response guidelines
 
 """
 
-from typing import Dict
+from utils.tokens import count_tokens, get_tokenizer
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Callable, Dict, Iterable, Iterator, Optional
+import re
+
+# Canned redirect sentence quoted in each prompt's "Off-Topic Handling" section
+OFF_TOPIC_RESPONSE_PATTERN = re.compile(r'\*\*Off-Topic Handling:\*\*\s*\n[^"]*"([^"]+)"')
+
+SECTION_HEADING_PATTERN = re.compile(r'^\*\*([^*]+?):\*\*')
+
+# Sections a compact prompt keeps besides the opening persona line; personality, memory, evidence and style guidance are dropped
+COMPACT_SECTIONS = ("Your Role", "Safety Boundaries", "Important Disclaimers", "Crisis Detection Keywords", "Off-Topic Handling")
+
+PROMPT_VARIANTS = ("full", "compact")
+
+def compact_prompt(prompt: str) -> str:
+    """Cut a prompt down to its persona, role, safety and off-topic sections"""
+    paragraphs = prompt.split("\n\n")
+    kept = paragraphs[:1]
+    for paragraph in paragraphs[1:]:
+        heading = SECTION_HEADING_PATTERN.match(paragraph)
+        if heading and heading.group(1).startswith(COMPACT_SECTIONS):
+            kept.append(paragraph)
+    return "\n\n".join(kept)
 
 class PromptTemplates:
 
@@ -388,32 +412,124 @@ Remember: Great code is readable, maintainable, and efficient. Focus on understa
 Remember: Entertainment is deeply personal, and the perfect recommendation can create lasting memories. Focus on matching content to mood, preferences, and the specific experience someone is seeking."""
 
     @classmethod
-    def get_all_prompts(cls) -> Dict[str, str]:
-        """Get all prompt templates as a dictionary"""
+    def get_prompt_builders(cls) -> Dict[str, Callable[[], str]]:
+        """Prompt builder for each chatbot type, in registration order"""
         return {
-            'medical': cls.get_medical_prompt(),
-            'mental_health': cls.get_mental_health_prompt(),
-            'education': cls.get_education_prompt(),
-            'finance': cls.get_finance_prompt(),
-            'legal': cls.get_legal_prompt(),
-            'career': cls.get_career_prompt(),
-            'developer': cls.get_developer_prompt(),
-            'entertainment': cls.get_entertainment_prompt()
+            'medical': cls.get_medical_prompt,
+            'mental_health': cls.get_mental_health_prompt,
+            'education': cls.get_education_prompt,
+            'finance': cls.get_finance_prompt,
+            'legal': cls.get_legal_prompt,
+            'career': cls.get_career_prompt,
+            'developer': cls.get_developer_prompt,
+            'entertainment': cls.get_entertainment_prompt
         }
 
     @classmethod
-    def get_prompt_by_type(cls, chatbot_type: str) -> str:
+    def get_all_prompts(cls) -> Dict[str, str]:
+        """Get all prompt templates as a dictionary"""
+        return get_prompt_registry().prompts()
+
+    @classmethod
+    def get_prompt_by_type(cls, chatbot_type: str, variant: str = "full") -> str:
         """Get a specific prompt template by chatbot type"""
-        prompts = cls.get_all_prompts()
-        if chatbot_type not in prompts:
-            available_types = ', '.join(prompts.keys())
-            raise ValueError(f"Unknown chatbot type: {chatbot_type}. Available types: {available_types}")
-        return prompts[chatbot_type]
+        return get_prompt_registry().get(chatbot_type).get_variant(variant)
 
     @classmethod
     def get_available_types(cls) -> list:
         """Get list of available chatbot types"""
-        return list(cls.get_all_prompts().keys())
+        return list(get_prompt_registry().types)
+
+    @classmethod
+    def get_prompt_token_count(cls, chatbot_type: str, variant: str = "full") -> int:
+        """Get the precomputed token count of a chatbot's prompt"""
+        entry = get_prompt_registry().get(chatbot_type)
+        return entry.compact_token_count if variant == "compact" else entry.token_count
+
+    @classmethod
+    def get_off_topic_response(cls, chatbot_type: str) -> str:
+        """Get the canned redirect a chatbot gives for off-topic messages"""
+        off_topic_response = get_prompt_registry().get(chatbot_type).off_topic_response
+        if off_topic_response is None:
+            raise ValueError(f"No off-topic response defined for chatbot type: {chatbot_type}")
+        return off_topic_response
+
+@dataclass(frozen=True)
+class PromptEntry:
+    """A registered system prompt with the values derived from it"""
+    chatbot_type: str
+    prompt: str
+    token_count: int
+    off_topic_response: Optional[str]
+    compact_prompt: str
+    compact_token_count: int
+    description: Optional[str] = None
+    source: str = "builtin"
+
+    @classmethod
+    def from_prompt(cls, chatbot_type: str, prompt: str, compact: Optional[str] = None,
+                    description: Optional[str] = None, source: str = "builtin") -> "PromptEntry":
+        """Derive the redirect, compact variant (unless given) and token counts from a prompt"""
+        match = OFF_TOPIC_RESPONSE_PATTERN.search(prompt)
+        compact = compact or compact_prompt(prompt)
+        return cls(chatbot_type, prompt, count_tokens(prompt), match.group(1) if match else None,
+                   compact, count_tokens(compact), description, source)
+
+    def get_variant(self, variant: str) -> str:
+        if variant not in PROMPT_VARIANTS:
+            raise ValueError(f"Unknown prompt variant: {variant}. Available variants: {', '.join(PROMPT_VARIANTS)}")
+        return self.compact_prompt if variant == "compact" else self.prompt
+
+class PromptRegistry:
+    """Read-only prompt entries keyed by chatbot type, built once so lookups are a dict read"""
+
+    def __init__(self, entries: Iterable[PromptEntry], version: int = 1):
+        self._entries = MappingProxyType({entry.chatbot_type: entry for entry in entries})
+        self.types = tuple(self._entries)
+        self.version = version
+        self.tokenizer = get_tokenizer().name
+
+    @classmethod
+    def from_prompts(cls, prompts: Dict[str, str]) -> "PromptRegistry":
+        return cls(PromptEntry.from_prompt(chatbot_type, prompt) for chatbot_type, prompt in prompts.items())
+
+    def get(self, chatbot_type: str) -> PromptEntry:
+        entry = self._entries.get(chatbot_type)
+        if entry is None:
+            available_types = ', '.join(self.types)
+            raise ValueError(f"Unknown chatbot type: {chatbot_type}. Available types: {available_types}")
+        return entry
+
+    def __contains__(self, chatbot_type: str) -> bool:
+        return chatbot_type in self._entries
+
+    def __iter__(self) -> Iterator[PromptEntry]:
+        return iter(self._entries.values())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def prompts(self) -> Dict[str, str]:
+        return {chatbot_type: entry.prompt for chatbot_type, entry in self._entries.items()}
+
+    def token_counts(self, variant: str = "full") -> Dict[str, int]:
+        return {chatbot_type: entry.compact_token_count if variant == "compact" else entry.token_count
+                for chatbot_type, entry in self._entries.items()}
+
+def get_builtin_prompts() -> Dict[str, str]:
+    """Get the prompts defined in this module, ignoring any loaded from a directory"""
+    return {chatbot_type: build() for chatbot_type, build in PromptTemplates.get_prompt_builders().items()}
+
+_prompt_registry = PromptRegistry.from_prompts(get_builtin_prompts())
+
+def get_prompt_registry() -> PromptRegistry:
+    """Get the current prompt registry"""
+    return _prompt_registry
+
+def set_prompt_registry(registry: PromptRegistry):
+    """Swap in a new registry; callers holding the previous one keep a consistent view"""
+    global _prompt_registry
+    _prompt_registry = registry
 
 # Convenience functions for easy access
 
@@ -428,3 +544,7 @@ def get_all_prompt_templates() -> Dict[str, str]:
 def get_available_chatbot_types() -> list:
     """Get list of available chatbot types"""
     return PromptTemplates.get_available_types()
+
+def get_prompt_token_counts(variant: str = "full") -> Dict[str, int]:
+    """Get the precomputed token count of every prompt"""
+    return get_prompt_registry().token_counts(variant)
@@ -0,0 +1,159 @@
+"""
+Local off-topic detection that answers the canned redirect without calling the LLM
+"""
+
+from chatbots.prompt_templates import PromptTemplates
+from routing.intent import IntentClassifier, HashedFeatureExtractor
+from typing import Dict, Any, List, Optional
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+OFF_TOPIC_MODES = ("off", "shadow", "enforce")
+
+class OffTopicGate:
+    """Per-chatbot relevance scorer in front of the chain
+    
+    A message is off-topic for a chatbot when the classifier gives that chatbot
+    almost no probability while being confident about some other label. In
+    "shadow" mode decisions are only recorded and compared against what the LLM
+    actually answered; in "enforce" mode the canned redirect is returned directly.
+    """
+    
+    def __init__(self, classifier: IntentClassifier, redirects: Dict[str, str], mode: str = "shadow",
+                 min_confidence: float = 0.7, max_relevance: float = 0.05,
+                 thresholds: Optional[Dict[str, float]] = None):
+        if mode not in OFF_TOPIC_MODES:
+            raise ValueError(f"Unknown off-topic mode: {mode}. Available modes: {', '.join(OFF_TOPIC_MODES)}")
+        
+        self.classifier = classifier
+        self.redirects = redirects
+        self.mode = mode
+        self.min_confidence = min_confidence
+        self.max_relevance = max_relevance
+        # Per-chatbot overrides of max_relevance
+        self.thresholds = thresholds or {}
+        self._tokenizer = HashedFeatureExtractor()
+        self._redirect_tokens = {
+            chatbot_type: set(self._tokenizer.tokenize(redirect))
+            for chatbot_type, redirect in redirects.items()
+        }
+        self._lock = threading.Lock()
+        self.metrics: Dict[str, Dict[str, int]] = {}
+    
+    def update_redirects(self, redirects: Dict[str, str]):
+        """Replace the canned redirects of some chatbots (after a prompt reload)"""
+        merged = dict(self.redirects)
+        merged.update(redirects)
+        redirect_tokens = dict(self._redirect_tokens)
+        redirect_tokens.update({
+            chatbot_type: set(self._tokenizer.tokenize(redirect))
+            for chatbot_type, redirect in redirects.items()
+        })
+        self.redirects, self._redirect_tokens = merged, redirect_tokens
+    
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+    
+    def _counters(self, chatbot_type: str) -> Dict[str, int]:
+        if chatbot_type not in self.metrics:
+            self.metrics[chatbot_type] = {
+                "checked": 0,
+                "flagged": 0,
+                "short_circuited": 0,
+                "shadow_agreed": 0,
+                "shadow_false_positives": 0,
+                "shadow_false_negatives": 0
+            }
+        return self.metrics[chatbot_type]
+    
+    def check(self, chatbot_type: str, user_input: str) -> Dict[str, Any]:
+        """Score a message's relevance to a chatbot"""
+        probabilities = self.classifier.predict_proba(user_input)
+        relevance = probabilities.get(chatbot_type, 0.0)
+        predicted, confidence = max(probabilities.items(), key=lambda item: item[1])
+        
+        off_topic = (
+            chatbot_type in self.redirects
+            and predicted != chatbot_type
+            and confidence >= self.min_confidence
+            and relevance <= self.thresholds.get(chatbot_type, self.max_relevance)
+        )
+        
+        with self._lock:
+            counters = self._counters(chatbot_type)
+            counters["checked"] += 1
+            if off_topic:
+                counters["flagged"] += 1
+                if self.mode == "enforce":
+                    counters["short_circuited"] += 1
+        
+        return {
+            "off_topic": off_topic,
+            "relevance": relevance,
+            "predicted_label": predicted,
+            "confidence": confidence
+        }
+    
+    def should_short_circuit(self, decision: Dict[str, Any]) -> bool:
+        """Whether a decision from check() replaces the LLM call"""
+        return self.mode == "enforce" and decision["off_topic"]
+    
+    def get_redirect(self, chatbot_type: str) -> str:
+        """Get the canned redirect for a chatbot"""
+        return self.redirects[chatbot_type]
+    
+    def is_redirect(self, chatbot_type: str, response: Optional[str]) -> bool:
+        """Whether an LLM response is essentially the chatbot's canned redirect"""
+        redirect_tokens = self._redirect_tokens.get(chatbot_type)
+        if not response or not redirect_tokens:
+            return False
+        response_tokens = set(self._tokenizer.tokenize(response))
+        overlap = len(redirect_tokens & response_tokens) / len(redirect_tokens)
+        return overlap >= 0.6 and len(response_tokens) <= len(redirect_tokens) * 3
+    
+    def record_shadow_outcome(self, chatbot_type: str, decision: Dict[str, Any], response: Optional[str]):
+        """Compare a shadow decision with what the LLM actually answered"""
+        llm_redirected = self.is_redirect(chatbot_type, response)
+        
+        with self._lock:
+            counters = self._counters(chatbot_type)
+            if decision["off_topic"] and llm_redirected:
+                counters["shadow_agreed"] += 1
+            elif decision["off_topic"]:
+                counters["shadow_false_positives"] += 1
+                logger.info(
+                    f"Off-topic shadow false positive for {chatbot_type} "
+                    f"(predicted {decision['predicted_label']} at {decision['confidence']:.2f})"
+                )
+            elif llm_redirected:
+                counters["shadow_false_negatives"] += 1
+    
+    def get_metrics(self, chatbot_type: str) -> Dict[str, Any]:
+        """Get short-circuit counters and rates for a chatbot"""
+        with self._lock:
+            counters = dict(self._counters(chatbot_type))
+        
+        checked = counters["checked"]
+        flagged = counters["flagged"]
+        counters["mode"] = self.mode
+        counters["flag_rate"] = flagged / checked if checked else 0.0
+        counters["short_circuit_rate"] = counters["short_circuited"] / checked if checked else 0.0
+        
+        judged = counters["shadow_agreed"] + counters["shadow_false_positives"]
+        counters["shadow_precision"] = counters["shadow_agreed"] / judged if judged else None
+        return counters
+
+def create_off_topic_gate(classifier: IntentClassifier, chatbot_types: List[str], mode: str = "shadow",
+                          **kwargs) -> OffTopicGate:
+    """Create a gate using the canned redirects from the prompt templates"""
+    redirects = {}
+    for chatbot_type in chatbot_types:
+        try:
+            redirects[chatbot_type] = PromptTemplates.get_off_topic_response(chatbot_type)
+        except ValueError as e:
+            logger.warning(f"Off-topic gate disabled for {chatbot_type}: {str(e)}")
+    
+    return OffTopicGate(classifier, redirects, mode=mode, **kwargs)
@@ -38,6 +38,92 @@ class Settings(BaseSettings):
     max_tokens: int = 1000
     temperature: float = 0.7
     
+    # Intent Routing Configuration
+    intent_model_path: Optional[str] = None  # Offline-trained model; trains from bundled examples when unset
+    intent_min_confidence: float = 0.25  # Below this /auto uses the fallback chatbot or asks the user to clarify
+    intent_fallback_type: Optional[str] = None  # Chatbot for low-confidence messages; asks to clarify when unset
+    
+    # Off-Topic Short-Circuit Configuration
+    off_topic_mode: str = "shadow"  # off, shadow (record only) or enforce (answer the canned redirect)
+    off_topic_min_confidence: float = 0.7
+    off_topic_max_relevance: float = 0.05
+    
+    # Crisis Fast Path Configuration
+    crisis_detection_enabled: bool = True
+    crisis_continue_with_llm: bool = False  # Also answer statements of intent after the resources (keyword matches always are)
+    crisis_phrases_path: Optional[str] = None  # Defaults to the bundled app/data/crisis_phrases.json
+    
+    # FAQ Store Configuration
+    faq_store_path: Optional[str] = None  # Built with build_faq_store.py; disabled when unset
+    faq_min_similarity: float = 0.85
+    
+    # Retrieval Configuration
+    retrieval_index_dir: Optional[str] = None  # Holds <chatbot_type>/<backend> index directories
+    retrieval_backend: str = "bm25"  # "bm25", "dense" or "hybrid" (both, fused)
+    retrieval_top_k: int = 3
+    retrieval_nprobe: int = 8  # IVF lists scanned per dense query
+    retrieval_refresh_seconds: float = 2.0  # How often segmented indexes check for new segments
+    retrieval_merge_max_segments: int = 4  # Merge in the background above this many segments; 0 disables
+    retrieval_reranker: Optional[str] = None  # Hybrid only: "lexical" or "cross-encoder:<model>"
+    retrieval_budget_ms: float = 150.0  # Hybrid only: fuse whatever candidates are ready by then
+    retrieval_candidates: int = 20  # Hybrid only: candidates taken from each index
+    retrieval_cache_size: int = 1024  # Hybrid only: cached results per (chatbot, normalized query)
+    
+    # Prompt Directory Configuration
+    prompt_dir: Optional[str] = None  # <chatbot_type>.md files that add or replace chatbots; built-in prompts only when unset
+    prompt_reload_seconds: float = 0.0  # Poll the prompt directory this often; 0 reloads only via the admin endpoint
+    
+    # Admin Configuration
+    admin_token: Optional[str] = None  # Sent as X-Admin-Token to /api/admin endpoints; they are disabled when unset
+    
+    # Prompt Variant Configuration
+    prompt_variant: str = "full"  # "full", or "compact" (role, safety and off-topic sections only); requests may override
+    brownout_enabled: bool = False  # Switch to compact prompts automatically while too many chain calls are in flight
+    brownout_enter_in_flight: int = 32  # In-flight chain calls that start a brownout
+    brownout_exit_in_flight: int = 16  # In-flight chain calls at or below which it ends
+    brownout_min_seconds: float = 10.0  # Shortest brownout, so the variant doesn't flap under bursty load
+    
+    # Prompt Experiment Configuration
+    experiments_path: Optional[str] = None  # JSON experiment definitions (see core/experiments.py); none run when unset
+    
+    # Health Configuration
+    health_probe_seconds: float = 0.0  # Background probe cycle; each chatbot gets one LLM call per cycle (0 disables probes)
+    health_probe_message: str = "Hello, this is a health check. Please reply briefly."
+    health_min_requests: int = 5  # Recent requests needed to judge a chatbot by its traffic instead of its last probe
+    health_degraded_error_rate: float = 0.1
+    health_unhealthy_error_rate: float = 0.5
+    health_latency_seconds: float = 10.0  # Recent p90 latency above which a chatbot is degraded
+    canary_prompts_path: Optional[str] = None  # JSON {"chatbot_type": [prompts]}; defaults to a few intent examples per chatbot
+    canary_max_per_minute: float = 30.0  # Cap on canary LLM calls per worker, whatever the cycle and chatbot count (0 disables canaries)
+    
+    # SLO Configuration
+    slo_availability_target: float = 0.99  # Share of chain calls that must succeed
+    slo_latency_seconds: float = 5.0
+    slo_latency_target: float = 0.95  # Share of chain calls that must finish within slo_latency_seconds
+    
+    # Metrics Configuration
+    metrics_dir: Optional[str] = None  # Per-worker mmap'd metrics files, merged on read; metrics stay in-process when unset
+    metrics_file_bytes: int = 4 * 1024 * 1024  # Space per worker file (sparse); about 1,400 latency series
+    
+    # Tracing Configuration
+    tracing_sample_rate: float = 0.0  # Share of requests traced, decided at the start of each request (0 disables tracing)
+    tracing_export_path: str = "traces.jsonl"  # One OTLP/JSON trace per line, appended by every worker
+    tracing_export_queue: int = 1000  # Finished traces waiting for the export thread; further ones are dropped
+    tracing_parent_sampled_per_second: float = 10.0  # Requests a second an incoming traceparent may force into sampling
+    
+    # Debug Configuration
+    debug_slowest_requests: int = 10  # Slowest chat requests kept per five-minute slot over the last hour (0 keeps none)
+    debug_recent_errors: int = 50  # Most recent failed requests kept
+    debug_input_chars: int = 200  # Message characters kept with each sample
+    
+    # Event Loop Configuration
+    loop_lag_interval_seconds: float = 0.5  # How often event loop lag is sampled (0 disables)
+    loop_block_threshold_seconds: float = 0.0  # Keep stacks of callbacks blocking the loop longer than this (0 disables)
+    
+    # Profiling Configuration
+    profile_max_seconds: float = 60.0  # Longest CPU profile the admin endpoint will run
+    memory_trace_max_seconds: float = 3600.0  # Memory tracing stops by itself after this long
+    
     # Logging Configuration
     log_level: str = "INFO"
     
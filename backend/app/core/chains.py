@@ -3,15 +3,29 @@ from langchain.schema.runnable import RunnablePassthrough, RunnableLambda
 from langchain.schema.output_parser import StrOutputParser
 from langchain_core.callbacks import AsyncCallbackHandler  # ✅ Updated import
 from core.llm import get_llm
-from typing import Dict, Any, List, Optional, Callable
+from core.prompting import PromptRenderer, BrownoutPolicy
+from core.experiments import PromptExperiment, ExperimentVariant
+from core.metrics import LatencyTracker
+from core.shared_metrics import get_worker_metrics
+from core.timing import get_stage_timer, record_stage
+from utils.tracing import start_span
+from utils.tokens import count_tokens
+from config import settings
+from typing import Dict, Any, List, Optional, Callable, Tuple
 import logging
 import time
+import threading
 import asyncio
+import contextvars
 from datetime import datetime
+from functools import lru_cache
 
 
 logger = logging.getLogger(__name__)
 
+# Rendered system prompts repeat (the renderer caches them), so their token counts are cached too
+prompt_token_count = lru_cache(maxsize=256)(count_tokens)
+
 class ChatbotResponseValidator:
     """Validates and formats chatbot responses"""
     
@@ -51,59 +65,221 @@ class ChatbotChainMetrics:
     """Tracks metrics for chatbot chains"""
     
     def __init__(self):
-        self.metrics = {}
+        self.trackers: Dict[str, LatencyTracker] = {}
+        self.last_invocation: Dict[str, float] = {}
+        self.tokens: Dict[str, memoryview] = {}  # chatbot_type -> [input tokens, output tokens]
+        self._lock = threading.Lock()
+    
+    def _tracker(self, chatbot_type: str) -> LatencyTracker:
+        tracker = self.trackers.get(chatbot_type)
+        if tracker is None:
+            with self._lock:
+                tracker = self.trackers.get(chatbot_type)
+                if tracker is None:
+                    tracker = LatencyTracker(get_worker_metrics().histogram(f"request|{chatbot_type}"))
+                    self.trackers[chatbot_type] = tracker
+        return tracker
     
     def record_invocation(self, chatbot_type: str, duration: float, success: bool):
         """Record chain invocation metrics"""
-        if chatbot_type not in self.metrics:
-            self.metrics[chatbot_type] = {
-                "total_invocations": 0,
-                "successful_invocations": 0,
-                "total_duration": 0.0,
-                "average_duration": 0.0,
-                "last_invocation": None
-            }
-        
-        self.metrics[chatbot_type]["total_invocations"] += 1
-        self.metrics[chatbot_type]["total_duration"] += duration
-        self.metrics[chatbot_type]["last_invocation"] = datetime.now()
-        
-        if success:
-            self.metrics[chatbot_type]["successful_invocations"] += 1
-        
-        # Update average
-        self.metrics[chatbot_type]["average_duration"] = (
-            self.metrics[chatbot_type]["total_duration"] / 
-            self.metrics[chatbot_type]["total_invocations"]
-        )
+        self._tracker(chatbot_type).record(duration, success)
+        self.last_invocation[chatbot_type] = time.time()
+    
+    def record_tokens(self, chatbot_type: str, input_tokens: int, output_tokens: int):
+        """Record LLM token usage for one call"""
+        with self._lock:
+            counts = self.tokens.get(chatbot_type)
+            if counts is None:
+                counts = self.tokens[chatbot_type] = get_worker_metrics().counters(f"tokens|{chatbot_type}", 2)
+            counts[0] += input_tokens
+            counts[1] += output_tokens
+    
+    def get_tokens(self, chatbot_type: str) -> Tuple[int, int]:
+        counts = self.tokens.get(chatbot_type, (0, 0))
+        return counts[0], counts[1]
+    
+    def _summary(self, chatbot_type: str) -> Dict[str, Any]:
+        latency = self.trackers[chatbot_type].summary()
+        last_invocation = self.last_invocation.get(chatbot_type)
+        input_tokens, output_tokens = self.get_tokens(chatbot_type)
+        return {
+            "total_invocations": latency["count"],
+            "successful_invocations": latency["count"] - latency["errors"],
+            "total_duration": latency["mean"] * latency["count"],
+            "average_duration": latency["mean"],
+            "last_invocation": datetime.fromtimestamp(last_invocation).isoformat() if last_invocation else None,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "latency": latency
+        }
     
     def get_metrics(self, chatbot_type: Optional[str] = None) -> Dict[str, Any]:
         """Get metrics for a specific chatbot or all chatbots"""
         if chatbot_type:
-            return self.metrics.get(chatbot_type, {})
-        return self.metrics.copy()
+            return self._summary(chatbot_type) if chatbot_type in self.trackers else {}
+        return {name: self._summary(name) for name in list(self.trackers)}
+
+def format_reference_material(passages: List[Dict[str, Any]], max_chars_per_passage: int = 800) -> str:
+    """Render retrieved passages as a numbered reference section for the system prompt"""
+    lines = [
+        "**Reference Material:**",
+        "Ground your answer in these passages where relevant and cite them by number and source."
+    ]
+    for number, passage in enumerate(passages, 1):
+        text = passage["text"]
+        if len(text) > max_chars_per_passage:
+            text = text[:max_chars_per_passage].rsplit(" ", 1)[0] + "..."
+        source = f" ({passage['source']})" if passage.get("source") else ""
+        lines.append(f"[{number}]{source} {text}")
+    return "\n".join(lines)
+
+# Shared by all chains: in-flight chain calls are the load signal
+brownout_policy = BrownoutPolicy(
+    enabled=settings.brownout_enabled,
+    enter_in_flight=settings.brownout_enter_in_flight,
+    exit_in_flight=settings.brownout_exit_in_flight,
+    min_seconds=settings.brownout_min_seconds
+)
 
 class EnhancedChatbotChain:
     """Enhanced chatbot chain with validation, metrics, and error handling"""
     
-    def __init__(self, system_prompt: str, chatbot_type: str):
+    def __init__(self, system_prompt: str, chatbot_type: str, compact_prompt: Optional[str] = None):
         self.system_prompt = system_prompt
         self.chatbot_type = chatbot_type
+        self.prompt_renderers = {
+            "full": PromptRenderer(system_prompt),
+            "compact": PromptRenderer(compact_prompt or system_prompt)
+        }
+        self.default_prompt_variant = settings.prompt_variant if settings.prompt_variant in self.prompt_renderers else "full"
+        self.prompt_variant_counts = {variant: 0 for variant in self.prompt_renderers}
+        self._variant_lock = threading.Lock()
         self.llm = get_llm()
         self.output_parser = StrOutputParser()
         self.validator = ChatbotResponseValidator()
         self.metrics = ChatbotChainMetrics()
+        self.retriever = None
+        self.retrieval_top_k = 3
+        self.experiment: Optional[PromptExperiment] = None
         self._build_chain()
     
+    def set_retriever(self, retriever, top_k: int = 3):
+        """Attach a passage retriever (anything with search(query, top_k)) used to ground answers"""
+        self.retriever = retriever
+        self.retrieval_top_k = top_k
+    
+    def set_experiment(self, experiment: Optional[PromptExperiment]):
+        """Split this chatbot's sessions across an experiment's prompt variants (None stops it)"""
+        self.experiment = experiment
+    
+    def _record_experiment(self, experiment: Optional[PromptExperiment], arm, duration: float,
+                           response: Optional[str] = None, validation: Optional[Dict[str, Any]] = None):
+        if arm is None:
+            return
+        if validation is None:
+            experiment.record(arm, duration, False)
+        else:
+            experiment.record(arm, duration, True, len(validation["issues"]), not validation["is_valid"], count_tokens(response))
+    
+    def _retrieve(self, user_input: str) -> List[Dict[str, Any]]:
+        """Get reference passages for a message; retrieval failures never fail the chat"""
+        if self.retriever is None:
+            return []
+        try:
+            return self.retriever.search(user_input, self.retrieval_top_k)
+        except Exception as e:
+            logger.error(f"Retrieval failed for {self.chatbot_type}: {str(e)}")
+            return []
+    
+    async def _aretrieve(self, user_input: str) -> List[Dict[str, Any]]:
+        """Retrieve off the event loop; index searches are blocking numpy/file work"""
+        if self.retriever is None:
+            return []
+        # Carry the request context over so the retrieval span's children attach to it
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(None, context.run, self._retrieve, user_input)
+    
+    def select_prompt_variant(self, context: Optional[Dict[str, Any]], under_load: bool = False,
+                              arm: Optional[ExperimentVariant] = None,
+                              count: bool = True) -> Tuple[str, Optional[ExperimentVariant]]:
+        """Pick the prompt for a call and count it
+        
+        An explicit context["prompt_variant"] wins, then the brownout, then the
+        session's experiment arm, then the configured default. Returns the variant
+        actually sent and the arm, which is None when the flag or the brownout
+        overrode it, so an experiment only counts calls that used its prompt.
+        """
+        requested = context.get("prompt_variant") if context else None
+        if requested in self.prompt_renderers:
+            variant, arm = requested, None
+        elif under_load:
+            variant, arm = "compact", None
+        elif arm is not None and arm.renderer is not None:
+            variant = f"experiment:{arm.name}"
+        elif arm is not None and arm.prompt_variant in self.prompt_renderers:
+            variant = arm.prompt_variant
+        else:
+            variant = self.default_prompt_variant
+        if count:
+            with self._variant_lock:
+                self.prompt_variant_counts[variant] = self.prompt_variant_counts.get(variant, 0) + 1
+        return variant, arm
+    
     def _build_chain(self):
         """Build the enhanced LangChain chain with middleware"""
         
         def create_messages(inputs: Dict[str, Any]) -> List[BaseMessage]:
             """Create message list from inputs"""
-            return [
-                SystemMessage(content=self.system_prompt),
-                HumanMessage(content=inputs["user_input"])
-            ]
+            started = time.perf_counter()
+            with start_span("prompt", {"prompt.variant": inputs.get("prompt_variant", "full")}) as span:
+                # Request context (locale, expertise level) fills the prompt's placeholders
+                renderer = inputs.get("experiment_renderer") or self.prompt_renderers[inputs.get("prompt_variant", "full")]
+                system_prompt = renderer.render(inputs)
+                if inputs.get("retrieved_passages"):
+                    system_prompt = f"{system_prompt}\n\n{format_reference_material(inputs['retrieved_passages'])}"
+                messages = [
+                    SystemMessage(content=system_prompt),
+                    HumanMessage(content=inputs["user_input"])
+                ]
+                span.set_attribute("prompt.chars", len(system_prompt))
+            record_stage("prompt", time.perf_counter() - started)
+            return messages
+        
+        def generate(inputs: Dict[str, Any]) -> BaseMessage:
+            """Stream the completion so time-to-first-token and generation time can be told apart"""
+            timer = get_stage_timer()
+            with start_span("llm.generate", {"gen_ai.system": "groq", "gen_ai.request.model": settings.groq_model},
+                            "client") as span:
+                started = time.perf_counter()
+                message = None
+                for chunk in self.llm.stream(inputs["messages"]):
+                    if message is None:
+                        first_token = time.perf_counter()
+                        span.add_event("first_token")
+                        message = chunk
+                    else:
+                        message += chunk
+                if message is None:
+                    raise ValueError("LLM returned no output")
+                if timer is not None:
+                    finished = time.perf_counter()
+                    timer.add("ttft", first_token - started)
+                    timer.add("generation", finished - first_token)
+                # Prefer the provider's usage report; estimate locally when it has none
+                usage = getattr(message, "usage_metadata", None)
+                if usage:
+                    input_tokens, output_tokens = usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+                else:
+                    input_tokens = sum(prompt_token_count(m.content) for m in inputs["messages"])
+                    output_tokens = count_tokens(message.content)
+                if not inputs.get("synthetic"):
+                    self.metrics.record_tokens(self.chatbot_type, input_tokens, output_tokens)
+                if timer is not None:
+                    timer.details.update(model=settings.groq_model, input_tokens=input_tokens, output_tokens=output_tokens)
+                span.set_attribute("gen_ai.usage.input_tokens", input_tokens)
+                span.set_attribute("gen_ai.usage.output_tokens", output_tokens)
+                span.set_attribute("gen_ai.usage.estimated", not usage)
+            return message
         
         def format_response(response: str) -> str:
             """Format and clean the response"""
@@ -119,46 +295,80 @@ class EnhancedChatbotChain:
         # Build the chain with middleware
         self.chain = (
             RunnablePassthrough.assign(messages=RunnableLambda(create_messages))
-            | RunnableLambda(lambda x: self.llm.invoke(x["messages"]))
+            | RunnableLambda(generate)
             | self.output_parser
             | RunnableLambda(format_response)
         )
     
-    async def invoke(self, user_input: str, context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        """Async invocation with full error handling and validation"""
+    async def invoke(self, user_input: str, context: Optional[Dict[str, Any]] = None,
+                     synthetic: bool = False) -> Dict[str, Any]:
+        """Async invocation with full error handling and validation
+        
+        A synthetic call (a canary) is left out of the chain metrics, token counts,
+        brownout load, prompt variant counts and experiments, so it never looks
+        like user traffic; its caller records the result.
+        """
         start_time = time.time()
+        experiment = self.experiment if not synthetic else None
+        arm = experiment.assign(context) if experiment is not None else None
+        under_load = brownout_policy.active if synthetic else brownout_policy.enter()
+        prompt_variant, arm = self.select_prompt_variant(context, under_load, arm, count=not synthetic)
         
         try:
             # Prepare input
             chain_input = {"user_input": user_input}
             if context:
                 chain_input.update(context)
+            chain_input["prompt_variant"] = prompt_variant
+            chain_input["experiment_renderer"] = arm.renderer if arm is not None else None
+            chain_input["synthetic"] = synthetic
+            retrieval_started = time.perf_counter()
+            with start_span("retrieval") as span:
+                passages = await self._aretrieve(user_input)
+                span.set_attribute("retrieval.passages", len(passages))
+            if self.retriever is not None:
+                record_stage("retrieval", time.perf_counter() - retrieval_started)
+            chain_input["retrieved_passages"] = passages
             
             # Invoke the chain
             response = await self.chain.ainvoke(chain_input)
             
             # Validate response
-            validation = self.validator.validate_response(response, self.chatbot_type)
+            validation_started = time.perf_counter()
+            with start_span("response_validation") as span:
+                validation = self.validator.validate_response(response, self.chatbot_type)
+                span.set_attribute("validation.issues", len(validation["issues"]))
+            record_stage("response_validation", time.perf_counter() - validation_started)
             
             # Calculate duration
             duration = time.time() - start_time
             
             # Record metrics
-            self.metrics.record_invocation(self.chatbot_type, duration, True)
+            if not synthetic:
+                self.metrics.record_invocation(self.chatbot_type, duration, True)
+            self._record_experiment(experiment, arm, duration, response, validation)
             
-            return {
+            result = {
                 "success": True,
                 "response": validation["formatted_response"],
                 "chatbot_type": self.chatbot_type,
                 "error": None,
                 "validation": validation,
                 "duration": duration,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": datetime.now().isoformat(),
+                "prompt_variant": prompt_variant
             }
-            
+            if arm is not None:
+                result["experiment"] = {"name": experiment.name, "variant": arm.name}
+            if passages:
+                result["sources"] = [passage.get("source") for passage in passages]
+            return result
+        
         except Exception as e:
             duration = time.time() - start_time
-            self.metrics.record_invocation(self.chatbot_type, duration, False)
+            if not synthetic:
+                self.metrics.record_invocation(self.chatbot_type, duration, False)
+            self._record_experiment(experiment, arm, duration)
             
             logger.error(f"Error in {self.chatbot_type} chain: {str(e)}")
             return {
@@ -168,44 +378,77 @@ class EnhancedChatbotChain:
                 "error": str(e),
                 "validation": None,
                 "duration": duration,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": datetime.now().isoformat(),
+                "prompt_variant": prompt_variant
             }
+        finally:
+            if not synthetic:
+                brownout_policy.exit()
     
-    def invoke_sync(self, user_input: str, context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    def invoke_sync(self, user_input: str, context: Optional[Dict[str, Any]] = None,
+                    synthetic: bool = False) -> Dict[str, Any]:
         """Synchronous version of invoke"""
         start_time = time.time()
+        experiment = self.experiment if not synthetic else None
+        arm = experiment.assign(context) if experiment is not None else None
+        under_load = brownout_policy.active if synthetic else brownout_policy.enter()
+        prompt_variant, arm = self.select_prompt_variant(context, under_load, arm, count=not synthetic)
         
         try:
             # Prepare input
             chain_input = {"user_input": user_input}
             if context:
                 chain_input.update(context)
+            chain_input["prompt_variant"] = prompt_variant
+            chain_input["experiment_renderer"] = arm.renderer if arm is not None else None
+            chain_input["synthetic"] = synthetic
+            retrieval_started = time.perf_counter()
+            with start_span("retrieval") as span:
+                passages = self._retrieve(user_input)
+                span.set_attribute("retrieval.passages", len(passages))
+            if self.retriever is not None:
+                record_stage("retrieval", time.perf_counter() - retrieval_started)
+            chain_input["retrieved_passages"] = passages
             
             # Invoke the chain
             response = self.chain.invoke(chain_input)
             
             # Validate response
-            validation = self.validator.validate_response(response, self.chatbot_type)
+            validation_started = time.perf_counter()
+            with start_span("response_validation") as span:
+                validation = self.validator.validate_response(response, self.chatbot_type)
+                span.set_attribute("validation.issues", len(validation["issues"]))
+            record_stage("response_validation", time.perf_counter() - validation_started)
             
             # Calculate duration
             duration = time.time() - start_time
             
             # Record metrics
-            self.metrics.record_invocation(self.chatbot_type, duration, True)
+            if not synthetic:
+                self.metrics.record_invocation(self.chatbot_type, duration, True)
+            self._record_experiment(experiment, arm, duration, response, validation)
             
-            return {
+            result = {
                 "success": True,
                 "response": validation["formatted_response"],
                 "chatbot_type": self.chatbot_type,
                 "error": None,
                 "validation": validation,
                 "duration": duration,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": datetime.now().isoformat(),
+                "prompt_variant": prompt_variant
             }
-            
+            if arm is not None:
+                result["experiment"] = {"name": experiment.name, "variant": arm.name}
+            if passages:
+                result["sources"] = [passage.get("source") for passage in passages]
+            return result
+        
         except Exception as e:
             duration = time.time() - start_time
-            self.metrics.record_invocation(self.chatbot_type, duration, False)
+            if not synthetic:
+                self.metrics.record_invocation(self.chatbot_type, duration, False)
+            self._record_experiment(experiment, arm, duration)
             
             logger.error(f"Error in {self.chatbot_type} chain: {str(e)}")
             return {
@@ -215,12 +458,21 @@ class EnhancedChatbotChain:
                 "error": str(e),
                 "validation": None,
                 "duration": duration,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": datetime.now().isoformat(),
+                "prompt_variant": prompt_variant
             }
+        finally:
+            if not synthetic:
+                brownout_policy.exit()
     
     def get_metrics(self) -> Dict[str, Any]:
         """Get chain performance metrics"""
         return self.metrics.get_metrics(self.chatbot_type)
+    
+    def get_prompt_variant_metrics(self) -> Dict[str, int]:
+        """Get how many calls used each prompt variant"""
+        with self._variant_lock:
+            return dict(self.prompt_variant_counts)
 
 class EnhancedChainFactory:
     """Enhanced factory for creating and managing chatbot chains"""
@@ -230,15 +482,32 @@ class EnhancedChainFactory:
         self.llm = get_llm()
         self.global_metrics = ChatbotChainMetrics()
     
-    def create_chain(self, chatbot_type: str, system_prompt: str) -> EnhancedChatbotChain:
+    def create_chain(self, chatbot_type: str, system_prompt: str, compact_prompt: Optional[str] = None) -> EnhancedChatbotChain:
         """Create a new enhanced chatbot chain"""
         if chatbot_type in self.chains:
             logger.info(f"Returning existing chain for {chatbot_type}")
             return self.chains[chatbot_type]
         
         logger.info(f"Creating new enhanced chain for {chatbot_type}")
-        chain = EnhancedChatbotChain(system_prompt, chatbot_type)
+        chain = EnhancedChatbotChain(system_prompt, chatbot_type, compact_prompt)
+        self.chains[chatbot_type] = chain
+        return chain
+    
+    def replace_chain(self, chatbot_type: str, system_prompt: str, compact_prompt: Optional[str] = None) -> EnhancedChatbotChain:
+        """Build a chain with new prompts, keeping the retriever and metrics of the one it replaces
+        
+        Callers still holding the previous chain finish their requests on it.
+        """
+        chain = EnhancedChatbotChain(system_prompt, chatbot_type, compact_prompt)
+        previous = self.chains.get(chatbot_type)
+        if previous is not None:
+            chain.set_retriever(previous.retriever, previous.retrieval_top_k)
+            chain.metrics = previous.metrics
+            chain.prompt_variant_counts = previous.prompt_variant_counts
+            chain._variant_lock = previous._variant_lock
+            chain.set_experiment(previous.experiment)
         self.chains[chatbot_type] = chain
+        logger.info(f"Replaced enhanced chain for {chatbot_type}")
         return chain
     
     def get_chain(self, chatbot_type: str) -> EnhancedChatbotChain:
@@ -343,9 +612,9 @@ def get_enhanced_chain_factory() -> EnhancedChainFactory:
     """Get the global enhanced chain factory instance"""
     return enhanced_chain_factory
 
-def create_enhanced_chatbot_chain(chatbot_type: str, system_prompt: str) -> EnhancedChatbotChain:
+def create_enhanced_chatbot_chain(chatbot_type: str, system_prompt: str, compact_prompt: Optional[str] = None) -> EnhancedChatbotChain:
     """Utility function to create an enhanced chatbot chain"""
-    return enhanced_chain_factory.create_chain(chatbot_type, system_prompt)
+    return enhanced_chain_factory.create_chain(chatbot_type, system_prompt, compact_prompt)
 
 def get_enhanced_chatbot_chain(chatbot_type: str) -> EnhancedChatbotChain:
     """Utility function to get an enhanced chatbot chain"""
@@ -0,0 +1,196 @@
+"""
+Prompt A/B experiments
+
+An experiment splits one chatbot's traffic between prompt variants. Sessions
+are assigned by hashing the experiment name with the session id, so a
+session always sees the same variant and assignment needs no shared state.
+Each variant records latency, output tokens, validator issues and errors;
+comparisons are computed only when the results are read.
+
+Experiments are defined in a JSON file:
+
+    {"experiments": [{
+        "name": "legal-plain-language",
+        "chatbot_type": "legal",
+        "variants": {
+            "control": {"weight": 50},
+            "plain": {"weight": 50, "prompt_file": "legal_plain.md"},
+            "compact": {"weight": 0, "prompt_variant": "compact"}
+        }
+    }]}
+
+A variant with no prompt is the chatbot's current prompt (the control). A
+"prompt_variant" variant uses the chatbot's current prompt of that variant, so
+it follows prompt reloads just like the control.
+"""
+
+from core.prompting import PromptRenderer
+from core.metrics import LogHistogram
+from typing import Dict, Any, List, Optional
+import json
+import logging
+import math
+import os
+import threading
+import zlib
+
+logger = logging.getLogger(__name__)
+
+HASH_BUCKETS = 10000
+
+def assignment_bucket(experiment_name: str, session_id: str) -> int:
+    """Stable bucket in [0, HASH_BUCKETS) for a session within an experiment"""
+    return zlib.crc32(f"{experiment_name}:{session_id}".encode("utf-8")) % HASH_BUCKETS
+
+class VariantStats:
+    """Running outcome counters for one experiment variant"""
+    
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.invalid = 0
+        self.issues = 0
+        self.output_tokens = 0
+        self.latency_sum = 0.0
+        self.latency_squares = 0.0
+        self.latencies = LogHistogram()
+    
+    def record(self, duration: float, success: bool, issues: int, invalid: bool, output_tokens: int):
+        self.requests += 1
+        self.latency_sum += duration
+        self.latency_squares += duration * duration
+        self.latencies.record(duration)
+        if not success:
+            self.errors += 1
+            return
+        self.issues += issues
+        self.invalid += 1 if invalid else 0
+        self.output_tokens += output_tokens
+    
+    def summary(self) -> Dict[str, Any]:
+        answered = self.requests - self.errors
+        mean = self.latency_sum / self.requests if self.requests else 0.0
+        variance = max(0.0, self.latency_squares / self.requests - mean * mean) if self.requests else 0.0
+        percentiles = self.latencies.percentiles((50, 90, 99))
+        return {
+            "requests": self.requests,
+            "error_rate": self.errors / self.requests if self.requests else 0.0,
+            "invalid_rate": self.invalid / answered if answered else 0.0,
+            "issues_per_answer": self.issues / answered if answered else 0.0,
+            "output_tokens_mean": self.output_tokens / answered if answered else 0.0,
+            "latency_mean": mean,
+            "latency_std": math.sqrt(variance),
+            "latency_p50": percentiles["p50"],
+            "latency_p90": percentiles["p90"],
+            "latency_p99": percentiles["p99"]
+        }
+
+class ExperimentVariant:
+    """One arm of an experiment; renderer is None for arms that use one of the chatbot's own prompts"""
+    
+    def __init__(self, name: str, weight: float, renderer: Optional[PromptRenderer] = None,
+                 prompt_variant: Optional[str] = None):
+        self.name = name
+        self.weight = weight
+        self.renderer = renderer
+        self.prompt_variant = prompt_variant
+        self.stats = VariantStats()
+
+def welch_t(a: Dict[str, Any], b: Dict[str, Any]) -> Optional[float]:
+    """Welch's t statistic for the difference in mean latency (b - a)"""
+    if a["requests"] < 2 or b["requests"] < 2:
+        return None
+    standard_error = math.sqrt(a["latency_std"] ** 2 / a["requests"] + b["latency_std"] ** 2 / b["requests"])
+    return (b["latency_mean"] - a["latency_mean"]) / standard_error if standard_error else None
+
+def proportion_z(a_rate: float, a_count: int, b_rate: float, b_count: int) -> Optional[float]:
+    """Two-proportion z statistic for the difference in error rate (b - a)"""
+    if not a_count or not b_count:
+        return None
+    pooled = (a_rate * a_count + b_rate * b_count) / (a_count + b_count)
+    standard_error = math.sqrt(pooled * (1 - pooled) * (1 / a_count + 1 / b_count))
+    return (b_rate - a_rate) / standard_error if standard_error else None
+
+class PromptExperiment:
+    """Deterministic session-hash split of one chatbot's traffic across prompt variants"""
+    
+    def __init__(self, name: str, chatbot_type: str, variants: List[ExperimentVariant]):
+        total = sum(variant.weight for variant in variants)
+        if not variants or total <= 0:
+            raise ValueError(f"Experiment {name} needs at least one variant with a positive weight")
+        self.name = name
+        self.chatbot_type = chatbot_type
+        self.variants = variants
+        # Upper bucket bound of each variant, so assignment is a short scan
+        self._bounds = []
+        cumulative = 0.0
+        for variant in variants:
+            cumulative += variant.weight
+            self._bounds.append((round(cumulative / total * HASH_BUCKETS), variant))
+        self._lock = threading.Lock()
+    
+    def assign(self, context: Optional[Dict[str, Any]]) -> Optional[ExperimentVariant]:
+        """The variant for a request's session, or None when the request has no session id"""
+        session_id = context.get("session_id") if context else None
+        if session_id is None:
+            return None
+        bucket = assignment_bucket(self.name, str(session_id))
+        for bound, variant in self._bounds:
+            if bucket < bound:
+                return variant
+        return self._bounds[-1][1]
+    
+    def record(self, variant: ExperimentVariant, duration: float, success: bool, issues: int = 0,
+               invalid: bool = False, output_tokens: int = 0):
+        with self._lock:
+            variant.stats.record(duration, success, issues, invalid, output_tokens)
+    
+    def compare(self) -> Dict[str, Any]:
+        """Per-variant summaries, with differences against the first variant (the baseline)"""
+        with self._lock:
+            summaries = {variant.name: variant.stats.summary() for variant in self.variants}
+        baseline_name = self.variants[0].name
+        baseline = summaries[baseline_name]
+        for name, summary in summaries.items():
+            summary["weight"] = next(variant.weight for variant in self.variants if variant.name == name)
+            if name == baseline_name:
+                continue
+            summary["vs_baseline"] = {
+                "latency_p50_change": summary["latency_p50"] - baseline["latency_p50"],
+                "latency_mean_t": welch_t(baseline, summary),
+                "error_rate_change": summary["error_rate"] - baseline["error_rate"],
+                "error_rate_z": proportion_z(baseline["error_rate"], baseline["requests"],
+                                             summary["error_rate"], summary["requests"]),
+                "output_tokens_change": summary["output_tokens_mean"] - baseline["output_tokens_mean"]
+            }
+        return {"name": self.name, "chatbot_type": self.chatbot_type, "baseline": baseline_name, "variants": summaries}
+
+def load_experiments(path: str, prompts: Optional[Dict[str, Dict[str, str]]] = None) -> Dict[str, PromptExperiment]:
+    """Experiments from a JSON file, keyed by chatbot type (one running experiment per chatbot)
+    
+    prompts maps chatbot type to its prompt variants ({"full": ..., "compact": ...}) and is
+    used to check the names given with "prompt_variant".
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        definitions = json.load(f).get("experiments", [])
+    base_dir = os.path.dirname(os.path.abspath(path))
+    experiments: Dict[str, PromptExperiment] = {}
+    for definition in definitions:
+        name, chatbot_type = definition["name"], definition["chatbot_type"]
+        if chatbot_type in experiments:
+            raise ValueError(f"Chatbot {chatbot_type} already has experiment {experiments[chatbot_type].name}")
+        variants = []
+        for variant_name, spec in definition["variants"].items():
+            prompt, prompt_variant = spec.get("prompt"), spec.get("prompt_variant")
+            if spec.get("prompt_file"):
+                with open(os.path.join(base_dir, spec["prompt_file"]), "r", encoding="utf-8") as f:
+                    prompt = f.read().strip()
+            elif prompt_variant:
+                # Rendered from the chain's current prompts at request time, not captured here
+                if prompt_variant not in (prompts or {}).get(chatbot_type, {}):
+                    raise ValueError(f"Unknown prompt variant {prompt_variant} for {chatbot_type}")
+                prompt = None
+            renderer = PromptRenderer(prompt) if prompt else None
+            variants.append(ExperimentVariant(variant_name, float(spec.get("weight", 1)), renderer, prompt_variant))
+        experiments[chatbot_type] = PromptExperiment(name, chatbot_type, variants)
+    return experiments
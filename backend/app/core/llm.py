@@ -15,10 +15,6 @@ class LLMManager:
             cls._instance = super(LLMManager, cls).__new__(cls)
         return cls._instance
     
-    def __init__(self):
-        if self._llm is None:
-            self._initialize_llm()
-    
     def _initialize_llm(self):
         """Initialize the GROQ LLM with configuration"""
         try:
@@ -36,7 +32,7 @@ class LLMManager:
             raise
     
     def get_llm(self):
-        """Get the shared LLM instance"""
+        """Get the shared LLM instance, creating it on first use"""
         if self._llm is None:
             self._initialize_llm()
         return self._llm
@@ -44,14 +40,14 @@ class LLMManager:
     def test_connection(self):
         """Test the LLM connection"""
         try:
-            test_response = self._llm.invoke("Hello, this is a connection test.")
+            test_response = self.get_llm().invoke("Hello, this is a connection test.")
             logger.info("LLM connection test successful")
             return True
         except Exception as e:
             logger.error(f"LLM connection test failed: {str(e)}")
             return False
 
-# Global LLM manager instance
+# Global LLM manager instance; the client is created on the first get_llm() call
 llm_manager = LLMManager()
 
 def get_llm():
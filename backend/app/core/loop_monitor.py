@@ -0,0 +1,169 @@
+"""
+Event loop lag and blocking-call detection
+
+A background task sleeps for a fixed interval and measures how late it wakes
+up. The delay is the time other callbacks held the loop, and is recorded in
+a latency histogram like request latency (merged across workers).
+
+In debug mode (LOOP_BLOCK_THRESHOLD_SECONDS > 0) the task ticks faster as a
+heartbeat and a watchdog thread checks it. When the heartbeat is older than
+the threshold, the loop is stuck in one callback, and the watchdog records
+the loop thread's current stack, which points at the blocking code. asyncio's
+own debug mode reports slow callbacks too, but only after they finish,
+without a stack, and it slows every callback down.
+"""
+
+from core.metrics import LatencyTracker
+from core.shared_metrics import get_worker_metrics
+from config import settings
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+def format_stack(frame, limit: int) -> List[str]:
+    """Innermost-last "file:line in function: code" lines for a frame"""
+    return [f"{entry.filename}:{entry.lineno} in {entry.name}: {entry.line}"
+            for entry in traceback.extract_stack(frame, limit=limit)]
+
+class EventLoopMonitor:
+    """Measures event loop scheduling delay and, in debug mode, samples stacks of blocking callbacks"""
+    
+    def __init__(self, interval: float = 0.5, block_threshold: float = 0.0, max_blocks: int = 20,
+                 stack_depth: int = 40):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.stack_depth = stack_depth
+        self.tracker: Optional[LatencyTracker] = None
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.blocks: deque = deque(maxlen=max_blocks)
+        self.blocks_detected = 0
+        self._heartbeat = 0.0
+        self._block: Optional[Dict[str, Any]] = None
+        self._block_lock = threading.Lock()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+    
+    @property
+    def debug(self) -> bool:
+        return self.block_threshold > 0
+    
+    @property
+    def tick(self) -> float:
+        # The heartbeat must beat well inside the threshold for a stale one to mean a blocked loop
+        return min(self.interval, self.block_threshold / 4) if self.debug else self.interval
+    
+    def record_lag(self, lag: float):
+        self.tracker.record(lag)
+        self.last_lag = lag
+        if lag > self.max_lag:
+            self.max_lag = lag
+        if not self.debug:
+            return
+        with self._block_lock:
+            # The loop is running again, so any block the watchdog saw has ended
+            block, self._block = self._block, None
+            if block is None and lag >= self.block_threshold:
+                # Blocked between two watchdog checks: the duration is known, the stack is not
+                block = {"detected_at": datetime.now().isoformat(), "blocked_seconds": 0.0, "stack": None}
+                self.blocks.append(block)
+                self.blocks_detected += 1
+            if block is not None:
+                block["blocked_seconds"] = max(block["blocked_seconds"], lag)
+    
+    async def run(self):
+        """Sleep for one tick at a time and record how late each wake-up is"""
+        tick = self.tick
+        while True:
+            expected = time.perf_counter() + tick
+            await asyncio.sleep(tick)
+            now = time.perf_counter()
+            self._heartbeat = now
+            self.record_lag(max(0.0, now - expected))
+    
+    def check_blocked(self):
+        """Watchdog check: sample the loop thread's stack if the heartbeat is stale"""
+        stale = time.perf_counter() - self._heartbeat
+        if stale < self.block_threshold + self.tick:
+            return
+        with self._block_lock:
+            if self._block is not None:
+                return
+            frame = sys._current_frames().get(self._loop_thread_id)
+            block = {
+                "detected_at": datetime.now().isoformat(),
+                "blocked_seconds": stale - self.tick,
+                "stack": format_stack(frame, self.stack_depth) if frame is not None else None
+            }
+            self._block = block
+            self.blocks.append(block)
+            self.blocks_detected += 1
+        logger.warning(f"⚠️ Event loop blocked for over {self.block_threshold}s at: "
+                       f"{block['stack'][-1] if block['stack'] else 'unknown'}")
+    
+    def _watch(self):
+        while not self._stopping.wait(self.block_threshold / 4):
+            try:
+                self.check_blocked()
+            except Exception as e:
+                logger.error(f"❌ Event loop watchdog failed: {str(e)}")
+    
+    def start(self):
+        """Start monitoring the running event loop (no-op when disabled)"""
+        if self.interval <= 0 or self._task is not None:
+            return
+        if self.tracker is None:
+            self.tracker = LatencyTracker(get_worker_metrics().histogram("loop|lag"))
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.perf_counter()
+        self._task = asyncio.get_running_loop().create_task(self.run())
+        if self.debug:
+            self._stopping.clear()
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+        logger.info(f"✅ Event loop lag sampled every {self.tick}s"
+                    + (f", stacks kept for blocks over {self.block_threshold}s" if self.debug else ""))
+    
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopping.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join()
+            self._watchdog = None
+    
+    def get_status(self, include_blocks: bool = True) -> Dict[str, Any]:
+        status = {
+            "running": self._task is not None,
+            "interval_seconds": self.tick,
+            "block_threshold_seconds": self.block_threshold,
+            "lag": self.tracker.summary() if self.tracker is not None else None,
+            "last_lag": self.last_lag,
+            "max_lag": self.max_lag,
+            "blocks_detected": self.blocks_detected
+        }
+        if include_blocks:
+            status["blocks"] = list(reversed(self.blocks))
+        return status
+
+# Global event loop monitor instance; started with the application
+loop_monitor = EventLoopMonitor(
+    interval=settings.loop_lag_interval_seconds,
+    block_threshold=settings.loop_block_threshold_seconds
+)
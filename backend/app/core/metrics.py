@@ -0,0 +1,200 @@
+"""
+Fixed-memory latency histograms
+
+Latencies go into logarithmic buckets (16 per doubling, so any percentile is
+within ~2.2% of the true value) between 0.1ms and 10 minutes. Recording is
+a log, an index and an increment; memory never grows with traffic.
+
+Sliding windows keep one histogram per 15-second slot in a ring: the
+1-minute view merges the newest 4 slots and the 5-minute view all 20.
+Slots are keyed by time.monotonic(), so there is no wall-clock formatting
+on the hot path.
+"""
+
+from array import array
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+import math
+import threading
+import time
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+class LogHistogram:
+    """Counts values in logarithmic buckets; bucket 0 is underflow and the last is overflow"""
+    
+    def __init__(self, min_value: float = 1e-4, max_value: float = 600.0, buckets_per_doubling: int = 16):
+        self.min_value = min_value
+        self.max_value = max_value
+        self.buckets_per_doubling = buckets_per_doubling
+        self._scale = buckets_per_doubling / math.log(2)
+        self.size = int(math.ceil(math.log(max_value / min_value) * self._scale)) + 2
+        self.counts = array("q", bytes(8 * self.size))
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    
+    def index(self, value: float) -> int:
+        if value <= self.min_value:
+            return 0
+        return min(int(math.log(value / self.min_value) * self._scale) + 1, self.size - 1)
+    
+    def bucket_value(self, index: int) -> float:
+        """Geometric midpoint of a bucket"""
+        if index == 0:
+            return self.min_value
+        return self.min_value * math.exp((index - 0.5) / self._scale)
+    
+    def record(self, value: float, index: Optional[int] = None):
+        """Count a value; callers recording into several same-shaped histograms can pass its index"""
+        self.counts[self.index(value) if index is None else index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+    
+    def reset(self):
+        self.counts = array("q", bytes(8 * self.size))
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+    
+    def percentiles(self, percentiles: Sequence[float] = PERCENTILES) -> Dict[str, float]:
+        return counts_percentiles(self, self.counts, self.count, self.max, percentiles)
+    
+    def upper_index(self, bound: float) -> int:
+        """Index of the last bucket lying entirely at or below `bound`"""
+        if bound < self.min_value:
+            return -1
+        return min(int(math.log(bound / self.min_value) * self._scale + 1e-9), self.size - 1)
+
+def percentile_key(p: float) -> str:
+    """50 -> "p50", 99.9 -> "p999\""""
+    return "p" + f"{p:g}".replace(".", "")
+
+def counts_percentiles(histogram: LogHistogram, counts: Sequence[int], count: int, maximum: float,
+                       percentiles: Sequence[float] = PERCENTILES) -> Dict[str, float]:
+    """Percentiles from bucket counts, capped at the largest value seen"""
+    result = {percentile_key(p): 0.0 for p in percentiles}
+    if not count:
+        return result
+    targets = sorted((max(1, math.ceil(count * p / 100)), percentile_key(p)) for p in percentiles)
+    cumulative, target = 0, 0
+    for index, bucket_count in enumerate(counts):
+        if not bucket_count:
+            continue
+        cumulative += bucket_count
+        while target < len(targets) and cumulative >= targets[target][0]:
+            result[targets[target][1]] = min(histogram.bucket_value(index), maximum)
+            target += 1
+        if target == len(targets):
+            break
+    return result
+
+class WindowedHistogram:
+    """A ring of per-slot histograms for recent-window percentiles and error rates"""
+    
+    def __init__(self, slot_seconds: float = 15.0, slots: int = 20, **histogram_kwargs):
+        self.slot_seconds = slot_seconds
+        self._slots = [LogHistogram(**histogram_kwargs) for _ in range(slots)]
+        self._slot_ids = [-1] * slots
+        self._errors = [0] * slots
+    
+    def _slot(self, now: float) -> int:
+        slot_id = int(now // self.slot_seconds)
+        position = slot_id % len(self._slots)
+        if self._slot_ids[position] != slot_id:
+            self._slots[position].reset()
+            self._errors[position] = 0
+            self._slot_ids[position] = slot_id
+        return position
+    
+    def record(self, value: float, success: bool = True, now: Optional[float] = None, index: Optional[int] = None):
+        position = self._slot(time.monotonic() if now is None else now)
+        self._slots[position].record(value, index)
+        if not success:
+            self._errors[position] += 1
+    
+    def summary(self, seconds: float, now: Optional[float] = None) -> Dict[str, Any]:
+        """Count, rate, error rate, mean and percentiles over the last `seconds` (rounded up to whole slots)"""
+        current = int((time.monotonic() if now is None else now) // self.slot_seconds)
+        oldest = current - max(1, math.ceil(seconds / self.slot_seconds)) + 1
+        template = self._slots[0]
+        counts: List[int] = [0] * template.size
+        count, errors, total, maximum = 0, 0, 0.0, 0.0
+        for position, slot_id in enumerate(self._slot_ids):
+            if oldest <= slot_id <= current:
+                histogram = self._slots[position]
+                for index, bucket_count in enumerate(histogram.counts):
+                    if bucket_count:
+                        counts[index] += bucket_count
+                count += histogram.count
+                total += histogram.total
+                maximum = max(maximum, histogram.max)
+                errors += self._errors[position]
+        summary = {
+            "count": count,
+            "rate_per_second": count / seconds,
+            "error_rate": errors / count if count else 0.0,
+            "mean": total / count if count else 0.0,
+            "max": maximum
+        }
+        summary.update(counts_percentiles(template, counts, count, maximum))
+        return summary
+
+class LatencyTracker:
+    """All-time and windowed latency histograms for one series, safe to share between threads"""
+    
+    WINDOWS = {"1m": 60.0, "5m": 300.0}
+    
+    def __init__(self, series=None):
+        """series is an optional shared-memory record (see core.shared_metrics) that the
+        all-time counts are kept in, so other processes can read them"""
+        self.all_time = LogHistogram()
+        self.recent = WindowedHistogram()
+        self.errors = 0
+        self.series = series
+        if series is not None:
+            self.all_time.counts = series.buckets
+        self._lock = threading.Lock()
+    
+    def record(self, value: float, success: bool = True):
+        now = time.monotonic()
+        index = self.all_time.index(value)
+        with self._lock:
+            self.all_time.record(value, index)
+            self.recent.record(value, success, now, index)
+            if not success:
+                self.errors += 1
+            series = self.series
+            if series is not None:
+                series.total[0] += value
+                if not success:
+                    series.errors[0] += 1
+    
+    def snapshot(self) -> Tuple[array, float, int]:
+        """All-time bucket counts, sum and error count, copied without taking the lock
+        
+        Copying the counts is a single C-level operation, so it is never torn; the sum
+        and error count may be one record apart from it, which exporters tolerate.
+        """
+        return array("q", self.all_time.counts.tobytes()), self.all_time.total, self.errors
+    
+    def window(self, name: str = "5m") -> Dict[str, Any]:
+        """Summary of one recent window ("1m" or "5m") without the all-time figures"""
+        now = time.monotonic()
+        with self._lock:
+            return self.recent.summary(self.WINDOWS[name], now)
+    
+    def summary(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            summary = {
+                "count": self.all_time.count,
+                "errors": self.errors,
+                "mean": self.all_time.total / self.all_time.count if self.all_time.count else 0.0,
+                "max": self.all_time.max
+            }
+            summary.update(self.all_time.percentiles())
+            for name, seconds in self.WINDOWS.items():
+                summary[name] = self.recent.summary(seconds, now)
+        return summary
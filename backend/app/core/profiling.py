@@ -0,0 +1,221 @@
+"""
+On-demand CPU and memory profiling
+
+CPU profiles sample the stack of every thread at a fixed interval for a few
+seconds, from a thread that exists only while a profile runs, and return the
+counts as collapsed stacks ("frame;frame;frame count" per line), the input
+format of flamegraph.pl, speedscope and most flame graph viewers. Sampling
+is wall-clock: threads waiting in known idle spots (the selector, thread
+pool queues, condition waits) are left out unless asked for.
+
+Memory profiling wraps tracemalloc: start tracing, take a baseline snapshot,
+and later diff the current allocations against it to see what grew.
+Tracing slows every allocation down, so it runs only between start and stop
+and stops by itself after a time limit.
+
+Nothing here runs until an admin endpoint asks for it, and only one CPU
+profile runs at a time.
+"""
+
+from config import settings
+from collections import Counter
+from typing import Dict, Any, Optional
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+# (function, file name ending) of frames where a thread sits idle
+IDLE_FRAMES = {
+    ("select", "selectors.py"),
+    ("wait", "threading.py"),
+    ("_worker", os.path.join("concurrent", "futures", "thread.py")),
+    ("accept", "socket.py")
+}
+
+def short_path(filename: str) -> str:
+    """A file name relative to the longest sys.path entry containing it"""
+    best = ""
+    for entry in sys.path:
+        if entry and filename.startswith(entry) and len(entry) > len(best):
+            best = entry
+    return filename[len(best):].lstrip(os.sep) if best else filename
+
+class CPUProfiler:
+    """Wall-clock stack sampler for all threads of this process"""
+    
+    def __init__(self, max_seconds: float = 60.0):
+        self.max_seconds = max_seconds
+        self._lock = threading.Lock()
+        self._labels: Dict[Any, str] = {}
+    
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+    
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_name} ({short_path(code.co_filename)}:{code.co_firstlineno})"
+        return label
+    
+    def _collapse(self, frame, thread_name: str, include_idle: bool) -> Optional[str]:
+        if not include_idle:
+            code = frame.f_code
+            if any(code.co_name == name and code.co_filename.endswith(ending) for name, ending in IDLE_FRAMES):
+                return None
+        labels = []
+        while frame is not None:
+            labels.append(self._label(frame.f_code))
+            frame = frame.f_back
+        labels.append(thread_name)
+        labels.reverse()
+        return ";".join(labels)
+    
+    def profile(self, seconds: float, interval: float = 0.01, include_idle: bool = False) -> Dict[str, Any]:
+        """Sample every thread for `seconds`; raises RuntimeError if a profile is already running"""
+        if not 0 < seconds <= self.max_seconds:
+            raise ValueError(f"Profile length must be between 0 and {self.max_seconds} seconds")
+        if not 0.001 <= interval <= 1.0:
+            raise ValueError("Sampling interval must be between 1ms and 1s")
+        if not self._lock.acquire(blocking=False):
+            raise RuntimeError("A CPU profile is already running")
+        try:
+            own_thread = threading.get_ident()
+            stacks: Counter = Counter()
+            samples = 0
+            started = time.perf_counter()
+            deadline = started + seconds
+            while True:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_thread:
+                        continue
+                    stack = self._collapse(frame, names.get(thread_id, f"thread-{thread_id}"), include_idle)
+                    if stack is not None:
+                        stacks[stack] += 1
+                samples += 1
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                time.sleep(min(interval, remaining))
+            return {
+                "seconds": time.perf_counter() - started,
+                "interval": interval,
+                "samples": samples,
+                "stacks": stacks
+            }
+        finally:
+            self._labels.clear()
+            self._lock.release()
+
+def collapsed_stacks(profile: Dict[str, Any]) -> str:
+    """Collapsed-stack text for flame graph tools, heaviest stacks first"""
+    return "".join(f"{stack} {count}\n" for stack, count in profile["stacks"].most_common())
+
+class MemoryProfiler:
+    """tracemalloc tracing between start and stop, with a baseline snapshot to diff against"""
+    
+    def __init__(self, max_seconds: float = 3600.0):
+        self.max_seconds = max_seconds
+        self.started_at: Optional[float] = None
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+        self.baseline_at: Optional[float] = None
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+    
+    def start(self, frames: int = 10):
+        if not 1 <= frames <= 100:
+            raise ValueError("Traceback depth must be between 1 and 100 frames")
+        with self._lock:
+            if tracemalloc.is_tracing():
+                raise RuntimeError("Memory tracing is already running")
+            tracemalloc.start(frames)
+            self.started_at = time.time()
+            self._timer = threading.Timer(self.max_seconds, self.stop)
+            self._timer.daemon = True
+            self._timer.start()
+        logger.info(f"✅ Memory tracing started ({frames} frames, stops after {self.max_seconds}s)")
+    
+    def stop(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not tracemalloc.is_tracing():
+                return
+            tracemalloc.stop()
+            self.started_at = None
+            self.baseline = self.baseline_at = None
+        logger.info("✅ Memory tracing stopped")
+    
+    def _take_snapshot(self) -> tracemalloc.Snapshot:
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("Memory tracing is not running; start it first")
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>")
+        ))
+    
+    @staticmethod
+    def _location(stat, key_type: str) -> Dict[str, Any]:
+        # Traceback frames run from the oldest call to the allocating line
+        frames = [f"{short_path(frame.filename)}:{frame.lineno}" for frame in stat.traceback]
+        if key_type == "traceback":
+            return {"location": frames[-1], "traceback": frames}
+        if key_type == "filename":
+            return {"location": short_path(stat.traceback[-1].filename)}
+        return {"location": frames[-1]}
+    
+    def snapshot(self, key_type: str = "lineno", limit: int = 25) -> Dict[str, Any]:
+        """Take a new baseline and report the largest allocation sites in it"""
+        snapshot = self._take_snapshot()
+        with self._lock:
+            self.baseline, self.baseline_at = snapshot, time.time()
+        top = [{**self._location(stat, key_type), "size": stat.size, "count": stat.count}
+               for stat in snapshot.statistics(key_type)[:limit]]
+        return {**self.get_status(), "top": top}
+    
+    def diff(self, key_type: str = "lineno", limit: int = 25, rebase: bool = False) -> Dict[str, Any]:
+        """Allocation growth since the baseline, largest first"""
+        baseline = self.baseline
+        if baseline is None:
+            raise RuntimeError("No baseline snapshot; take one first")
+        snapshot = self._take_snapshot()
+        stats = snapshot.compare_to(baseline, key_type)
+        top = [{**self._location(stat, key_type), "size": stat.size, "size_diff": stat.size_diff,
+                "count": stat.count, "count_diff": stat.count_diff}
+               for stat in stats[:limit]]
+        result = {**self.get_status(), "seconds_since_baseline": time.time() - self.baseline_at,
+                  "size_diff": sum(stat.size_diff for stat in stats), "top": top}
+        if rebase:
+            with self._lock:
+                self.baseline, self.baseline_at = snapshot, time.time()
+        return result
+    
+    def get_status(self) -> Dict[str, Any]:
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        return {
+            "tracing": tracing,
+            "frames": tracemalloc.get_traceback_limit() if tracing else None,
+            "started_at": self.started_at,
+            "stops_at": self.started_at + self.max_seconds if self.started_at is not None else None,
+            "baseline_at": self.baseline_at,
+            "traced_bytes": current,
+            "traced_peak_bytes": peak
+        }
+
+def parse_key_type(key_type: str) -> str:
+    if key_type not in ("lineno", "filename", "traceback"):
+        raise ValueError("Group by must be one of lineno, filename or traceback")
+    return key_type
+
+# Profilers for this process; idle until an admin endpoint starts one
+cpu_profiler = CPUProfiler(max_seconds=settings.profile_max_seconds)
+memory_profiler = MemoryProfiler(max_seconds=settings.memory_trace_max_seconds)
@@ -0,0 +1,97 @@
+"""
+Prometheus text exposition
+
+Metrics are written in the text format (version 0.0.4) straight from the
+in-memory counters at scrape time. Latency histograms are re-bucketed from
+LogHistogram counts onto a short list of fixed `le` boundaries, so a scrape
+costs one array copy and one cumulative sum per series and never takes a
+tracker's lock. A boundary covers only whole log buckets, so each cumulative
+count can miss values up to ~4% below the boundary.
+"""
+
+from core.metrics import LatencyTracker, LogHistogram
+from functools import lru_cache
+from itertools import accumulate
+from typing import Dict, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+@lru_cache(maxsize=4096)
+def format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    """'{a="1",b="2"}' for a tuple of label pairs; cached since label sets repeat every scrape"""
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label_value(str(value))}"' for name, value in labels) + "}"
+
+def format_value(value: float) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+@lru_cache(maxsize=16)
+def bucket_bounds(histogram_shape: Tuple[float, float, int], buckets: Tuple[float, ...]) -> Tuple[Tuple[str, int], ...]:
+    """(le label, last log-bucket index) for each boundary of a histogram shape"""
+    histogram = LogHistogram(*histogram_shape)  # An empty shape is the default one
+    return tuple((format_value(bound), histogram.upper_index(bound)) for bound in buckets)
+
+class MetricsWriter:
+    """Collects samples by metric family and renders them in the Prometheus text format"""
+    
+    def __init__(self, prefix: str = "chatbot"):
+        self.prefix = prefix
+        self._families: Dict[str, Tuple[str, str, List[str]]] = {}
+    
+    def _family(self, name: str, kind: str, help_text: str) -> Tuple[str, List[str]]:
+        full_name = f"{self.prefix}_{name}"
+        family = self._families.get(full_name)
+        if family is None:
+            family = self._families[full_name] = (kind, help_text, [])
+        return full_name, family[2]
+    
+    def counter(self, name: str, help_text: str, value: float, labels: Tuple[Tuple[str, str], ...] = ()):
+        full_name, lines = self._family(name, "counter", help_text)
+        lines.append(f"{full_name}{format_labels(labels)} {format_value(value)}")
+    
+    def gauge(self, name: str, help_text: str, value: Optional[float], labels: Tuple[Tuple[str, str], ...] = ()):
+        if value is None:
+            return
+        full_name, lines = self._family(name, "gauge", help_text)
+        lines.append(f"{full_name}{format_labels(labels)} {format_value(value)}")
+    
+    def histogram(self, name: str, help_text: str, tracker: LatencyTracker, labels: Tuple[Tuple[str, str], ...] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS):
+        counts, total, _ = tracker.snapshot()
+        self.histogram_counts(name, help_text, counts, total, labels, buckets, tracker.all_time)
+    
+    def histogram_counts(self, name: str, help_text: str, counts: Sequence[int], total: float,
+                         labels: Tuple[Tuple[str, str], ...] = (), buckets: Sequence[float] = LATENCY_BUCKETS,
+                         shape: Optional[LogHistogram] = None):
+        """A histogram family member from raw log-bucket counts (of a default-shaped LogHistogram unless given)"""
+        full_name, lines = self._family(name, "histogram", help_text)
+        cumulative = list(accumulate(counts))
+        count = cumulative[-1] if cumulative else 0
+        shape_key = (shape.min_value, shape.max_value, shape.buckets_per_doubling) if shape is not None else ()
+        for le, index in bucket_bounds(shape_key, tuple(buckets)):
+            lines.append(f"{full_name}_bucket{format_labels(labels + (('le', le),))} {cumulative[index] if index >= 0 else 0}")
+        lines.append(f"{full_name}_bucket{format_labels(labels + (('le', '+Inf'),))} {count}")
+        lines.append(f"{full_name}_sum{format_labels(labels)} {format_value(total)}")
+        lines.append(f"{full_name}_count{format_labels(labels)} {count}")
+    
+    def render(self) -> str:
+        output = []
+        for full_name, (kind, help_text, lines) in self._families.items():
+            output.append(f"# HELP {full_name} {help_text}")
+            output.append(f"# TYPE {full_name} {kind}")
+            output.extend(lines)
+        output.append("")
+        return "\n".join(output)
@@ -0,0 +1,187 @@
+"""
+Context-aware system prompt rendering
+
+System prompts may contain {{placeholder}} fields filled from the request
+context (ChatRequest.context). Templates are compiled once into literal and
+placeholder parts; each line whose placeholders are missing from the context
+is dropped, and a paragraph left without any of its placeholder lines is
+dropped whole, so a request without context gets exactly the static prompt.
+
+Context values are normalized to a small set of safe values before use
+(they end up in the system prompt), and rendered prompts are cached per
+distinct context signature.
+
+Each chatbot has a full and a compact prompt variant; BrownoutPolicy moves
+traffic to the compact one while too many chain calls are in flight.
+"""
+
+from typing import Dict, Any, List, Optional, Callable, Tuple, Union
+from functools import lru_cache
+import re
+import threading
+import time
+
+PLACEHOLDER_PATTERN = re.compile(r"\{\{\s*([a-z_]+)\s*\}\}")
+LOCALE_PATTERN = re.compile(r"^[A-Za-z]{2,3}(?:[-_][A-Za-z0-9]{2,8}){0,2}$")
+
+EXPERTISE_LEVELS = {
+    "beginner": "beginner", "novice": "beginner", "basic": "beginner",
+    "intermediate": "intermediate",
+    "expert": "expert", "advanced": "expert", "professional": "expert"
+}
+
+def normalize_locale(value: Any) -> Optional[str]:
+    """BCP 47-style tag such as "en-US" or "pt_BR"; anything else is ignored"""
+    if not isinstance(value, str) or not LOCALE_PATTERN.match(value.strip()):
+        return None
+    parts = value.strip().replace("_", "-").split("-")
+    return "-".join([parts[0].lower()] + [part.upper() if len(part) == 2 else part for part in parts[1:]])
+
+def normalize_expertise_level(value: Any) -> Optional[str]:
+    if not isinstance(value, str):
+        return None
+    return EXPERTISE_LEVELS.get(value.strip().lower())
+
+# Context keys usable as placeholders, with the normalizer that makes each value safe
+CONTEXT_FIELDS: Dict[str, Callable[[Any], Optional[str]]] = {
+    "locale": normalize_locale,
+    "expertise_level": normalize_expertise_level
+}
+
+# Appended to every chatbot prompt; renders to nothing without context
+DEFAULT_CONTEXT_SECTION = """**User Context:**
+- Locale: {{locale}} (reply in this locale's language and use its spelling, units, currency and date formats)
+- Expertise level: {{expertise_level}} (match depth and terminology to it; define jargon for beginners, skip basics for experts)"""
+
+Part = Union[str, Tuple[str]]  # literal text, or (field,) for a placeholder
+
+class CompiledPrompt:
+    """A prompt template pre-split into static paragraphs and conditional lines"""
+    
+    def __init__(self, template: str):
+        self.template = template
+        self.fields: List[str] = []
+        # Each paragraph: (is_static, lines); each line: (fields, parts)
+        self._paragraphs: List[Tuple[bool, List[Tuple[Tuple[str, ...], List[Part]]]]] = []
+        for paragraph in template.split("\n\n"):
+            lines = []
+            for line in paragraph.split("\n"):
+                parts: List[Part] = []
+                position = 0
+                for match in PLACEHOLDER_PATTERN.finditer(line):
+                    name = match.group(1)
+                    if name not in CONTEXT_FIELDS:
+                        raise ValueError(f"Unknown prompt placeholder: {{{{{name}}}}}")
+                    if match.start() > position:
+                        parts.append(line[position:match.start()])
+                    parts.append((name,))
+                    if name not in self.fields:
+                        self.fields.append(name)
+                    position = match.end()
+                parts.append(line[position:])
+                lines.append((tuple(part[0] for part in parts if isinstance(part, tuple)), parts))
+            self._paragraphs.append((not any(fields for fields, _ in lines), lines))
+        self.static_text = self.render({})
+    
+    def render(self, values: Dict[str, str]) -> str:
+        """Fill placeholders; lines with a missing value and emptied paragraphs are dropped"""
+        paragraphs = []
+        for is_static, lines in self._paragraphs:
+            if is_static:
+                paragraphs.append("\n".join(parts[0] for _, parts in lines))
+                continue
+            kept, filled = [], False
+            for fields, parts in lines:
+                if not fields:
+                    kept.append(parts[0])
+                elif all(field in values for field in fields):
+                    kept.append("".join(part if isinstance(part, str) else values[part[0]] for part in parts))
+                    filled = True
+            if filled:
+                paragraphs.append("\n".join(kept))
+        return "\n\n".join(paragraphs)
+
+class PromptRenderer:
+    """Renders one chatbot's system prompt for a request context, caching each signature"""
+    
+    def __init__(self, system_prompt: str, context_section: Optional[str] = DEFAULT_CONTEXT_SECTION,
+                 cache_size: int = 256):
+        template = f"{system_prompt}\n\n{context_section}" if context_section else system_prompt
+        self.compiled = CompiledPrompt(template)
+        self.static_prompt = self.compiled.static_text
+        self.fields = tuple(self.compiled.fields)
+        self._normalizers = [CONTEXT_FIELDS[field] for field in self.fields]
+        self._no_values = (None,) * len(self.fields)
+        # Keyed by the raw context values so cache hits skip normalization entirely
+        self._render_cached = lru_cache(maxsize=cache_size)(self._render)
+    
+    def _render(self, raw_values: Tuple[Any, ...]) -> str:
+        values = {}
+        for field, normalize, raw in zip(self.fields, self._normalizers, raw_values):
+            value = normalize(raw) if raw is not None else None
+            if value is not None:
+                values[field] = value
+        return self.compiled.render(values) if values else self.static_prompt
+    
+    def render(self, context: Optional[Dict[str, Any]] = None) -> str:
+        """System prompt for a request context; unknown or invalid context values are ignored"""
+        if not context:
+            return self.static_prompt
+        raw_values = tuple(map(context.get, self.fields))
+        if raw_values == self._no_values:
+            return self.static_prompt
+        try:
+            return self._render_cached(raw_values)
+        except TypeError:
+            # Unhashable values (lists, dicts) can't be cache keys; they never normalize anyway
+            return self._render(raw_values)
+    
+    def get_cache_info(self) -> Dict[str, int]:
+        info = self._render_cached.cache_info()
+        return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
+
+class BrownoutPolicy:
+    """Load-based switch to compact prompts, with hysteresis and a minimum duration"""
+    
+    def __init__(self, enabled: bool = False, enter_in_flight: int = 32, exit_in_flight: int = 16,
+                 min_seconds: float = 10.0):
+        self.enabled = enabled
+        self.enter_in_flight = enter_in_flight
+        self.exit_in_flight = min(exit_in_flight, enter_in_flight)
+        self.min_seconds = min_seconds
+        self.in_flight = 0
+        self.active = False
+        self.activations = 0
+        self._active_since = 0.0
+        self._lock = threading.Lock()
+    
+    def _update(self):
+        if not self.active:
+            if self.enabled and self.in_flight >= self.enter_in_flight:
+                self.active = True
+                self.activations += 1
+                self._active_since = time.monotonic()
+        elif self.in_flight <= self.exit_in_flight and time.monotonic() - self._active_since >= self.min_seconds:
+            self.active = False
+    
+    def enter(self) -> bool:
+        """Count a call as in flight; True if it should use the compact prompt"""
+        with self._lock:
+            self.in_flight += 1
+            self._update()
+            return self.active
+    
+    def exit(self):
+        with self._lock:
+            self.in_flight -= 1
+            self._update()
+    
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "active": self.active,
+            "in_flight": self.in_flight,
+            "enter_in_flight": self.enter_in_flight,
+            "exit_in_flight": self.exit_in_flight,
+            "activations": self.activations
+        }
@@ -0,0 +1,46 @@
+"""
+Token-bucket rate limiting
+"""
+
+from typing import Optional
+import asyncio
+import math
+import time
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, with bursts up to `capacity`"""
+    
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.throttled = 0
+    
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def try_acquire(self) -> bool:
+        self._refill(time.monotonic())
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+    
+    def delay(self) -> float:
+        """Seconds until a token is available (infinite when the rate is 0)"""
+        self._refill(time.monotonic())
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else math.inf
+    
+    async def acquire(self):
+        """Wait for a token; meant for a single event loop, so no lock is needed"""
+        if self.try_acquire():
+            return
+        self.throttled += 1
+        if self.rate <= 0:
+            raise ValueError("Rate limit is 0: no more tokens will be added")
+        while not self.try_acquire():
+            await asyncio.sleep(self.delay())
@@ -0,0 +1,124 @@
+"""
+Slow and failed request samples
+
+Keeps the slowest requests of each five-minute slot over the last hour, and
+the most recent failed requests, with their stage breakdown, chatbot, model,
+token counts and the start of the message. A report like "it was slow at
+14:02" can then be answered from memory through the admin debug endpoint.
+
+Only chat requests (those that reached a chatbot) compete for the slowest
+slots, so admin endpoints such as a deliberately long CPU profile, metrics
+scrapes and health checks cannot push them out; failures are kept from any
+endpoint. Most requests are neither slow nor failed, and are dismissed after
+one comparison with the slot's current threshold; only samples that are kept
+are built.
+"""
+
+from core.timing import StageTimer, STAGES
+from config import settings
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+import heapq
+import itertools
+import threading
+import time
+
+class RequestSamples:
+    """Slowest requests per time slot plus a ring of recent errors, for one process"""
+    
+    def __init__(self, slowest: int = 10, errors: int = 50, input_chars: int = 200,
+                 slot_seconds: float = 300.0, slots: int = 12):
+        self.slowest = slowest
+        self.input_chars = input_chars
+        self.slot_seconds = slot_seconds
+        self.slot_ids = [-1] * slots
+        # Min-heaps of (duration, sequence, sample), so the fastest kept sample is first
+        self.heaps: List[List[tuple]] = [[] for _ in range(slots)]
+        self.errors: deque = deque(maxlen=errors)
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+    
+    def _is_slow(self, duration: float, now: float) -> bool:
+        slot_id = int(now // self.slot_seconds)
+        position = slot_id % len(self.slot_ids)
+        heap = self.heaps[position]
+        return self.slot_ids[position] != slot_id or len(heap) < self.slowest or duration > heap[0][0]
+    
+    def sample(self, timer: StageTimer, method: str, path: str, status_code: int, duration: float,
+               now: float, error: Optional[str], trace_id: Optional[str]) -> Dict[str, Any]:
+        details = timer.details
+        text = details.get("input")
+        stages = {stage: timer.stages[stage] for stage in STAGES if stage in timer.stages}
+        stages.update((stage, seconds) for stage, seconds in timer.stages.items() if stage not in stages)
+        return {
+            "timestamp": datetime.fromtimestamp(now).isoformat(),
+            "method": method,
+            "path": path,
+            "status_code": status_code,
+            "duration": duration,
+            "stages": stages,
+            "chatbot_type": timer.chatbot_type,
+            "model": details.get("model"),
+            "prompt_variant": details.get("prompt_variant"),
+            "short_circuit": details.get("short_circuit"),
+            "input_tokens": details.get("input_tokens"),
+            "output_tokens": details.get("output_tokens"),
+            "input": text[:self.input_chars] if text is not None else None,
+            "input_chars": len(text) if text is not None else None,
+            "error": error,
+            "trace_id": trace_id
+        }
+    
+    def record(self, timer: StageTimer, method: str, path: str, status_code: int, duration: float,
+               trace_id: Optional[str] = None, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        error = timer.details.get("error") or (f"HTTP {status_code}" if status_code >= 500 else None)
+        slow = self.slowest > 0 and timer.chatbot_type is not None and self._is_slow(duration, now)
+        if error is None and not slow:
+            return
+        sample = self.sample(timer, method, path, status_code, duration, now, error, trace_id)
+        with self._lock:
+            if error is not None:
+                self.errors.append(sample)
+            if slow:
+                slot_id = int(now // self.slot_seconds)
+                position = slot_id % len(self.slot_ids)
+                heap = self.heaps[position]
+                if self.slot_ids[position] != slot_id:
+                    self.slot_ids[position] = slot_id
+                    heap.clear()
+                entry = (duration, next(self._sequence), sample)
+                if len(heap) < self.slowest:
+                    heapq.heappush(heap, entry)
+                elif duration > heap[0][0]:
+                    heapq.heapreplace(heap, entry)
+    
+    def get_samples(self, limit: int = 50, chatbot_type: Optional[str] = None,
+                    now: Optional[float] = None) -> Dict[str, Any]:
+        """The slowest kept requests of the last hour (slowest first) and recent errors (newest first)"""
+        now = time.time() if now is None else now
+        oldest = int(now // self.slot_seconds) - len(self.slot_ids) + 1
+        with self._lock:
+            slowest = [entry for position, slot_id in enumerate(self.slot_ids) if slot_id >= oldest
+                       for entry in self.heaps[position]]
+            errors = list(self.errors)
+        slowest = [sample for _, _, sample in sorted(slowest, key=lambda entry: entry[0], reverse=True)]
+        errors.reverse()
+        if chatbot_type is not None:
+            slowest = [sample for sample in slowest if sample["chatbot_type"] == chatbot_type]
+            errors = [sample for sample in errors if sample["chatbot_type"] == chatbot_type]
+        return {
+            "window_seconds": self.slot_seconds * len(self.slot_ids),
+            "slowest_per_slot": self.slowest,
+            "slot_seconds": self.slot_seconds,
+            "slowest": slowest[:limit],
+            "errors": errors[:limit]
+        }
+
+# Global request samples instance
+request_samples = RequestSamples(
+    slowest=settings.debug_slowest_requests,
+    errors=settings.debug_recent_errors,
+    input_chars=settings.debug_input_chars
+)
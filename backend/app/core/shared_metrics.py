@@ -0,0 +1,203 @@
+"""
+Cross-process metrics
+
+Each worker process keeps its counters and latency histograms in one mmap'd
+file, worker-<pid>-<random>.metrics in METRICS_DIR (the suffix keeps a
+reused pid from overwriting a dead worker's file). Recording is a store into
+the mapping, with no syscall. Whichever worker answers a metrics request
+reads the header and then only the used part of every worker file, and sums
+series with the same key, so counters and histograms add up across workers.
+Files of exited workers are kept so counters never go backwards; clear the
+directory when deploying.
+
+Without METRICS_DIR the same layout lives in anonymous memory, and reads see
+only this process.
+
+File layout (little-endian, all values 8-byte aligned):
+
+    header   magic, pid, used bytes, file size, histogram buckets, created
+    records  128-byte record header (kind, value count, key) and its values:
+             "h" histogram: sum (double), errors, bucket counts
+             "c" counters:  `value count` integers
+"""
+
+from core.metrics import LogHistogram
+from config import settings
+from typing import Dict, Any, List, Optional
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"CBMETRC1"
+HEADER = struct.Struct("<8sqqqqd")
+HEADER_SIZE = 64
+RECORD = struct.Struct("<cHH123s")
+FILE_PATTERN = "worker-{pid}-{suffix}.metrics"
+
+class HistogramSeries:
+    """Views of one histogram record: the running sum, the error count and the bucket counts"""
+    
+    __slots__ = ("total", "errors", "buckets")
+    
+    def __init__(self, view: memoryview, buckets: int):
+        self.total = view[:8].cast("d")
+        self.errors = view[8:16].cast("q")
+        self.buckets = view[16:16 + 8 * buckets].cast("q")
+
+class WorkerMetricsFile:
+    """Append-only series records in a fixed-size mapping owned by one process"""
+    
+    def __init__(self, path: Optional[str], size: int):
+        self.path = path
+        self.pid = os.getpid()
+        self.buckets = LogHistogram().size
+        if path is None:
+            self._map = mmap.mmap(-1, size)
+        else:
+            # Never reuse an existing file: it holds another worker's counts
+            fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o644)
+            try:
+                os.ftruncate(fd, size)
+                self._map = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+        self._view = memoryview(self._map)
+        self.size = size
+        self.used = HEADER_SIZE
+        HEADER.pack_into(self._map, 0, MAGIC, self.pid, self.used, size, self.buckets, time.time())
+        self._lock = threading.Lock()
+        self._full_logged = False
+    
+    def _allocate(self, kind: bytes, key: str, values: int, value_bytes: int) -> Optional[memoryview]:
+        encoded = key.encode("utf-8")
+        if len(encoded) > 123:
+            raise ValueError(f"Metric key too long: {key}")
+        with self._lock:
+            start = self.used
+            end = start + RECORD.size + value_bytes
+            if end > self.size:
+                if not self._full_logged:
+                    logger.warning(f"⚠️ Metrics file {self.path or '(in memory)'} is full; new series stay process-local")
+                    self._full_logged = True
+                return None
+            RECORD.pack_into(self._map, start, kind, values, len(encoded), encoded)
+            # Publish only after the record header is written, so readers never see half a record
+            self.used = end
+            struct.pack_into("<q", self._map, 16, end)
+        return self._view[start + RECORD.size:end]
+    
+    def histogram(self, key: str) -> Optional[HistogramSeries]:
+        """A new histogram record, or None when the file is full"""
+        view = self._allocate(b"h", key, self.buckets, 16 + 8 * self.buckets)
+        return HistogramSeries(view, self.buckets) if view is not None else None
+    
+    def counters(self, key: str, count: int) -> memoryview:
+        """A new record of `count` integer counters (process-local if the file is full)"""
+        view = self._allocate(b"c", key, count, 8 * count)
+        return view.cast("q") if view is not None else memoryview(bytearray(8 * count)).cast("q")
+    
+    def snapshot(self) -> bytes:
+        return self._map[:self.used]
+
+def parse_records(data: bytes, merged: Dict[str, Dict[str, Any]]):
+    """Add one worker's records into `merged`"""
+    magic, pid, used, _, buckets, _ = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a metrics file")
+    if buckets != LogHistogram().size:
+        raise ValueError(f"Metrics file from pid {pid} has {buckets} histogram buckets")
+    position = HEADER_SIZE
+    used = min(used, len(data))
+    while position + RECORD.size <= used:
+        kind, values, key_length, key = RECORD.unpack_from(data, position)
+        position += RECORD.size
+        key = key[:key_length].decode("utf-8")
+        if kind == b"h":
+            end = position + 16 + 8 * values
+            total, errors = struct.unpack_from("<dq", data, position)
+            counts = memoryview(data)[position + 16:end].cast("q")
+            series = merged["histograms"].get(key)
+            if series is None:
+                merged["histograms"][key] = {"counts": counts.tolist(), "total": total, "errors": errors}
+            else:
+                series["total"] += total
+                series["errors"] += errors
+                series["counts"] = [a + b for a, b in zip(series["counts"], counts)]
+        else:
+            end = position + 8 * values
+            counts = struct.unpack_from(f"<{values}q", data, position)
+            existing = merged["counters"].get(key)
+            merged["counters"][key] = list(counts) if existing is None else [a + b for a, b in zip(existing, counts)]
+        position = end
+
+def read_worker_file(path: str) -> bytes:
+    """The header and used records of a worker file, without the unused (sparse) tail"""
+    with open(path, "rb") as f:
+        header = f.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE:
+            raise ValueError("Truncated metrics file")
+        used = HEADER.unpack_from(header, 0)[2]
+        return header + f.read(max(0, used - HEADER_SIZE))
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+_worker_file: Optional[WorkerMetricsFile] = None
+_worker_lock = threading.Lock()
+
+def get_worker_metrics() -> WorkerMetricsFile:
+    """This process's metrics file, created on first use and again after a fork"""
+    global _worker_file
+    worker_file = _worker_file
+    if worker_file is not None and worker_file.pid == os.getpid():
+        return worker_file
+    with _worker_lock:
+        if _worker_file is None or _worker_file.pid != os.getpid():
+            path = None
+            if settings.metrics_dir:
+                os.makedirs(settings.metrics_dir, exist_ok=True)
+                path = os.path.join(settings.metrics_dir, FILE_PATTERN.format(pid=os.getpid(), suffix=os.urandom(4).hex()))
+            _worker_file = WorkerMetricsFile(path, settings.metrics_file_bytes)
+            logger.info(f"✅ Metrics for pid {os.getpid()} in {path or 'process memory'}")
+        return _worker_file
+
+def collect_metrics() -> Dict[str, Any]:
+    """Histograms and counters summed over every worker, plus which workers contributed"""
+    merged: Dict[str, Any] = {"histograms": {}, "counters": {}, "workers": []}
+    if not settings.metrics_dir:
+        worker_file = get_worker_metrics()
+        parse_records(worker_file.snapshot(), merged)
+        merged["workers"].append({"pid": worker_file.pid, "alive": True})
+        return merged
+    
+    get_worker_metrics()
+    for filename in sorted(os.listdir(settings.metrics_dir)):
+        if not (filename.startswith("worker-") and filename.endswith(".metrics")):
+            continue
+        try:
+            data = read_worker_file(os.path.join(settings.metrics_dir, filename))
+            parse_records(data, merged)
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning(f"⚠️ Skipping metrics file {filename}: {str(e)}")
+            continue
+        pid = HEADER.unpack_from(data, 0)[1]
+        merged["workers"].append({"pid": pid, "alive": pid_alive(pid)})
+    return merged
+
+def get_worker_summary(workers: List[Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "shared": bool(settings.metrics_dir),
+        "workers": len(workers),
+        "alive": sum(1 for worker in workers if worker["alive"])
+    }
@@ -0,0 +1,121 @@
+"""
+Service level objectives with multi-window burn rates
+
+Each chatbot has an availability objective (share of successful calls) and a
+latency objective (share of calls faster than a threshold). Events are
+counted in one-minute slots over a six-hour ring, so any window up to six
+hours is a sum over slots.
+
+The burn rate of a window is its bad-event share divided by the error budget
+(1 - target): 1.0 spends the budget exactly over the SLO period, 14.4 spends
+a 30-day budget in about two days. Alerts follow the usual multi-window
+rule: a long window confirms the burn is significant and a short one
+confirms it is still happening.
+"""
+
+from typing import Dict, Any, List, Optional
+import threading
+import time
+
+BURN_WINDOWS = {"5m": 300, "30m": 1800, "1h": 3600, "6h": 21600}
+# (severity, long window, short window, burn rate both must exceed)
+BURN_ALERTS = (("page", "1h", "5m", 14.4), ("ticket", "6h", "30m", 6.0))
+
+def burn_rate(bad: int, total: int, target: float) -> float:
+    return (bad / total) / (1 - target) if total else 0.0
+
+class SLOSeries:
+    """One-minute event counts for one chatbot: total, failed and slow"""
+    
+    def __init__(self, slot_seconds: float, slots: int):
+        self.slot_seconds = slot_seconds
+        self.slot_ids = [-1] * slots
+        self.total = [0] * slots
+        self.failed = [0] * slots
+        self.slow = [0] * slots
+    
+    def record(self, now: float, failed: bool, slow: bool):
+        slot_id = int(now // self.slot_seconds)
+        position = slot_id % len(self.slot_ids)
+        if self.slot_ids[position] != slot_id:
+            self.slot_ids[position] = slot_id
+            self.total[position] = self.failed[position] = self.slow[position] = 0
+        self.total[position] += 1
+        self.failed[position] += failed
+        self.slow[position] += slow
+    
+    def window(self, seconds: float, now: float) -> List[int]:
+        """[total, failed, slow] over the last `seconds`"""
+        current = int(now // self.slot_seconds)
+        oldest = current - max(1, int(seconds // self.slot_seconds)) + 1
+        sums = [0, 0, 0]
+        for position, slot_id in enumerate(self.slot_ids):
+            if oldest <= slot_id <= current:
+                sums[0] += self.total[position]
+                sums[1] += self.failed[position]
+                sums[2] += self.slow[position]
+        return sums
+
+class SLOTracker:
+    """Per-chatbot availability and latency objectives with burn-rate alerts"""
+    
+    def __init__(self, availability_target: float = 0.99, latency_seconds: float = 5.0, latency_target: float = 0.95,
+                 slot_seconds: float = 60.0):
+        self.availability_target = availability_target
+        self.latency_seconds = latency_seconds
+        self.latency_target = latency_target
+        self.slot_seconds = slot_seconds
+        self.slots = int(max(BURN_WINDOWS.values()) // slot_seconds)
+        self.series: Dict[str, SLOSeries] = {}
+        self._lock = threading.Lock()
+    
+    def record(self, chatbot_type: str, success: bool, duration: float, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        with self._lock:
+            series = self.series.get(chatbot_type)
+            if series is None:
+                series = self.series[chatbot_type] = SLOSeries(self.slot_seconds, self.slots)
+            # A failed call also misses the latency objective
+            series.record(now, not success, not success or duration > self.latency_seconds)
+    
+    def status(self, chatbot_type: str, now: Optional[float] = None) -> Dict[str, Any]:
+        now = time.time() if now is None else now
+        with self._lock:
+            series = self.series.get(chatbot_type)
+            sums = {name: series.window(seconds, now) if series else [0, 0, 0] for name, seconds in BURN_WINDOWS.items()}
+        targets = {"availability": self.availability_target, "latency": self.latency_target}
+        
+        windows = {}
+        for name, (total, failed, slow) in sums.items():
+            bad = {"availability": failed, "latency": slow}
+            windows[name] = {
+                "events": total,
+                "availability": (total - failed) / total if total else None,
+                "latency_attainment": (total - slow) / total if total else None
+            }
+            for objective, target in targets.items():
+                windows[name][f"{objective}_burn_rate"] = burn_rate(bad[objective], total, target)
+        
+        # Share of the error budget left over the longest window
+        longest = max(BURN_WINDOWS, key=BURN_WINDOWS.get)
+        budget_remaining = {objective: 1 - windows[longest][f"{objective}_burn_rate"] for objective in targets}
+        
+        alerts = []
+        for severity, long_window, short_window, threshold in BURN_ALERTS:
+            for objective in targets:
+                key = f"{objective}_burn_rate"
+                if windows[long_window][key] > threshold and windows[short_window][key] > threshold:
+                    alerts.append({"severity": severity, "objective": objective, "long_window": long_window,
+                                   "short_window": short_window, "burn_rate_threshold": threshold})
+        return {
+            "objectives": {
+                "availability": self.availability_target,
+                "latency": {"threshold_seconds": self.latency_seconds, "target": self.latency_target}
+            },
+            "windows": windows,
+            f"error_budget_remaining_{longest}": budget_remaining,
+            "alerts": alerts
+        }
+    
+    def get_status(self) -> Dict[str, Dict[str, Any]]:
+        return {chatbot_type: self.status(chatbot_type) for chatbot_type in list(self.series)}
@@ -0,0 +1,132 @@
+"""
+Per-request stage timers
+
+The timing middleware starts a StageTimer for each request and keeps it in a
+context variable, so the route, handler and chain layers can add stages
+without passing it through every signature. Code running outside a request
+(scripts, the sync API) finds no timer and records nothing.
+
+Stages are reported in the Server-Timing response header and rolled up per
+chatbot into LatencyTracker percentiles for /api/chatbots/metrics.
+"""
+
+from core.metrics import LatencyTracker
+from core.shared_metrics import get_worker_metrics
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, Optional
+import threading
+import time
+
+# Stage names in pipeline order; Server-Timing lists them in this order
+STAGES = (
+    "validation",           # Routing and request body parsing, before the handler runs
+    "fast_paths",           # Crisis, FAQ and off-topic checks
+    "retrieval",            # Reference passage search
+    "prompt",               # System prompt rendering and message assembly
+    "ttft",                 # LLM request until the first streamed token
+    "generation",           # First token until the last
+    "response_validation",  # Response checks and formatting
+    "serialization"         # Response model validation and JSON encoding
+)
+
+_current_timer: ContextVar[Optional["StageTimer"]] = ContextVar("stage_timer", default=None)
+
+class StageTimer:
+    """Accumulates stage durations for one request"""
+    
+    __slots__ = ("started", "stages", "chatbot_type", "handled_at", "details")
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.chatbot_type: Optional[str] = None
+        self.handled_at: Optional[float] = None
+        # Input, model, token counts and error, kept if the request turns out slow or failed
+        self.details: Dict[str, Any] = {}
+    
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+    
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+    
+    def server_timing(self, total: Optional[float] = None) -> str:
+        """Server-Timing header value, durations in milliseconds"""
+        ordered = [stage for stage in STAGES if stage in self.stages]
+        ordered += [stage for stage in self.stages if stage not in STAGES]
+        entries = [f"{stage};dur={self.stages[stage] * 1000:.2f}" for stage in ordered]
+        entries.append(f"total;dur={(self.elapsed() if total is None else total) * 1000:.2f}")
+        return ", ".join(entries)
+
+class StageMetrics:
+    """Per-chatbot, per-stage latency percentiles"""
+    
+    def __init__(self):
+        self.trackers: Dict[str, Dict[str, LatencyTracker]] = {}
+        self._lock = threading.Lock()
+    
+    def record(self, chatbot_type: str, stages: Dict[str, float]):
+        trackers = self.trackers.get(chatbot_type)
+        if trackers is None:
+            with self._lock:
+                trackers = self.trackers.setdefault(chatbot_type, {})
+        for stage, seconds in stages.items():
+            tracker = trackers.get(stage)
+            if tracker is None:
+                with self._lock:
+                    tracker = trackers.get(stage)
+                    if tracker is None:
+                        tracker = LatencyTracker(get_worker_metrics().histogram(f"stage|{chatbot_type}|{stage}"))
+                        trackers[stage] = tracker
+            tracker.record(seconds)
+    
+    def get_metrics(self, chatbot_type: str) -> Dict[str, Any]:
+        trackers = self.trackers.get(chatbot_type, {})
+        return {stage: trackers[stage].summary() for stage in list(trackers)}
+
+# Global stage metrics instance
+stage_metrics = StageMetrics()
+
+def start_stage_timer() -> StageTimer:
+    """Start timing a request in the current context"""
+    timer = StageTimer()
+    _current_timer.set(timer)
+    return timer
+
+def get_stage_timer() -> Optional[StageTimer]:
+    return _current_timer.get()
+
+def record_stage(stage: str, seconds: float):
+    """Add time to a stage of the current request, if one is being timed"""
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.add(stage, seconds)
+
+def mark_request_validated():
+    """Called when a handler starts: everything before it counts as request validation"""
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.add("validation", timer.elapsed())
+
+def mark_request_handled():
+    """Called when a handler returns: everything after it counts as serialization"""
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.handled_at = time.perf_counter()
+
+def finish_stage_timer(timer: StageTimer):
+    """Close the serialization stage and roll the request's stages into the metrics"""
+    if timer.handled_at is not None:
+        timer.add("serialization", time.perf_counter() - timer.handled_at)
+    if timer.chatbot_type is not None:
+        stage_metrics.record(timer.chatbot_type, timer.stages)
+
+@contextmanager
+def untimed():
+    """Run parallel sub-requests without adding their stages to the current request"""
+    token = _current_timer.set(None)
+    try:
+        yield
+    finally:
+        _current_timer.reset(token)
@@ -7,9 +7,14 @@ from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
-from api.routes import chatbots
+from api.routes import chatbots, admin
 from config import settings
 from utils.helpers import validate_environment, get_environment_info
+from core.timing import start_stage_timer, finish_stage_timer
+from utils.tracing import tracer, configure_tracing, shutdown_tracing
+from core.request_samples import request_samples
+from core.loop_monitor import loop_monitor
+from chatbots import is_chatbot_system_ready, start_health_probes, stop_health_probes
 import logging
 import time
 from datetime import datetime
@@ -49,6 +54,7 @@ app = FastAPI(
     ## Features
     
     * Individual endpoints for each chatbot type
+    * Automatic chatbot selection with a local intent classifier
     * Batch processing for multiple requests
     * Real-time health monitoring
     * Performance metrics and analytics
@@ -78,14 +84,35 @@ app.add_middleware(
 )
 
 
-# Add request timing middleware
+configure_tracing(settings.tracing_sample_rate, settings.tracing_export_path, settings.app_name,
+                  settings.tracing_parent_sampled_per_second, settings.tracing_export_queue)
+
+# Add request timing and tracing middleware
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
-    """Add processing time to response headers"""
+    """Add processing time and the per-stage breakdown to response headers"""
     start_time = time.time()
-    response = await call_next(request)
+    timer = start_stage_timer()
+    span = tracer.start_trace(f"{request.method} {request.url.path}", {
+        "http.request.method": request.method,
+        "url.path": request.url.path
+    }, request.headers.get("traceparent"))
+    if span is None:
+        response = await call_next(request)
+    else:
+        with span:
+            response = await call_next(request)
+            span.set_attribute("http.response.status_code", response.status_code)
+            span.set_attribute("chatbot.type", timer.chatbot_type)
+            if response.status_code >= 500:
+                span.record_error(f"HTTP {response.status_code}")
+        response.headers["traceparent"] = span.traceparent()
     process_time = time.time() - start_time
+    finish_stage_timer(timer)
     response.headers["X-Process-Time"] = str(process_time)
+    response.headers["Server-Timing"] = timer.server_timing()
+    request_samples.record(timer, request.method, request.url.path, response.status_code, process_time,
+                           span.trace.trace_id if span is not None else None)
     return response
 
 # Custom exception handlers
@@ -120,6 +147,7 @@ async def global_exception_handler(request: Request, exc: Exception):
 
 # Include routers
 app.include_router(chatbots.router)
+app.include_router(admin.router)
 
 # Root endpoint
 @app.get("/", summary="API Information")
@@ -140,8 +168,13 @@ async def root():
         "redoc_url": "/redoc",
         "available_endpoints": {
             "chatbots": "/api/chatbots/",
+            "auto": "/api/chatbots/auto",
             "health": "/api/chatbots/health",
+            "liveness": "/health/live",
+            "readiness": "/health/ready",
             "metrics": "/api/chatbots/metrics",
+            "prometheus": "/api/chatbots/metrics/prometheus",
+            "slo": "/api/chatbots/slo",
             "types": "/api/chatbots/types"
         },
         "timestamp": datetime.now().isoformat()
@@ -162,6 +195,29 @@ async def quick_health_check():
         "version": settings.app_version
     }
 
+@app.get("/health/live", summary="Liveness Probe")
+async def liveness():
+    """
+    Liveness Probe
+    
+    Answers as long as the process and its event loop are responsive.
+    """
+    return {"status": "alive", "timestamp": datetime.now().isoformat()}
+
+@app.get("/health/ready", summary="Readiness Probe")
+async def readiness():
+    """
+    Readiness Probe
+    
+    503 until chatbots are loaded, and while every chatbot is unhealthy, so load
+    balancers stop routing to this instance. Uses cached health; never calls the LLM.
+    """
+    ready = is_chatbot_system_ready()
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"status": "ready" if ready else "not_ready", "timestamp": datetime.now().isoformat()}
+    )
+
 # Startup event
 @app.on_event("startup")
 async def startup_event():
@@ -169,6 +225,8 @@ async def startup_event():
     logger.info(f"Starting {settings.app_name} v{settings.app_version}")
     logger.info(f"Debug mode: {settings.debug}")
     logger.info(f"GROQ model: {settings.groq_model}")
+    start_health_probes()
+    loop_monitor.start()
     logger.info("Application startup complete")
 
 # Shutdown event
@@ -176,6 +234,9 @@ async def startup_event():
 async def shutdown_event():
     """Application shutdown tasks"""
     logger.info("Shutting down Multi-Chatbot Platform")
+    await stop_health_probes()
+    await loop_monitor.stop()
+    shutdown_tracing()
 
 # Run the application
 if __name__ == "__main__":
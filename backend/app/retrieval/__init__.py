@@ -0,0 +1,40 @@
+from .faq import FAQStore, FAQIndex, build_faq_store, normalize_question
+from .bm25 import BM25Index, BM25IndexBuilder, build_bm25_index
+from .dense import DenseIndex, DenseIndexBuilder, build_dense_index, quantize_int8
+from .embeddings import HashingEmbedder, create_embedder
+from .dedup import MinHasher, NearDuplicateFilter
+from .ingest import IngestConfig, IngestionPipeline, ingest_corpus, split_passages
+from .hybrid import HybridRetriever, RetrievalCache, LexicalReranker, create_reranker, reciprocal_rank_fusion
+from .segments import SegmentedIndex, SegmentedIndexWriter, is_segmented_index
+from .text import analyze
+
+__all__ = [
+    "FAQStore",
+    "FAQIndex",
+    "build_faq_store",
+    "normalize_question",
+    "BM25Index",
+    "BM25IndexBuilder",
+    "build_bm25_index",
+    "DenseIndex",
+    "DenseIndexBuilder",
+    "build_dense_index",
+    "quantize_int8",
+    "HashingEmbedder",
+    "create_embedder",
+    "MinHasher",
+    "NearDuplicateFilter",
+    "IngestConfig",
+    "IngestionPipeline",
+    "ingest_corpus",
+    "split_passages",
+    "HybridRetriever",
+    "RetrievalCache",
+    "LexicalReranker",
+    "create_reranker",
+    "reciprocal_rank_fusion",
+    "SegmentedIndex",
+    "SegmentedIndexWriter",
+    "is_segmented_index",
+    "analyze"
+]
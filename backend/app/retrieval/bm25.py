@@ -0,0 +1,215 @@
+"""
+BM25 keyword retrieval over a per-chatbot passage corpus
+
+The index is built offline into a directory of flat arrays:
+
+    meta.json            corpus statistics and BM25 parameters
+    vocab.json           sorted term list (term id = position)
+    offsets.npy          uint64, postings of term t are [offsets[t], offsets[t + 1])
+    doc_ids.npy          uint32 passage ids, each term's postings sorted by impact
+    impacts.npy          float16 precomputed BM25 contribution (idf x tf part)
+    passages.bin         passage store (see retrieval.passages)
+    passage_offsets.npy
+
+Because the full BM25 term weight is precomputed per posting, a query only
+sums impacts. Arrays are memory-mapped, so uvicorn workers share the pages,
+and postings are impact-ordered so a per-term cap keeps the best postings
+of very common terms while bounding query time on large corpora.
+"""
+
+from retrieval.passages import PassageStoreWriter, PassageStore
+from retrieval.text import analyze
+from typing import Dict, Any, List, Optional, Iterable
+from array import array
+import json
+import logging
+import math
+import os
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT_VERSION = 1
+
+class BM25IndexBuilder:
+    """Accumulates passages in array-backed postings and writes the on-disk index"""
+    
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._term_ids: Dict[str, int] = {}
+        self._postings_docs: List[array] = []
+        self._postings_tfs: List[array] = []
+        self._doc_lengths = array("I")
+        self._passages = PassageStoreWriter(path)
+    
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+    
+    def add(self, text: str, source: Optional[str] = None) -> int:
+        """Add one passage; returns its passage id"""
+        doc_id = len(self._doc_lengths)
+        terms = analyze(text)
+        
+        counts: Dict[str, int] = {}
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+        
+        for term, count in counts.items():
+            term_id = self._term_ids.get(term)
+            if term_id is None:
+                term_id = self._term_ids[term] = len(self._postings_docs)
+                self._postings_docs.append(array("I"))
+                self._postings_tfs.append(array("H"))
+            self._postings_docs[term_id].append(doc_id)
+            self._postings_tfs[term_id].append(min(count, 65535))
+        
+        self._doc_lengths.append(len(terms))
+        self._passages.add(text, source)
+        return doc_id
+    
+    def write(self):
+        """Compute impacts and write the index directory"""
+        path = self.path
+        self._passages.close()
+        num_passages = len(self._doc_lengths)
+        doc_lengths = np.frombuffer(self._doc_lengths, dtype=np.uint32).astype(np.float32)
+        avg_length = float(doc_lengths.mean()) if num_passages else 0.0
+        length_norm = self.k1 * (1 - self.b + self.b * doc_lengths / max(avg_length, 1e-9))
+        
+        vocab = sorted(self._term_ids)
+        offsets = np.zeros(len(vocab) + 1, dtype=np.uint64)
+        doc_id_chunks, impact_chunks = [], []
+        position = 0
+        
+        for index, term in enumerate(vocab):
+            term_id = self._term_ids[term]
+            docs = np.frombuffer(self._postings_docs[term_id], dtype=np.uint32)
+            tfs = np.frombuffer(self._postings_tfs[term_id], dtype=np.uint16).astype(np.float32)
+            
+            df = len(docs)
+            idf = math.log(1 + (num_passages - df + 0.5) / (df + 0.5))
+            impacts = idf * tfs * (self.k1 + 1) / (tfs + length_norm[docs])
+            
+            order = np.argsort(-impacts, kind="stable")
+            doc_id_chunks.append(docs[order])
+            impact_chunks.append(impacts[order].astype(np.float16))
+            position += df
+            offsets[index + 1] = position
+        
+        np.save(os.path.join(path, "offsets.npy"), offsets)
+        np.save(os.path.join(path, "doc_ids.npy"),
+                np.concatenate(doc_id_chunks) if doc_id_chunks else np.zeros(0, dtype=np.uint32))
+        np.save(os.path.join(path, "impacts.npy"),
+                np.concatenate(impact_chunks) if impact_chunks else np.zeros(0, dtype=np.float16))
+        
+        with open(os.path.join(path, "vocab.json"), "w", encoding="utf-8") as f:
+            json.dump(vocab, f, ensure_ascii=False)
+        
+        # meta.json is written last: its presence marks a complete index
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "version": INDEX_FORMAT_VERSION,
+                "num_passages": num_passages,
+                "num_terms": len(vocab),
+                "num_postings": int(position),
+                "avg_length": avg_length,
+                "k1": self.k1,
+                "b": self.b
+            }, f)
+        
+        logger.info(f"Wrote BM25 index to {path} ({num_passages} passages, {len(vocab)} terms)")
+
+class BM25Index:
+    """Memory-mapped BM25 index searcher"""
+    
+    def __init__(self, path: str, max_postings_per_term: int = 10000):
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported BM25 index version: {self.meta.get('version')}")
+        
+        with open(os.path.join(path, "vocab.json"), "r", encoding="utf-8") as f:
+            self._term_ids = {term: index for index, term in enumerate(json.load(f))}
+        
+        self.path = path
+        self.max_postings_per_term = max_postings_per_term
+        self.num_passages = self.meta["num_passages"]
+        self._offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self._doc_ids = np.load(os.path.join(path, "doc_ids.npy"), mmap_mode="r")
+        self._impacts = np.load(os.path.join(path, "impacts.npy"), mmap_mode="r")
+        self.passages = PassageStore(path)
+        # Per-thread score accumulator, reused across queries and zeroed only where touched
+        self._scratch = threading.local()
+    
+    def __len__(self) -> int:
+        return self.num_passages
+    
+    def close(self):
+        self.passages.close()
+    
+    def _accumulator(self) -> np.ndarray:
+        accumulator = getattr(self._scratch, "scores", None)
+        if accumulator is None:
+            accumulator = self._scratch.scores = np.zeros(self.num_passages, dtype=np.float32)
+        return accumulator
+    
+    def search_ids(self, query: str, top_k: int = 5) -> List[tuple]:
+        """Get (passage id, score) for the best passages, best first"""
+        term_ids = {self._term_ids[term] for term in analyze(query) if term in self._term_ids}
+        if not term_ids or top_k <= 0:
+            return []
+        
+        accumulator = self._accumulator()
+        touched = []
+        for term_id in term_ids:
+            start = int(self._offsets[term_id])
+            end = min(int(self._offsets[term_id + 1]), start + self.max_postings_per_term)
+            docs = self._doc_ids[start:end]
+            # Doc ids are unique within one term's postings, so fancy-index += is exact
+            accumulator[docs] += self._impacts[start:end]
+            touched.append(docs)
+        
+        candidates = touched[0] if len(touched) == 1 else np.concatenate(touched)
+        scores = accumulator[candidates]
+        accumulator[candidates] = 0.0
+        
+        # Candidates repeat once per matching term; over-select before de-duplicating
+        wanted = min(len(candidates), top_k * len(touched))
+        if wanted < len(candidates):
+            best = np.argpartition(-scores, wanted - 1)[:wanted]
+        else:
+            best = np.arange(len(candidates))
+        best = best[np.argsort(-scores[best], kind="stable")]
+        
+        results, seen = [], set()
+        for position in best:
+            doc_id = int(candidates[position])
+            if doc_id not in seen:
+                seen.add(doc_id)
+                results.append((doc_id, float(scores[position])))
+                if len(results) == top_k:
+                    break
+        return results
+    
+    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        """Get the best passages for a query with their text, source and score"""
+        results = []
+        for doc_id, score in self.search_ids(query, top_k):
+            passage = self.passages.get(doc_id)
+            passage["id"] = doc_id
+            passage["score"] = score
+            results.append(passage)
+        return results
+
+def build_bm25_index(passages: Iterable[Dict[str, Any]], path: str, **kwargs) -> int:
+    """Build an index directory from {"text", "source"} records; returns the passage count"""
+    builder = BM25IndexBuilder(path, **kwargs)
+    for passage in passages:
+        text = (passage.get("text") or "").strip()
+        if text:
+            builder.add(text, passage.get("source"))
+    builder.write()
+    return len(builder)
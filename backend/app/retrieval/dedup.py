@@ -0,0 +1,78 @@
+"""
+MinHash near-duplicate detection for ingested passages
+
+Each passage is reduced to the minimum of several universal hashes over its
+word shingles; the fraction of equal minimums estimates Jaccard similarity.
+LSH banding finds candidate duplicates without comparing every pair.
+"""
+
+from retrieval.text import analyze
+from typing import Dict, List
+import zlib
+import numpy as np
+
+HASH_PRIME = 4294967311  # smallest prime above 2**32, so a * x + b fits in uint64
+
+class MinHasher:
+    """Computes fixed-size MinHash signatures over word shingles"""
+    
+    def __init__(self, num_perm: int = 64, shingle_size: int = 3, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 31, size=num_perm, dtype=np.uint64)
+    
+    def shingles(self, text: str) -> np.ndarray:
+        terms = analyze(text)
+        size = min(self.shingle_size, len(terms)) or 1
+        grams = {" ".join(terms[i:i + size]) for i in range(max(1, len(terms) - size + 1))}
+        return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+    
+    def signature(self, text: str) -> np.ndarray:
+        """uint32 signature; equal positions estimate Jaccard similarity"""
+        hashes = self.shingles(text)
+        permuted = (hashes[:, None] * self._a[None, :] + self._b[None, :]) % np.uint64(HASH_PRIME)
+        return permuted.min(axis=0).astype(np.uint32)
+
+def estimate_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.mean(a == b))
+
+class NearDuplicateFilter:
+    """Remembers seen signatures and flags passages too similar to an earlier one"""
+    
+    def __init__(self, threshold: float = 0.8, num_perm: int = 64, bands: int = 16):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._buckets: List[Dict[int, int]] = [{} for _ in range(bands)]
+        self._signatures = np.empty((1024, num_perm), dtype=np.uint32)
+        self._count = 0
+        self.duplicates = 0
+    
+    def __len__(self) -> int:
+        return self._count
+    
+    def is_duplicate(self, signature: np.ndarray) -> bool:
+        """Check a signature and remember it if it is new"""
+        keys = [hash(signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+        checked = set()
+        for band, key in enumerate(keys):
+            candidate = self._buckets[band].get(key)
+            if candidate is None or candidate in checked:
+                continue
+            checked.add(candidate)
+            if estimate_similarity(signature, self._signatures[candidate]) >= self.threshold:
+                self.duplicates += 1
+                return True
+        
+        index = self._count
+        if index == len(self._signatures):
+            self._signatures = np.concatenate([self._signatures, np.empty_like(self._signatures)])
+        self._signatures[index] = signature
+        self._count += 1
+        for band, key in enumerate(keys):
+            self._buckets[band].setdefault(key, index)
+        return False
@@ -0,0 +1,238 @@
+"""
+Dense vector retrieval over int8-quantized, memory-mapped embeddings
+
+The index is built offline into a directory of flat arrays:
+
+    meta.json            embedder, dimensions and IVF parameters
+    vectors.npy          int8 [rows, dim], symmetric per-vector quantization
+    scales.npy           float32 [rows], dequantization scale of each row
+    row_ids.npy          uint32 [rows], passage id stored in each row
+    centroids.npy        float32 [nlist, dim] IVF centroids (IVF indexes only)
+    list_offsets.npy     uint64, rows of list l are [offsets[l], offsets[l + 1])
+    passages.bin         passage store (see retrieval.passages)
+    passage_offsets.npy
+
+int8 storage is 4x smaller than float32, and because every array is
+memory-mapped read-only, uvicorn workers share one copy of the pages
+through the OS page cache. Small corpora are scanned exhaustively; with
+IVF, rows are stored grouped by their nearest centroid so a query only
+scans the nprobe closest lists, each one a contiguous slice.
+"""
+
+from retrieval.embeddings import create_embedder
+from retrieval.passages import PassageStoreWriter, PassageStore
+from typing import Dict, Any, List, Optional, Tuple, Iterable
+from array import array
+import json
+import logging
+import os
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT_VERSION = 1
+SCAN_BLOCK_ROWS = 512
+BUILD_BLOCK_ROWS = 32768
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-vector int8 quantization; returns (codes, scales)"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales = np.maximum(scales, 1e-12).astype(np.float32)
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales
+
+def spherical_kmeans(vectors: np.ndarray, k: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Unit-norm centroids maximizing inner product with their members"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        empty = np.bincount(assignment, minlength=k) == 0
+        # Reseed empty clusters from random members so no list is wasted
+        sums[empty] = vectors[rng.choice(len(vectors), size=int(empty.sum()), replace=False)]
+        centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+    return centroids.astype(np.float32)
+
+class DenseIndexBuilder:
+    """Streams quantized embeddings to disk and writes the index directory"""
+    
+    def __init__(self, path: str, embedder=None, batch_size: int = 256):
+        self.path = path
+        self.embedder = embedder or create_embedder()
+        self.batch_size = batch_size
+        self._passages = PassageStoreWriter(path)
+        self._codes_path = os.path.join(path, "vectors.tmp")
+        self._codes_file = open(self._codes_path, "wb")
+        self._scales = array("f")
+        self._pending: List[str] = []
+    
+    def __len__(self) -> int:
+        return len(self._passages)
+    
+    def add(self, text: str, source: Optional[str] = None) -> int:
+        """Queue a passage for embedding; returns its id"""
+        passage_id = self._passages.add(text, source)
+        self._pending.append(text)
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        return passage_id
+    
+    def add_vectors(self, vectors: np.ndarray, texts: List[str], sources: Optional[List[str]] = None):
+        """Add precomputed embeddings (already unit-normalized) with their passages"""
+        self._flush()
+        for index, text in enumerate(texts):
+            self._passages.add(text, sources[index] if sources else None)
+        self._append(vectors)
+    
+    def _append(self, vectors: np.ndarray):
+        if vectors.shape[1] != self.embedder.dim:
+            raise ValueError(f"Expected {self.embedder.dim}-dim vectors, got {vectors.shape[1]}")
+        codes, scales = quantize_int8(vectors)
+        self._codes_file.write(codes.tobytes())
+        self._scales.extend(scales)
+    
+    def _flush(self):
+        if self._pending:
+            self._append(self.embedder.embed(self._pending))
+            self._pending = []
+    
+    def write(self, nlist: int = 0, sample_size: int = 65536, iterations: int = 10):
+        """Write the index; nlist > 0 builds IVF lists, otherwise a flat index"""
+        self._flush()
+        self._codes_file.close()
+        self._passages.close()
+        path, dim = self.path, self.embedder.dim
+        count = len(self._scales)
+        codes = np.memmap(self._codes_path, dtype=np.int8, mode="r", shape=(count, dim)) if count else np.zeros((0, dim), np.int8)
+        scales = np.frombuffer(self._scales, dtype=np.float32)
+        nlist = min(nlist, count)
+        
+        if nlist > 0:
+            rng = np.random.default_rng(0)
+            sample_rows = np.sort(rng.choice(count, size=min(sample_size, count), replace=False))
+            sample = codes[sample_rows].astype(np.float32) * scales[sample_rows, None]
+            centroids = spherical_kmeans(sample, nlist, iterations)
+            assignment = np.empty(count, dtype=np.int32)
+            for start in range(0, count, BUILD_BLOCK_ROWS // 4):
+                end = min(start + BUILD_BLOCK_ROWS // 4, count)
+                assignment[start:end] = np.argmax(codes[start:end].astype(np.float32) @ centroids.T, axis=1)
+            row_ids = np.argsort(assignment, kind="stable").astype(np.uint32)
+            list_offsets = np.zeros(nlist + 1, dtype=np.uint64)
+            list_offsets[1:] = np.cumsum(np.bincount(assignment, minlength=nlist))
+            np.save(os.path.join(path, "centroids.npy"), centroids)
+            np.save(os.path.join(path, "list_offsets.npy"), list_offsets)
+        else:
+            row_ids = np.arange(count, dtype=np.uint32)
+        
+        # Rows are copied in blocks so the build never holds every vector in memory
+        vectors = np.lib.format.open_memmap(os.path.join(path, "vectors.npy"), mode="w+", dtype=np.int8, shape=(count, dim))
+        for start in range(0, count, BUILD_BLOCK_ROWS):
+            vectors[start:start + BUILD_BLOCK_ROWS] = codes[row_ids[start:start + BUILD_BLOCK_ROWS]]
+        vectors.flush()
+        del vectors, codes
+        os.remove(self._codes_path)
+        np.save(os.path.join(path, "scales.npy"), scales[row_ids])
+        np.save(os.path.join(path, "row_ids.npy"), row_ids)
+        
+        # meta.json is written last: its presence marks a complete index
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "version": INDEX_FORMAT_VERSION,
+                "kind": "dense",
+                "embedder": self.embedder.name,
+                "dim": dim,
+                "num_passages": count,
+                "quantization": "int8",
+                "nlist": nlist
+            }, f)
+
+class DenseIndex:
+    """Read-only, memory-mapped dense index searched by inner product"""
+    
+    def __init__(self, path: str, nprobe: int = 8, embedder=None):
+        with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != INDEX_FORMAT_VERSION or self.meta.get("kind") != "dense":
+            raise ValueError(f"Unsupported dense index at {path}")
+        
+        self.path = path
+        self.num_passages = self.meta["num_passages"]
+        self.nlist = self.meta["nlist"]
+        self.nprobe = nprobe
+        self.embedder = embedder or create_embedder(self.meta["embedder"])
+        self._vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self._scales = np.load(os.path.join(path, "scales.npy"), mmap_mode="r")
+        self._row_ids = np.load(os.path.join(path, "row_ids.npy"), mmap_mode="r")
+        if self.nlist:
+            self._centroids = np.load(os.path.join(path, "centroids.npy"))
+            self._list_offsets = np.load(os.path.join(path, "list_offsets.npy"))
+        self.passages = PassageStore(path)
+    
+    def __len__(self) -> int:
+        return self.num_passages
+    
+    def close(self):
+        self.passages.close()
+    
+    def _scan(self, ranges: Iterable[Tuple[int, int]], query: np.ndarray, top_k: int) -> List[Tuple[int, float]]:
+        """Score row ranges against the query and keep the top k"""
+        best_rows, best_scores = [], []
+        for range_start, range_end in ranges:
+            scores = np.empty(range_end - range_start, dtype=np.float32)
+            # Small blocks keep the dequantized rows in cache for the matrix-vector product
+            for start in range(range_start, range_end, SCAN_BLOCK_ROWS):
+                end = min(start + SCAN_BLOCK_ROWS, range_end)
+                scores[start - range_start:end - range_start] = self._vectors[start:end].astype(np.float32) @ query
+            scores *= self._scales[range_start:range_end]
+            if len(scores) > top_k:
+                keep = np.argpartition(-scores, top_k)[:top_k]
+            else:
+                keep = np.arange(len(scores))
+            best_rows.append(keep + range_start)
+            best_scores.append(scores[keep])
+        if not best_rows:
+            return []
+        rows = np.concatenate(best_rows)
+        scores = np.concatenate(best_scores)
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        return [(int(self._row_ids[rows[i]]), float(scores[i])) for i in order]
+    
+    def search_vector(self, query: np.ndarray, top_k: int = 5, nprobe: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Get (passage id, score) pairs for a unit-norm query vector"""
+        if self.num_passages == 0 or top_k <= 0:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        nprobe = nprobe or self.nprobe
+        if not self.nlist or nprobe >= self.nlist:
+            return self._scan([(0, self.num_passages)], query, top_k)
+        
+        nearest = np.argpartition(-(self._centroids @ query), nprobe - 1)[:nprobe]
+        ranges = [(int(self._list_offsets[l]), int(self._list_offsets[l + 1])) for l in np.sort(nearest)]
+        return self._scan(ranges, query, top_k)
+    
+    def search_ids(self, query: str, top_k: int = 5) -> List[Tuple[int, float]]:
+        """Get (passage id, score) pairs for a text query"""
+        return self.search_vector(self.embedder.embed([query])[0], top_k)
+    
+    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        """Get the best passages for a query with their text, source and score"""
+        results = []
+        for passage_id, score in self.search_ids(query, top_k):
+            passage = self.passages.get(passage_id)
+            passage["id"] = passage_id
+            passage["score"] = score
+            results.append(passage)
+        return results
+
+def build_dense_index(passages: Iterable[Dict[str, Any]], path: str, nlist: int = 0, embedder=None) -> int:
+    """Build a dense index directory from {"text", "source"} records; returns the passage count"""
+    builder = DenseIndexBuilder(path, embedder)
+    for passage in passages:
+        text = (passage.get("text") or "").strip()
+        if text:
+            builder.add(text, passage.get("source"))
+    builder.write(nlist)
+    return len(builder)
@@ -0,0 +1,74 @@
+"""
+Text embedders for dense retrieval
+
+The default embedder is dependency-free: signed feature hashing of word
+unigrams, bigrams and character trigrams into a fixed-width vector. A
+sentence-transformers model can be used instead when that package is
+installed ("sentence-transformers:<model name>").
+"""
+
+from retrieval.text import analyze
+from typing import List
+import zlib
+import numpy as np
+
+class HashingEmbedder:
+    """Deterministic hashed bag-of-features embeddings (L2-normalized float32)"""
+    
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self.name = f"hashing:{dim}"
+    
+    def _features(self, text: str) -> List[str]:
+        terms = analyze(text)
+        features = list(terms)
+        features.extend(f"{a} {b}" for a, b in zip(terms, terms[1:]))
+        for term in terms:
+            padded = f"#{term}#"
+            features.extend(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+        return features
+    
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                h = zlib.crc32(feature.encode("utf-8"))
+                vectors[row, h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        # Sublinear weighting keeps repeated features from dominating
+        vectors = np.sign(vectors) * np.sqrt(np.abs(vectors))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+class SentenceTransformerEmbedder:
+    """Wraps a locally available sentence-transformers model"""
+    
+    def __init__(self, model_name: str):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            raise ImportError("sentence-transformers is required for this embedder: pip install sentence-transformers")
+        self._model = SentenceTransformer(model_name)
+        self.dim = self._model.get_sentence_embedding_dimension()
+        self.name = f"sentence-transformers:{model_name}"
+    
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return self._model.encode(texts, normalize_embeddings=True, convert_to_numpy=True).astype(np.float32)
+
+class EmbedderSpec:
+    """Name and width of an embedder, for building from precomputed vectors"""
+    
+    def __init__(self, name: str, dim: int):
+        self.name = name
+        self.dim = dim
+    
+    def embed(self, texts: List[str]) -> np.ndarray:
+        raise RuntimeError(f"{self.name} vectors must be supplied precomputed")
+
+def create_embedder(name: str = "hashing:256"):
+    """Build an embedder from its name, as stored in a dense index's metadata"""
+    kind, _, argument = name.partition(":")
+    if kind == "hashing":
+        return HashingEmbedder(int(argument or 256))
+    if kind == "sentence-transformers":
+        return SentenceTransformerEmbedder(argument)
+    raise ValueError(f"Unknown embedder: {name}")
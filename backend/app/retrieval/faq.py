@@ -0,0 +1,219 @@
+"""
+Precomputed FAQ answer store served without touching the LLM
+
+Each chatbot type gets its own index of frequently asked questions. A lookup
+first tries the normalised question verbatim, then falls back to a character
+trigram inverted index scored with the Dice coefficient, so near-identical
+phrasings ("what's an index fund" / "what is an index fund?") hit as well.
+A fuzzy hit must also agree with the stored question on negations and content
+words: "should I not pay off my card" is a few trigrams away from "should I
+pay off my card" but wants the opposite answer.
+"""
+
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+import json
+import logging
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+STORE_FORMAT_VERSION = 1
+
+NON_WORD_PATTERN = re.compile(r"[^a-z0-9]+")
+
+# Apostrophes are dropped by normalize_question, so "don't" arrives as "dont"
+NEGATION_WORDS = {
+    "not": "not", "no": "no", "never": "never", "without": "without", "nor": "nor",
+    "neither": "neither", "none": "none", "nothing": "nothing", "cannot": "not",
+    "cant": "not", "dont": "not", "doesnt": "not", "didnt": "not", "isnt": "not",
+    "arent": "not", "wasnt": "not", "werent": "not", "wont": "not", "wouldnt": "not",
+    "shouldnt": "not", "couldnt": "not", "havent": "not", "hasnt": "not", "hadnt": "not"
+}
+
+STOP_WORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "am", "do", "does", "did",
+    "i", "im", "me", "my", "you", "your", "it", "its", "we", "our", "they", "their",
+    "this", "that", "these", "those", "there", "of", "to", "in", "on", "at", "for",
+    "from", "by", "with", "and", "or", "if", "so", "what", "whats", "how", "hows",
+    "why", "when", "where", "which", "who", "should", "can", "could", "would",
+    "will", "shall", "may", "might", "must", "about", "any", "some", "get", "have", "has"
+}
+
+def normalize_question(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return NON_WORD_PATTERN.sub(" ", text.lower().replace("'", "")).strip()
+
+def char_trigrams(normalized: str) -> frozenset:
+    """Character trigrams of a normalised question, padded at word edges"""
+    padded = f" {normalized} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+def question_signature(normalized: str) -> Tuple[frozenset, frozenset]:
+    """(negation tokens, content words) a fuzzy match has to agree on
+    
+    Content words drop stop words and a plural/verb "s", so "how does compound
+    interest works" still agrees with "how does compound interest work". Antonyms
+    built with a prefix (unsafe, inactive, dislike) are different content words.
+    """
+    negations, content = set(), set()
+    for word in normalized.split():
+        if word in NEGATION_WORDS:
+            negations.add(NEGATION_WORDS[word])
+        elif word not in STOP_WORDS:
+            content.add(word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word)
+    return frozenset(negations), frozenset(content)
+
+class FAQIndex:
+    """Exact and trigram index over one chatbot's FAQ entries"""
+    
+    def __init__(self, entries: List[Dict[str, Any]]):
+        self.entries = entries
+        self._exact: Dict[str, int] = {}
+        self._postings: Dict[str, List[int]] = {}
+        self._grams: List[frozenset] = []
+        self._owner: List[int] = []
+        self._signatures: List[Tuple[frozenset, frozenset]] = []
+        
+        for entry_id, entry in enumerate(entries):
+            for question in [entry["question"]] + entry.get("aliases", []):
+                normalized = normalize_question(question)
+                if not normalized:
+                    continue
+                self._exact.setdefault(normalized, entry_id)
+                
+                variant_id = len(self._grams)
+                grams = char_trigrams(normalized)
+                self._grams.append(grams)
+                self._owner.append(entry_id)
+                self._signatures.append(question_signature(normalized))
+                for gram in grams:
+                    self._postings.setdefault(gram, []).append(variant_id)
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def lookup(self, question: str, min_similarity: float) -> Optional[Tuple[Dict[str, Any], float, str]]:
+        """Get (entry, similarity, match kind) for the best match at or above min_similarity"""
+        normalized = normalize_question(question)
+        if not normalized:
+            return None
+        
+        entry_id = self._exact.get(normalized)
+        if entry_id is not None:
+            return self.entries[entry_id], 1.0, "exact"
+        
+        grams = char_trigrams(normalized)
+        overlaps: Dict[int, int] = {}
+        for gram in grams:
+            for variant_id in self._postings.get(gram, ()):
+                overlaps[variant_id] = overlaps.get(variant_id, 0) + 1
+        if not overlaps:
+            return None
+        
+        signature = question_signature(normalized)
+        best_variant, best_score = -1, 0.0
+        for variant_id, overlap in overlaps.items():
+            score = 2.0 * overlap / (len(grams) + len(self._grams[variant_id]))
+            if score > best_score and score >= min_similarity and self._signatures[variant_id] == signature:
+                best_variant, best_score = variant_id, score
+        
+        if best_variant < 0:
+            return None
+        return self.entries[self._owner[best_variant]], best_score, "ngram"
+
+class FAQStore:
+    """Per-chatbot FAQ indexes with hit-rate counters"""
+    
+    def __init__(self, entries_by_type: Dict[str, List[Dict[str, Any]]], min_similarity: float = 0.85):
+        self.min_similarity = min_similarity
+        self.indexes = {
+            chatbot_type: FAQIndex(entries)
+            for chatbot_type, entries in entries_by_type.items()
+            if entries
+        }
+        self._lock = threading.Lock()
+        self.metrics: Dict[str, Dict[str, int]] = {}
+    
+    def handles(self, chatbot_type: str) -> bool:
+        """Whether a chatbot has any FAQ entries"""
+        return chatbot_type in self.indexes
+    
+    def lookup(self, chatbot_type: str, question: str) -> Optional[Dict[str, Any]]:
+        """Find a stored answer for a question"""
+        index = self.indexes.get(chatbot_type)
+        if index is None:
+            return None
+        
+        match = index.lookup(question, self.min_similarity)
+        
+        with self._lock:
+            counters = self.metrics.setdefault(chatbot_type, {"lookups": 0, "exact_hits": 0, "ngram_hits": 0})
+            counters["lookups"] += 1
+            if match is not None:
+                counters[f"{match[2]}_hits"] += 1
+        
+        if match is None:
+            return None
+        entry, similarity, kind = match
+        return {
+            "question": entry["question"],
+            "answer": entry["answer"],
+            "similarity": similarity,
+            "match": kind
+        }
+    
+    def get_metrics(self, chatbot_type: str) -> Dict[str, Any]:
+        """Get lookup counters and hit rate for a chatbot"""
+        with self._lock:
+            counters = dict(self.metrics.get(chatbot_type, {"lookups": 0, "exact_hits": 0, "ngram_hits": 0}))
+        hits = counters["exact_hits"] + counters["ngram_hits"]
+        counters["entries"] = len(self.indexes[chatbot_type]) if chatbot_type in self.indexes else 0
+        counters["hit_rate"] = hits / counters["lookups"] if counters["lookups"] else 0.0
+        return counters
+    
+    @classmethod
+    def load(cls, path: str, min_similarity: float = 0.85) -> "FAQStore":
+        """Load a store written by build_faq_store"""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != STORE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported FAQ store version: {data.get('version')}")
+        store = cls(data["chatbots"], min_similarity)
+        logger.info(f"Loaded FAQ store from {path} ({sum(len(i) for i in store.indexes.values())} entries)")
+        return store
+
+def build_faq_store(records: Iterable[Dict[str, Any]], default_chatbot_type: Optional[str] = None) -> Dict[str, Any]:
+    """Group question/answer records by chatbot and merge duplicate questions
+    
+    Records look like {"chatbot_type": ..., "question": ..., "answer": ..., "aliases": [...]}.
+    A later record for the same normalised question replaces the answer of an
+    earlier one and adds its aliases; its own question text already matches
+    the entry exactly, so it is not stored again.
+    """
+    chatbots: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    
+    for record in records:
+        chatbot_type = record.get("chatbot_type") or default_chatbot_type
+        question = (record.get("question") or "").strip()
+        answer = (record.get("answer") or "").strip()
+        if not chatbot_type or not question or not answer:
+            raise ValueError(f"FAQ record needs chatbot_type, question and answer: {record}")
+        
+        key = normalize_question(question)
+        entries = chatbots.setdefault(chatbot_type, {})
+        if key in entries:
+            entry = entries[key]
+            entry["answer"] = answer
+            aliases = entry["aliases"]
+        else:
+            entry = entries[key] = {"question": question, "answer": answer, "aliases": []}
+            aliases = entry["aliases"]
+        for alias in [question] + list(record.get("aliases", [])):
+            if normalize_question(alias) != key and alias not in aliases:
+                aliases.append(alias)
+    
+    return {
+        "version": STORE_FORMAT_VERSION,
+        "chatbots": {chatbot_type: list(entries.values()) for chatbot_type, entries in chatbots.items()}
+    }
@@ -0,0 +1,247 @@
+"""
+Hybrid keyword + dense retrieval with reciprocal rank fusion
+
+BM25 and the dense index miss in different ways (exact rare terms vs
+paraphrases), so both are queried in parallel and their rankings fused with
+reciprocal rank fusion: score(d) = sum over retrievers of 1 / (k + rank).
+An optional local reranker reorders the fused candidates.
+
+The whole stage runs against a latency budget: whatever searches have
+finished when it runs out are fused, and the reranker is skipped if there is
+no time left, so a slow retriever never holds up the LLM call. Searches still
+queued at the deadline are cancelled, and an index whose previous search is
+still running is skipped (and counted as a timeout) rather than queued
+behind it, so a stuck backend cannot fill the pool it shares with the
+reranker. Complete
+results are cached per (chatbot, normalized query) until an index swaps to
+a new snapshot.
+"""
+
+from retrieval.faq import normalize_question
+from retrieval.text import analyze
+from utils.tracing import start_span
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Any, List, Optional, Tuple
+from collections import OrderedDict
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class LexicalReranker:
+    """Reorders candidates by query term coverage and matched query bigrams"""
+    
+    name = "lexical"
+    
+    def rerank(self, query: str, passages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        query_terms = analyze(query)
+        if not query_terms:
+            return passages
+        unique_terms = set(query_terms)
+        query_bigrams = set(zip(query_terms, query_terms[1:]))
+        scored = []
+        for position, passage in enumerate(passages):
+            terms = analyze(passage.get("text", ""))
+            coverage = len(unique_terms.intersection(terms)) / len(unique_terms)
+            bigrams = len(query_bigrams.intersection(zip(terms, terms[1:]))) / len(query_bigrams) if query_bigrams else 0.0
+            # Fused order breaks ties
+            scored.append((coverage + 0.5 * bigrams, -position, passage))
+        scored.sort(key=lambda item: (item[0], item[1]), reverse=True)
+        return [passage for _, _, passage in scored]
+
+class CrossEncoderReranker:
+    """Reorders candidates with a locally available sentence-transformers cross-encoder"""
+    
+    def __init__(self, model_name: str):
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError:
+            raise ImportError("sentence-transformers is required for this reranker: pip install sentence-transformers")
+        self._model = CrossEncoder(model_name)
+        self.name = f"cross-encoder:{model_name}"
+    
+    def rerank(self, query: str, passages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        scores = self._model.predict([(query, passage.get("text", "")) for passage in passages])
+        order = sorted(range(len(passages)), key=lambda i: scores[i], reverse=True)
+        return [passages[i] for i in order]
+
+def create_reranker(name: Optional[str]):
+    """Build a reranker from its name ("lexical" or "cross-encoder:<model>"); None disables reranking"""
+    if not name:
+        return None
+    kind, _, argument = name.partition(":")
+    if kind == "lexical":
+        return LexicalReranker()
+    if kind == "cross-encoder":
+        return CrossEncoderReranker(argument)
+    raise ValueError(f"Unknown reranker: {name}")
+
+def reciprocal_rank_fusion(rankings: Dict[str, List[Dict[str, Any]]], k: int = 60) -> List[Dict[str, Any]]:
+    """Fuse ranked passage lists; passages are matched across retrievers by source and text"""
+    fused: Dict[Tuple[Any, str], Dict[str, Any]] = {}
+    for retriever, passages in rankings.items():
+        for rank, passage in enumerate(passages, 1):
+            key = (passage.get("source"), passage.get("text"))
+            entry = fused.get(key)
+            if entry is None:
+                entry = fused[key] = {"text": passage.get("text"), "source": passage.get("source"),
+                                      "score": 0.0, "retrievers": []}
+            entry["score"] += 1.0 / (k + rank)
+            entry["retrievers"].append(retriever)
+    return sorted(fused.values(), key=lambda entry: entry["score"], reverse=True)
+
+def index_generation(index) -> int:
+    """Snapshot generation of a segmented index (0 for static indexes)"""
+    snapshot = getattr(index, "snapshot", None)
+    return snapshot.generation if snapshot is not None else 0
+
+class RetrievalCache:
+    """LRU cache of retrieval results keyed by (chatbot, normalized query, top k), shared by all chatbots"""
+    
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str, int], Tuple[Any, List[Dict[str, Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits: Dict[str, int] = {}
+        self._misses: Dict[str, int] = {}
+    
+    def get(self, key: Tuple[str, str, int], version: Any) -> Optional[List[Dict[str, Any]]]:
+        """Cached results if present and computed against the same index version"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self._hits[key[0]] = self._hits.get(key[0], 0) + 1
+                return entry[1]
+            self._misses[key[0]] = self._misses.get(key[0], 0) + 1
+            return None
+    
+    def put(self, key: Tuple[str, str, int], version: Any, results: List[Dict[str, Any]]):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (version, results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def get_metrics(self, chatbot_type: Optional[str] = None) -> Dict[str, Any]:
+        """Hit statistics for one chatbot, or for all of them"""
+        with self._lock:
+            if chatbot_type is None:
+                hits, misses = sum(self._hits.values()), sum(self._misses.values())
+            else:
+                hits, misses = self._hits.get(chatbot_type, 0), self._misses.get(chatbot_type, 0)
+            entries = len(self._entries)
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0
+        }
+
+class HybridRetriever:
+    """Fuses BM25 and dense candidates for one chatbot within a latency budget"""
+    
+    def __init__(self, chatbot_type: str, keyword_index=None, dense_index=None, reranker=None,
+                 cache: Optional[RetrievalCache] = None, budget_ms: float = 150.0,
+                 candidates: int = 20, rrf_k: int = 60):
+        self.chatbot_type = chatbot_type
+        self.indexes = {name: index for name, index in (("bm25", keyword_index), ("dense", dense_index)) if index is not None}
+        if not self.indexes:
+            raise ValueError("HybridRetriever needs at least one index")
+        self.reranker = reranker
+        self.cache = cache
+        self.budget_ms = budget_ms
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self._pool = ThreadPoolExecutor(max_workers=len(self.indexes) + 1, thread_name_prefix=f"retrieval-{chatbot_type}")
+        self._lock = threading.Lock()
+        # Last future per index and for the reranker, to avoid queueing behind one still running
+        self._in_flight: Dict[str, Any] = {}
+        self.searches = 0
+        self.partial_results = 0
+        self.timeouts = 0
+        self.reranks_skipped = 0
+        self.total_ms = 0.0
+    
+    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        """Best fused passages; may return fewer when the budget runs out"""
+        start_time = time.perf_counter()
+        deadline = start_time + self.budget_ms / 1000
+        key = (self.chatbot_type, normalize_question(query), top_k)
+        version = tuple(index_generation(index) for index in self.indexes.values())
+        if self.cache is not None:
+            with start_span("cache.lookup", {"cache.name": "retrieval"}) as span:
+                cached = self.cache.get(key, version)
+                span.set_attribute("cache.hit", cached is not None)
+            if cached is not None:
+                return [dict(passage) for passage in cached]
+        
+        futures = {}
+        busy = 0
+        with self._lock:
+            for name, index in self.indexes.items():
+                previous = self._in_flight.get(name)
+                if previous is not None and not previous.done():
+                    busy += 1
+                    continue
+                future = self._in_flight[name] = self._pool.submit(index.search, query, self.candidates)
+                futures[future] = name
+        done, pending = wait(futures, timeout=max(0.0, deadline - time.perf_counter()))
+        for future in pending:
+            future.cancel()
+        rankings = {}
+        for future in done:
+            try:
+                rankings[futures[future]] = future.result()
+            except Exception as e:
+                logger.error(f"{futures[future]} retrieval failed for {self.chatbot_type}: {str(e)}")
+        complete = len(rankings) == len(self.indexes)
+        fused = reciprocal_rank_fusion(rankings, self.rrf_k)
+        
+        if self.reranker is not None and fused:
+            remaining = deadline - time.perf_counter()
+            rerank = None
+            with self._lock:
+                previous = self._in_flight.get("reranker")
+                if remaining > 0 and (previous is None or previous.done()):
+                    rerank = self._in_flight["reranker"] = self._pool.submit(self.reranker.rerank, query, fused)
+            if rerank is not None and wait([rerank], timeout=remaining).done:
+                try:
+                    fused = rerank.result()
+                except Exception as e:
+                    logger.error(f"Reranking failed for {self.chatbot_type}: {str(e)}")
+                    complete = False
+            else:
+                if rerank is not None:
+                    rerank.cancel()
+                complete = False
+                with self._lock:
+                    self.reranks_skipped += 1
+        
+        results = fused[:top_k]
+        with self._lock:
+            self.searches += 1
+            self.partial_results += 0 if complete else 1
+            self.timeouts += busy + len(pending)
+            self.total_ms += (time.perf_counter() - start_time) * 1000
+        # Partial results are served but never cached
+        if complete and self.cache is not None:
+            self.cache.put(key, version, results)
+        return [dict(passage) for passage in results]
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        return {
+            "backends": list(self.indexes),
+            "reranker": self.reranker.name if self.reranker is not None else None,
+            "budget_ms": self.budget_ms,
+            "searches": self.searches,
+            "partial_results": self.partial_results,
+            "timeouts": self.timeouts,
+            "reranks_skipped": self.reranks_skipped,
+            "average_ms": self.total_ms / self.searches if self.searches else 0.0,
+            "cache": self.cache.get_metrics(self.chatbot_type) if self.cache is not None else None
+        }
@@ -0,0 +1,329 @@
+"""
+Streaming ingestion of text, Markdown and HTML corpora into retrieval indexes
+
+A run walks the corpus directory and processes each file in a worker process:
+
+    1. the file is hashed (SHA-256); unchanged files are skipped
+    2. text is extracted in chunks and split into overlapping word windows
+    3. each passage gets a MinHash signature
+    4. passages are written to a content-addressed cache (cache/<sha256>.jsonl)
+       without their source, so identical files can share one cache file
+
+The manifest (path -> content hash) is checkpointed as files finish, so an
+interrupted or repeated run only processes new and changed files. The
+passages of files not yet indexed are then streamed through a near-duplicate
+filter (primed with the already indexed files) into one append-only delta
+segment per index (see retrieval.segments); the segment builders keep
+postings/vectors in compact arrays or on disk rather than in memory.
+"""
+
+from retrieval.dedup import MinHasher, NearDuplicateFilter
+from retrieval.segments import SegmentedIndexWriter, is_segmented_index
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+from typing import Dict, Any, List, Optional, Iterable, Iterator, Tuple
+from collections import deque
+from dataclasses import dataclass, asdict
+import hashlib
+import itertools
+import json
+import logging
+import os
+import re
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = {".txt": "text", ".md": "markdown", ".markdown": "markdown", ".html": "html", ".htm": "html"}
+READ_CHUNK_BYTES = 1 << 16
+MANIFEST_NAME = "manifest.json"
+
+@dataclass
+class IngestConfig:
+    """Passage splitting and deduplication parameters"""
+    passage_words: int = 200
+    overlap_words: int = 40
+    num_perm: int = 64
+    shingle_size: int = 3
+    dedup_threshold: float = 0.8
+
+class _HTMLTextExtractor(HTMLParser):
+    """Collects visible text, breaking paragraphs at block-level tags"""
+    
+    SKIP_TAGS = {"script", "style", "noscript", "template", "svg"}
+    BLOCK_TAGS = {"p", "div", "br", "li", "tr", "section", "article", "h1", "h2", "h3", "h4", "h5", "h6", "pre", "blockquote"}
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._skip_depth = 0
+        self._pieces: List[str] = []
+    
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in self.BLOCK_TAGS:
+            self._pieces.append("\n")
+    
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+        elif tag in self.BLOCK_TAGS:
+            self._pieces.append("\n")
+    
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._pieces.append(data)
+    
+    def take(self) -> str:
+        text = "".join(self._pieces)
+        self._pieces = []
+        return text
+
+MARKDOWN_PATTERNS = [
+    (re.compile(r"!\[([^\]]*)\]\([^)]*\)"), r"\1"),       # images -> alt text
+    (re.compile(r"\[([^\]]+)\]\([^)]*\)"), r"\1"),        # links -> link text
+    (re.compile(r"^\s{0,3}(#{1,6}|>|[-*+]|\d+\.)\s+"), ""),  # headings, quotes, list markers
+    (re.compile(r"(\*\*|__|\*|_|`)"), ""),                # emphasis and inline code
+    (re.compile(r"<[^>]+>"), " ")                         # inline HTML
+]
+
+def iter_text(path: str, kind: str) -> Iterator[str]:
+    """Yield a file's plain text in chunks without reading it whole"""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        if kind == "html":
+            parser = _HTMLTextExtractor()
+            while True:
+                chunk = f.read(READ_CHUNK_BYTES)
+                if not chunk:
+                    break
+                parser.feed(chunk)
+                yield parser.take()
+            parser.close()
+            yield parser.take()
+        elif kind == "markdown":
+            for line in f:
+                if line.lstrip().startswith("```"):
+                    continue
+                for pattern, replacement in MARKDOWN_PATTERNS:
+                    line = pattern.sub(replacement, line)
+                yield line
+        else:
+            for line in f:
+                yield line
+
+def split_passages(pieces: Iterable[str], passage_words: int = 200, overlap_words: int = 40) -> Iterator[str]:
+    """Split streamed text into word windows that overlap by overlap_words"""
+    if not 0 <= overlap_words < passage_words:
+        raise ValueError("overlap_words must be smaller than passage_words")
+    window: deque = deque()
+    fresh = 0  # words not yet emitted in any passage
+    carry = ""  # a word cut off at the end of the previous piece
+    for piece in itertools.chain(pieces, [" "]):
+        piece = carry + piece
+        words = piece.split()
+        carry = words.pop() if words and not piece[-1].isspace() else ""
+        for word in words:
+            window.append(word)
+            fresh += 1
+            if len(window) == passage_words:
+                yield " ".join(window)
+                for _ in range(passage_words - overlap_words):
+                    window.popleft()
+                fresh = 0
+    if fresh:
+        yield " ".join(window)
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _process_file(task: Tuple[str, str, Optional[str], str, Dict[str, Any]]) -> Tuple[str, str, Optional[int]]:
+    """Worker: hash, extract, split and sign one file; returns (relative path, digest, passage count or None if unchanged)"""
+    path, relative_path, known_digest, cache_dir, config = task
+    digest = file_digest(path)
+    cache_path = os.path.join(cache_dir, f"{digest}.jsonl")
+    if digest == known_digest and os.path.exists(cache_path):
+        return relative_path, digest, None
+    
+    config = IngestConfig(**config)
+    hasher = MinHasher(config.num_perm, config.shingle_size)
+    kind = SUPPORTED_EXTENSIONS[os.path.splitext(path)[1].lower()]
+    count = 0
+    temporary_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(temporary_path, "w", encoding="utf-8") as out:
+        for text in split_passages(iter_text(path, kind), config.passage_words, config.overlap_words):
+            record = {"text": text, "minhash": hasher.signature(text).tolist()}
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+    os.replace(temporary_path, cache_path)
+    return relative_path, digest, count
+
+def discover_files(corpus_dir: str) -> List[Tuple[str, str]]:
+    """Supported files under the corpus directory as (absolute, relative) paths, in a stable order"""
+    files = []
+    for root, dirs, names in os.walk(corpus_dir):
+        dirs.sort()
+        for name in sorted(names):
+            if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS:
+                path = os.path.join(root, name)
+                files.append((path, os.path.relpath(path, corpus_dir)))
+    return files
+
+class IngestionPipeline:
+    """Incremental corpus ingestion for one chatbot's retrieval index directory"""
+    
+    def __init__(self, output_dir: str, config: Optional[IngestConfig] = None, workers: Optional[int] = None,
+                 checkpoint_every: int = 50):
+        self.output_dir = output_dir
+        self.config = config or IngestConfig()
+        self.workers = workers or os.cpu_count() or 1
+        self.checkpoint_every = checkpoint_every
+        self.state_dir = os.path.join(output_dir, "ingest")
+        self.cache_dir = os.path.join(self.state_dir, "cache")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.manifest = self._load_manifest()
+        self.last_passages = 0
+        self.last_duplicates = 0
+    
+    def _load_manifest(self) -> Dict[str, Any]:
+        path = os.path.join(self.state_dir, MANIFEST_NAME)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("config") == asdict(self.config):
+                return manifest
+            logger.info("📝 Ingestion settings changed, reprocessing every file")
+            return {"config": asdict(self.config), "files": {}, "removed": [], "rebuild": True}
+        return {"config": asdict(self.config), "files": {}, "removed": []}
+    
+    def _save_manifest(self):
+        path = os.path.join(self.state_dir, MANIFEST_NAME)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=1, sort_keys=True)
+        os.replace(f"{path}.tmp", path)
+    
+    def scan(self, corpus_dir: str) -> Dict[str, int]:
+        """Process new and changed files in a process pool, checkpointing the manifest as they finish"""
+        files = discover_files(corpus_dir)
+        known = self.manifest["files"]
+        present = {relative for _, relative in files}
+        removed = [relative for relative in known if relative not in present]
+        for relative in removed:
+            del known[relative]
+        self.manifest.setdefault("removed", []).extend(removed)
+        
+        stats = {"files": len(files), "processed": 0, "unchanged": 0, "removed": len(removed), "passages": 0}
+        config = asdict(self.config)
+        tasks = [(path, relative, known.get(relative, {}).get("sha256"), self.cache_dir, config) for path, relative in files]
+        if not tasks:
+            self._save_manifest()
+            return stats
+        
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(tasks))) as pool:
+            # Workers write passages straight to the cache, so only small tuples come back
+            for done, (relative, digest, count) in enumerate(pool.map(_process_file, tasks, chunksize=4), 1):
+                if count is None:
+                    stats["unchanged"] += 1
+                else:
+                    previous = known.get(relative, {})
+                    known[relative] = {"sha256": digest, "passages": count}
+                    if previous.get("indexed") or previous.get("rewritten"):
+                        known[relative]["rewritten"] = True
+                    stats["processed"] += 1
+                    stats["passages"] += count
+                if done % self.checkpoint_every == 0:
+                    self._save_manifest()
+        self._save_manifest()
+        self._collect_garbage()
+        return stats
+    
+    def _collect_garbage(self):
+        """Drop cached passages no manifest entry refers to"""
+        live = {f"{entry['sha256']}.jsonl" for entry in self.manifest["files"].values()}
+        for name in os.listdir(self.cache_dir):
+            if name not in live:
+                os.remove(os.path.join(self.cache_dir, name))
+    
+    def _iter_cached(self, relative: str) -> Iterator[Dict[str, Any]]:
+        digest = self.manifest["files"][relative]["sha256"]
+        with open(os.path.join(self.cache_dir, f"{digest}.jsonl"), "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                # The cache is shared by every file with this content; the source is the file being read
+                record["source"] = relative
+                yield record
+    
+    def iter_passages(self, files: Iterable[str], seen: Iterable[str] = ()) -> Iterator[Dict[str, Any]]:
+        """Stream cached passages of files, dropping near-duplicates of earlier passages or of seen files"""
+        duplicates = NearDuplicateFilter(self.config.dedup_threshold, self.config.num_perm)
+        for relative in seen:
+            for record in self._iter_cached(relative):
+                duplicates.is_duplicate(np.asarray(record["minhash"], dtype=np.uint32))
+        seen_duplicates = duplicates.duplicates
+        self.last_passages = 0
+        for relative in files:
+            dropped = 0
+            for record in self._iter_cached(relative):
+                if duplicates.is_duplicate(np.asarray(record.pop("minhash"), dtype=np.uint32)):
+                    dropped += 1
+                    continue
+                self.last_passages += 1
+                yield record
+            self.manifest["files"][relative]["dropped"] = dropped
+        self.last_duplicates = duplicates.duplicates - seen_duplicates
+    
+    def pending(self) -> Tuple[List[str], List[str]]:
+        """Files not yet written to the indexes, and removed files not yet deleted from them"""
+        files = self.manifest["files"]
+        return sorted(r for r in files if not files[r].get("indexed")), list(self.manifest.get("removed", []))
+    
+    def update(self, backends: Iterable[str] = ("bm25",), embedder_name: str = "hashing:256") -> Dict[str, int]:
+        """Bring the segmented indexes up to date: one delta segment per backend for pending files"""
+        changed, removed = self.pending()
+        files = self.manifest["files"]
+        every_file = sorted(files)
+        if removed or any(files[relative].get("rewritten") for relative in changed):
+            # A removed or rewritten file may have held the kept copy of passages dropped from other files
+            changed = sorted(set(changed) | {relative for relative in every_file if files[relative].get("dropped")})
+        stats = {"passages": 0, "duplicates": 0, "segments": 0}
+        for backend in backends:
+            writer = SegmentedIndexWriter(os.path.join(self.output_dir, backend), backend, embedder_name)
+            if not is_segmented_index(writer.path) or self.manifest.get("rebuild"):
+                # First build (or new splitting settings): one segment replacing everything
+                name = writer.add_segment(self.iter_passages(every_file), replace_all=True)
+            elif changed or removed:
+                unchanged = [relative for relative in every_file if relative not in set(changed)]
+                name = writer.add_segment(self.iter_passages(changed, seen=unchanged), replaces=changed)
+                writer.delete_sources(removed)
+            else:
+                continue
+            stats["segments"] += 1 if name else 0
+            stats["passages"] = self.last_passages
+            stats["duplicates"] = self.last_duplicates
+        
+        for entry in files.values():
+            entry["indexed"] = True
+            entry.pop("rewritten", None)
+        self.manifest["removed"] = []
+        self.manifest.pop("rebuild", None)
+        self._save_manifest()
+        return stats
+
+def ingest_corpus(corpus_dir: str, output_dir: str, backends: Iterable[str] = ("bm25",),
+                  config: Optional[IngestConfig] = None, workers: Optional[int] = None,
+                  embedder_name: str = "hashing:256") -> Dict[str, Any]:
+    """Scan a corpus and append what changed to its indexes"""
+    pipeline = IngestionPipeline(output_dir, config, workers)
+    stats = pipeline.scan(corpus_dir)
+    backends = list(backends)
+    changed, removed = pipeline.pending()
+    missing = [b for b in backends if not is_segmented_index(os.path.join(output_dir, b))]
+    if changed or removed or missing or pipeline.manifest.get("rebuild"):
+        stats.update(pipeline.update(backends, embedder_name))
+        stats["updated"] = True
+    else:
+        stats["updated"] = False
+    return stats
@@ -0,0 +1,69 @@
+"""
+Append-only passage storage shared by the retrieval indexes
+
+    passages.bin         UTF-8 JSON records ({"text", "source"}) back to back
+    passage_offsets.npy  uint64 byte offsets, passage i is [offsets[i], offsets[i + 1])
+"""
+
+from typing import Dict, Any, Optional, Iterator
+from array import array
+import json
+import os
+import threading
+import numpy as np
+
+class PassageStoreWriter:
+    """Streams passages to disk as they are added"""
+    
+    def __init__(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self._file = open(os.path.join(path, "passages.bin"), "wb")
+        self._offsets = array("Q", [0])
+    
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+    
+    def add(self, text: str, source: Optional[str] = None) -> int:
+        """Store a passage; returns its id"""
+        record = json.dumps({"text": text, "source": source}, ensure_ascii=False).encode("utf-8")
+        self._file.write(record)
+        self._offsets.append(self._offsets[-1] + len(record))
+        return len(self._offsets) - 2
+    
+    def close(self):
+        """Flush the blob and write the offsets"""
+        self._file.close()
+        np.save(os.path.join(self.path, "passage_offsets.npy"), np.frombuffer(self._offsets, dtype=np.uint64))
+
+class PassageStore:
+    """Random access to stored passages"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._offsets = np.load(os.path.join(path, "passage_offsets.npy"), mmap_mode="r")
+        self._file = open(os.path.join(path, "passages.bin"), "rb")
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+    
+    def get(self, passage_id: int) -> Dict[str, Any]:
+        """Read one passage"""
+        start = int(self._offsets[passage_id])
+        end = int(self._offsets[passage_id + 1])
+        with self._lock:
+            self._file.seek(start)
+            raw = self._file.read(end - start)
+        return json.loads(raw)
+    
+    def iter_all(self) -> Iterator[Dict[str, Any]]:
+        """Read every passage in id order with one sequential scan"""
+        lengths = np.diff(self._offsets)
+        with open(os.path.join(self.path, "passages.bin"), "rb") as f:
+            for start in range(0, len(lengths), 65536):
+                for length in lengths[start:start + 65536].tolist():
+                    yield json.loads(f.read(length))
+    
+    def close(self):
+        self._file.close()
@@ -0,0 +1,461 @@
+"""
+Segmented retrieval indexes: append-only delta segments merged in the background
+
+A segmented index directory holds complete BM25 or dense indexes as segments
+plus a manifest naming the live ones:
+
+    SEGMENTS.json   generation, live segments, source owners, retired segments
+    seg-000001/     a regular BM25Index / DenseIndex directory
+    seg-000002/     ...
+
+Adding documents writes a new segment and commits a new manifest with
+os.replace, so readers see either the old or the new segment set. Each
+source (e.g. an ingested file) is owned by the segment that last wrote it;
+passages of a source in older segments are masked, which is how updates and
+deletions work without rewriting segments.
+
+Merges rewrite several segments into one in a separate process, then commit
+the swap. Readers poll the manifest from a maintenance thread and swap an
+immutable snapshot reference, so searches never wait on a merge or reload.
+Retired segment directories are deleted only after a grace period, leaving
+time for readers still searching the previous snapshot.
+
+BM25 statistics (idf, average length) are per segment, so scores from small
+delta segments are approximate until they are merged into a larger one.
+"""
+
+from retrieval.bm25 import BM25Index, BM25IndexBuilder
+from retrieval.dense import DenseIndex, DenseIndexBuilder
+from retrieval.embeddings import EmbedderSpec, create_embedder
+from typing import Dict, Any, List, Optional, Iterable, Tuple, Callable
+from contextlib import contextmanager
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms get in-process locking only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "SEGMENTS.json"
+MANIFEST_FORMAT_VERSION = 1
+
+def is_segmented_index(path: str) -> bool:
+    return os.path.exists(os.path.join(path, MANIFEST_NAME))
+
+def read_manifest(path: str) -> Dict[str, Any]:
+    with open(os.path.join(path, MANIFEST_NAME), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_FORMAT_VERSION:
+        raise ValueError(f"Unsupported segment manifest version: {manifest.get('version')}")
+    return manifest
+
+@contextmanager
+def _file_lock(path: str, blocking: bool = True):
+    """Cross-process advisory lock; yields False if non-blocking and already held"""
+    with open(path, "a+") as f:
+        if fcntl is None:
+            yield True
+            return
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _source_ranges(sources: List[Optional[str]]) -> Dict[str, List[List[int]]]:
+    """Contiguous passage id ranges of each source"""
+    ranges: Dict[str, List[List[int]]] = {}
+    for passage_id, source in enumerate(sources):
+        if source is None:
+            continue
+        spans = ranges.setdefault(source, [])
+        if spans and spans[-1][1] == passage_id:
+            spans[-1][1] += 1
+        else:
+            spans.append([passage_id, passage_id + 1])
+    return ranges
+
+class SegmentedIndexWriter:
+    """Appends, deletes and merges segments; safe to use from several processes"""
+    
+    def __init__(self, path: str, backend: str = "bm25", embedder_name: str = "hashing:256",
+                 ivf_min_passages: int = 50000, retire_grace_seconds: float = 60.0):
+        if backend not in ("bm25", "dense"):
+            raise ValueError(f"Unknown retrieval backend: {backend}")
+        self.path = path
+        self.backend = backend
+        self.embedder_name = embedder_name
+        self.ivf_min_passages = ivf_min_passages
+        self.retire_grace_seconds = retire_grace_seconds
+        os.makedirs(path, exist_ok=True)
+        self._commit_lock = threading.Lock()
+    
+    def _manifest(self) -> Dict[str, Any]:
+        if is_segmented_index(self.path):
+            return read_manifest(self.path)
+        return {"version": MANIFEST_FORMAT_VERSION, "backend": self.backend, "generation": 0,
+                "segments": [], "owners": {}, "retired": []}
+    
+    def _commit(self, update: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Apply an update to the latest manifest and publish it atomically"""
+        with self._commit_lock, _file_lock(os.path.join(self.path, ".commit.lock")):
+            manifest = update(self._manifest())
+            manifest["generation"] += 1
+            now = time.time()
+            expired = [entry for entry in manifest["retired"] if now - entry["retired_at"] >= self.retire_grace_seconds]
+            manifest["retired"] = [entry for entry in manifest["retired"] if entry not in expired]
+            temporary_path = os.path.join(self.path, f"{MANIFEST_NAME}.{os.getpid()}.tmp")
+            with open(temporary_path, "w", encoding="utf-8") as f:
+                json.dump(manifest, f)
+            os.replace(temporary_path, os.path.join(self.path, MANIFEST_NAME))
+        for entry in expired:
+            shutil.rmtree(os.path.join(self.path, entry["name"]), ignore_errors=True)
+        return manifest
+    
+    def _new_segment_name(self) -> str:
+        with _file_lock(os.path.join(self.path, ".commit.lock")):
+            existing = [name for name in os.listdir(self.path) if name.startswith("seg-")]
+            number = max((int(name[4:].split(".")[0]) for name in existing), default=0) + 1
+            name = f"seg-{number:06d}"
+            os.makedirs(os.path.join(self.path, f"{name}.building"))
+        return name
+    
+    def _build_segment(self, name: str, passages: Iterable[Dict[str, Any]], vectors=None) -> Tuple[int, List[Optional[str]]]:
+        """Write a segment directory; returns its passage count and per-passage sources"""
+        staging = os.path.join(self.path, f"{name}.building")
+        sources: List[Optional[str]] = []
+        if self.backend == "bm25":
+            builder = BM25IndexBuilder(staging)
+            for passage in passages:
+                builder.add(passage["text"], passage.get("source"))
+                sources.append(passage.get("source"))
+            builder.write()
+        else:
+            builder = DenseIndexBuilder(staging, vectors.embedder if vectors else create_embedder(self.embedder_name))
+            if vectors:
+                for batch_passages, batch_vectors in vectors.batches:
+                    builder.add_vectors(batch_vectors, [p["text"] for p in batch_passages], [p.get("source") for p in batch_passages])
+                    sources.extend(p.get("source") for p in batch_passages)
+            else:
+                for passage in passages:
+                    builder.add(passage["text"], passage.get("source"))
+                    sources.append(passage.get("source"))
+            count = len(sources)
+            builder.write(nlist=int(np.sqrt(count)) if count >= self.ivf_min_passages else 0)
+        with open(os.path.join(staging, "sources.json"), "w", encoding="utf-8") as f:
+            json.dump(_source_ranges(sources), f)
+        os.rename(staging, os.path.join(self.path, name))
+        return len(sources), sources
+    
+    def add_segment(self, passages: Iterable[Dict[str, Any]], replaces: Iterable[str] = (),
+                    replace_all: bool = False) -> Optional[str]:
+        """Write passages as a new delta segment; its sources (and replaces) supersede older copies"""
+        name = self._new_segment_name()
+        count, sources = self._build_segment(name, passages)
+        if count == 0:
+            shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+            name = None
+        claimed = set(source for source in sources if source is not None)
+        
+        def update(manifest):
+            if replace_all:
+                now = time.time()
+                manifest["retired"].extend({"name": s["name"], "retired_at": now} for s in manifest["segments"])
+                manifest["segments"], manifest["owners"] = [], {}
+            for source in replaces:
+                manifest["owners"][source] = None
+            for source in claimed:
+                manifest["owners"][source] = name
+            if name:
+                manifest["segments"].append({"name": name, "passages": count})
+            return manifest
+        
+        self._commit(update)
+        if name:
+            logger.info(f"✅ Added segment {name} ({count} passages) to {self.path}")
+        return name
+    
+    def delete_sources(self, sources: Iterable[str]):
+        """Hide every passage of the given sources"""
+        sources = list(sources)
+        if not sources:
+            return
+        
+        def update(manifest):
+            for source in sources:
+                manifest["owners"][source] = None
+            return manifest
+        
+        self._commit(update)
+    
+    def plan_merge(self, max_segments: int = 4, full: bool = False) -> List[str]:
+        """Segments to merge: all of them, or the smallest ones so at most max_segments remain"""
+        segments = self._manifest()["segments"]
+        if full:
+            return [s["name"] for s in segments] if len(segments) > 1 else []
+        if len(segments) <= max_segments:
+            return []
+        smallest = sorted(segments, key=lambda s: s["passages"])[:len(segments) - max_segments + 1]
+        return [s["name"] for s in smallest]
+    
+    def merge(self, max_segments: int = 4, full: bool = False) -> Optional[str]:
+        """Merge segments into one; returns the new segment, or None if nothing to do or a merge is running"""
+        with _file_lock(os.path.join(self.path, ".merge.lock"), blocking=False) as acquired:
+            if not acquired:
+                return None
+            selected = self.plan_merge(max_segments, full)
+            if not selected:
+                return None
+            start_time = time.perf_counter()
+            manifest = read_manifest(self.path)
+            snapshot = SegmentSnapshot.open(self.path, manifest, embedder=segment_embedder_spec(self.path, manifest))
+            parts = [part for part in snapshot.parts if part.name in selected]
+            name = self._new_segment_name()
+            if self.backend == "dense":
+                count, sources = self._build_segment(name, (), vectors=_LiveVectors(parts))
+            else:
+                count, sources = self._build_segment(name, (p for part in parts for p in part.iter_live_passages()))
+            snapshot.close()
+            
+            def update(manifest):
+                # Sources re-added while the merge ran keep their newer owner
+                for source in set(s for s in sources if s is not None):
+                    if manifest["owners"].get(source) in selected:
+                        manifest["owners"][source] = name
+                now = time.time()
+                manifest["retired"].extend({"name": n, "retired_at": now} for n in selected)
+                remaining = [s for s in manifest["segments"] if s["name"] not in selected]
+                manifest["segments"] = [{"name": name, "passages": count}] + remaining
+                return manifest
+            
+            self._commit(update)
+            logger.info(f"✅ Merged {len(selected)} segments into {name} ({count} passages) "
+                        f"in {time.perf_counter() - start_time:.1f}s")
+            return name
+
+def segment_embedder_spec(path: str, manifest: Dict[str, Any]) -> Optional[EmbedderSpec]:
+    """Embedder name and width recorded by a dense index's first segment"""
+    if manifest["backend"] != "dense" or not manifest["segments"]:
+        return None
+    with open(os.path.join(path, manifest["segments"][0]["name"], "meta.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    return EmbedderSpec(meta["embedder"], meta["dim"])
+
+class _LiveVectors:
+    """Streams dequantized vectors of live passages so dense merges never re-embed"""
+    
+    def __init__(self, parts):
+        self.parts = parts
+        meta = parts[0].index.meta
+        self.embedder = EmbedderSpec(meta["embedder"], meta["dim"])
+    
+    @property
+    def batches(self):
+        for part in self.parts:
+            index = part.index
+            rows_of = np.argsort(np.asarray(index._row_ids))
+            live = part.iter_live_passages(with_ids=True)
+            while True:
+                batch = list(itertools.islice(live, 8192))
+                if not batch:
+                    break
+                rows = rows_of[[passage_id for passage_id, _ in batch]]
+                vectors = np.asarray(index._vectors[rows], dtype=np.float32) * np.asarray(index._scales[rows])[:, None]
+                yield [passage for _, passage in batch], vectors
+
+class SegmentPart:
+    """One opened segment and the mask of its still-live passages"""
+    
+    def __init__(self, name: str, index, live: Optional[np.ndarray]):
+        self.name = name
+        self.index = index
+        self.live = live  # None when every passage is live
+        self.masked = 0 if live is None else int(len(live) - live.sum())
+    
+    def iter_live_passages(self, with_ids: bool = False):
+        for passage_id, passage in enumerate(self.index.passages.iter_all()):
+            if self.live is None or self.live[passage_id]:
+                yield (passage_id, passage) if with_ids else passage
+
+class SegmentSnapshot:
+    """Immutable view of the segments named by one manifest generation"""
+    
+    def __init__(self, generation: int, parts: List[SegmentPart]):
+        self.generation = generation
+        self.parts = parts
+        self.num_passages = sum(len(part.index) - part.masked for part in parts)
+    
+    @classmethod
+    def open(cls, path: str, manifest: Dict[str, Any], nprobe: int = 8, embedder=None) -> "SegmentSnapshot":
+        owners = manifest["owners"]
+        parts = []
+        for segment in manifest["segments"]:
+            segment_path = os.path.join(path, segment["name"])
+            if manifest["backend"] == "dense":
+                index = DenseIndex(segment_path, nprobe=nprobe, embedder=embedder)
+            else:
+                index = BM25Index(segment_path)
+            with open(os.path.join(segment_path, "sources.json"), "r", encoding="utf-8") as f:
+                ranges = json.load(f)
+            live = None
+            for source, spans in ranges.items():
+                if owners.get(source, segment["name"]) != segment["name"]:
+                    if live is None:
+                        live = np.ones(len(index), dtype=bool)
+                    for start, end in spans:
+                        live[start:end] = False
+            parts.append(SegmentPart(segment["name"], index, live))
+        return cls(manifest["generation"], parts)
+    
+    def close(self):
+        for part in self.parts:
+            part.index.close()
+
+class SegmentedIndex:
+    """Searches the current snapshot of a segmented index and swaps to new ones in the background"""
+    
+    def __init__(self, path: str, nprobe: int = 8):
+        self.path = path
+        self.nprobe = nprobe
+        self._manifest_stat = None
+        self._snapshot: Optional[SegmentSnapshot] = None
+        self._embedder = None
+        self._maintenance: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._merge_process = None
+        self.refresh()
+    
+    @property
+    def snapshot(self) -> SegmentSnapshot:
+        return self._snapshot
+    
+    def __len__(self) -> int:
+        return self._snapshot.num_passages
+    
+    def _stat(self):
+        stat = os.stat(os.path.join(self.path, MANIFEST_NAME))
+        return stat.st_ino, stat.st_mtime_ns
+    
+    def refresh(self) -> bool:
+        """Open the latest manifest generation if it changed; returns True on swap"""
+        stat = self._stat()
+        if stat == self._manifest_stat:
+            return False
+        for attempt in range(3):
+            manifest = read_manifest(self.path)
+            if self._snapshot is not None and manifest["generation"] == self._snapshot.generation:
+                self._manifest_stat = stat
+                return False
+            if self._embedder is None and manifest["backend"] == "dense" and manifest["segments"]:
+                self._embedder = create_embedder(segment_embedder_spec(self.path, manifest).name)
+            try:
+                snapshot = SegmentSnapshot.open(self.path, manifest, self.nprobe, self._embedder)
+                break
+            except FileNotFoundError:
+                # A merge retired a segment between reading the manifest and opening it
+                stat = self._stat()
+        else:
+            raise RuntimeError(f"Could not open a consistent snapshot of {self.path}")
+        self.backend = manifest["backend"]
+        # Searches already running keep using the snapshot they started with
+        self._snapshot = snapshot
+        self._manifest_stat = stat
+        return True
+    
+    def start_maintenance(self, interval: float = 2.0, merge_max_segments: int = 0):
+        """Poll for new segments in a daemon thread; optionally launch merges in a child process"""
+        if self._maintenance is not None:
+            return
+        
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    if self.refresh():
+                        logger.info(f"🔄 Swapped {self.path} to generation {self._snapshot.generation}")
+                    if merge_max_segments and len(self._snapshot.parts) > merge_max_segments:
+                        self._launch_merge(merge_max_segments)
+                except Exception as e:
+                    logger.error(f"❌ Segment maintenance failed for {self.path}: {str(e)}")
+        
+        self._maintenance = threading.Thread(target=run, name="segment-maintenance", daemon=True)
+        self._maintenance.start()
+    
+    def _launch_merge(self, max_segments: int):
+        """Merge in a spawned process so the serving process never runs index builds"""
+        if self._merge_process is not None and self._merge_process.is_alive():
+            return
+        context = multiprocessing.get_context("spawn")
+        self._merge_process = context.Process(
+            target=merge_segments, args=(self.path, self.backend, max_segments), daemon=True
+        )
+        self._merge_process.start()
+    
+    def stop_maintenance(self):
+        self._stop.set()
+        if self._maintenance is not None:
+            self._maintenance.join()
+            self._maintenance = None
+        if self._merge_process is not None:
+            self._merge_process.join()
+            self._merge_process = None
+    
+    def close(self):
+        self.stop_maintenance()
+    
+    def _search_part(self, part: SegmentPart, query, top_k: int) -> List[Tuple[int, float]]:
+        wanted = top_k
+        while True:
+            if self.backend == "dense":
+                results = part.index.search_vector(query, wanted)
+            else:
+                results = part.index.search_ids(query, wanted)
+            if part.live is None:
+                return results
+            live = [(passage_id, score) for passage_id, score in results if part.live[passage_id]]
+            # Over-fetch until enough live results are found or the segment is exhausted
+            if len(live) >= top_k or len(results) < wanted:
+                return live[:top_k]
+            wanted *= 4
+    
+    def _search_snapshot(self, snapshot: SegmentSnapshot, query: str, top_k: int) -> List[Tuple[SegmentPart, int, float]]:
+        prepared = self._embedder.embed([query])[0] if self.backend == "dense" and snapshot.parts else query
+        results = []
+        for part in snapshot.parts:
+            results.extend((part, passage_id, score) for passage_id, score in self._search_part(part, prepared, top_k))
+        results.sort(key=lambda item: item[2], reverse=True)
+        return results[:top_k]
+    
+    def search_ids(self, query: str, top_k: int = 5) -> List[Tuple[str, float]]:
+        """Get ("segment:passage id", score) pairs across the current snapshot, best first"""
+        return [(f"{part.name}:{passage_id}", score)
+                for part, passage_id, score in self._search_snapshot(self._snapshot, query, top_k)]
+    
+    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        """Get the best passages for a query with their text, source and score"""
+        results = []
+        for part, passage_id, score in self._search_snapshot(self._snapshot, query, top_k):
+            passage = part.index.passages.get(passage_id)
+            passage["id"] = f"{part.name}:{passage_id}"
+            passage["score"] = score
+            results.append(passage)
+        return results
+
+def merge_segments(path: str, backend: str, max_segments: int = 4, full: bool = False, niceness: int = 10) -> Optional[str]:
+    """Run one merge (entry point for merge processes), at lower CPU priority than request serving"""
+    if niceness and hasattr(os, "nice"):
+        os.nice(niceness)
+    return SegmentedIndexWriter(path, backend).merge(max_segments, full)
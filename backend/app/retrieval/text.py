@@ -0,0 +1,25 @@
+"""
+Shared text analysis for the retrieval indexes
+"""
+
+from typing import List
+import re
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOP_WORDS = frozenset(
+    "a an and are as at be been but by can could did do does for from had has have how i if in "
+    "into is it its me my no not of on or our so such than that the their them then there these "
+    "they this to was we were what when where which while who why will with would you your".split()
+)
+
+def analyze(text: str) -> List[str]:
+    """Lowercase word tokens without stop words, with plural 's' stripped"""
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token in STOP_WORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        terms.append(token)
+    return terms
@@ -0,0 +1,7 @@
+from .hashring import ConsistentHashRing, SessionAffinityRouter, hash_key
+
+__all__ = [
+    "ConsistentHashRing",
+    "SessionAffinityRouter",
+    "hash_key"
+]
@@ -0,0 +1,200 @@
+"""
+Consistent hashing for session-affinity routing across backend nodes
+"""
+
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+import bisect
+import hashlib
+import itertools
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+def hash_key(key: str) -> int:
+    """Stable 64-bit hash of a key (independent of PYTHONHASHSEED, so every process agrees)"""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+class ConsistentHashRing:
+    """Hash ring with virtual nodes; a node joining or leaving only remaps ~1/N of the keys"""
+    
+    def __init__(self, nodes: Optional[Iterable[str]] = None, virtual_nodes: int = 160):
+        if virtual_nodes < 1:
+            raise ValueError("virtual_nodes must be at least 1")
+        
+        self.virtual_nodes = virtual_nodes
+        self._weights: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # (sorted ring positions, owner of each position); replaced as a whole so readers never lock
+        self._state: Tuple[List[int], List[str]] = ([], [])
+        
+        for node in nodes or []:
+            self.add_node(node)
+    
+    def _rebuild(self):
+        """Recompute ring positions for the current node set"""
+        points = []
+        for node, weight in self._weights.items():
+            for replica in range(self.virtual_nodes * weight):
+                points.append((hash_key(f"{node}#{replica}"), node))
+        points.sort()
+        self._state = ([point[0] for point in points], [point[1] for point in points])
+    
+    def add_node(self, node: str, weight: int = 1) -> bool:
+        """Add a node to the ring; weight multiplies its share of virtual nodes"""
+        if weight < 1:
+            raise ValueError("weight must be at least 1")
+        with self._lock:
+            if node in self._weights:
+                return False
+            self._weights[node] = weight
+            self._rebuild()
+        logger.info(f"Added node {node} to hash ring ({len(self._weights)} nodes)")
+        return True
+    
+    def remove_node(self, node: str) -> bool:
+        """Remove a node from the ring"""
+        with self._lock:
+            if node not in self._weights:
+                return False
+            del self._weights[node]
+            self._rebuild()
+        logger.info(f"Removed node {node} from hash ring ({len(self._weights)} nodes)")
+        return True
+    
+    @property
+    def nodes(self) -> List[str]:
+        """Nodes currently on the ring"""
+        return list(self._weights.keys())
+    
+    def get_node(self, key: str) -> Optional[str]:
+        """Get the node owning a key"""
+        positions, owners = self._state
+        if not positions:
+            return None
+        index = bisect.bisect(positions, hash_key(key)) % len(positions)
+        return owners[index]
+    
+    def get_nodes(self, key: str, count: Optional[int] = None) -> List[str]:
+        """Get distinct nodes for a key in ring order (the preference list used for failover)"""
+        positions, owners = self._state
+        if not positions:
+            return []
+        
+        distinct_nodes = len(set(owners))
+        wanted = distinct_nodes if count is None else min(count, distinct_nodes)
+        start = bisect.bisect(positions, hash_key(key))
+        
+        preference: List[str] = []
+        for offset in range(len(positions)):
+            owner = owners[(start + offset) % len(positions)]
+            if owner not in preference:
+                preference.append(owner)
+                if len(preference) == wanted:
+                    break
+        return preference
+
+class SessionAffinityRouter:
+    """Maps session ids to nodes, fails over around down nodes and counts affinity misses"""
+    
+    def __init__(self, nodes: Optional[Iterable[str]] = None, virtual_nodes: int = 160,
+                 down_cooldown: float = 10.0, max_tracked_sessions: int = 100_000):
+        self.ring = ConsistentHashRing(nodes, virtual_nodes)
+        self.down_cooldown = down_cooldown
+        self.max_tracked_sessions = max_tracked_sessions
+        self._down_until: Dict[str, float] = {}
+        self._last_node: "OrderedDict[str, str]" = OrderedDict()
+        self._round_robin = itertools.count()
+        self._lock = threading.Lock()
+        self.stats = {
+            "total_requests": 0,
+            "affine_requests": 0,
+            "affinity_misses": 0,
+            "session_moves": 0,
+            "unaffined_requests": 0
+        }
+    
+    def add_node(self, node: str, weight: int = 1) -> bool:
+        """Add a node; only sessions that now hash to it move"""
+        return self.ring.add_node(node, weight)
+    
+    def remove_node(self, node: str) -> bool:
+        """Remove a node; its sessions spread over the remaining nodes"""
+        self._down_until.pop(node, None)
+        return self.ring.remove_node(node)
+    
+    def mark_down(self, node: str):
+        """Take a node out of rotation for the cooldown period"""
+        self._down_until[node] = time.monotonic() + self.down_cooldown
+        logger.warning(f"Node {node} marked down for {self.down_cooldown}s")
+    
+    def mark_up(self, node: str):
+        """Put a node back into rotation"""
+        self._down_until.pop(node, None)
+    
+    def is_available(self, node: str) -> bool:
+        """Check whether a node is outside its down cooldown"""
+        down_until = self._down_until.get(node)
+        return down_until is None or time.monotonic() >= down_until
+    
+    def preference_list(self, session_id: Optional[str]) -> List[str]:
+        """Get candidate nodes for a session, affine node first, down nodes last"""
+        if session_id:
+            candidates = self.ring.get_nodes(session_id)
+        else:
+            # No session means no affinity: spread the load round-robin
+            candidates = self.ring.nodes
+            if candidates:
+                shift = next(self._round_robin) % len(candidates)
+                candidates = candidates[shift:] + candidates[:shift]
+        
+        available = [node for node in candidates if self.is_available(node)]
+        return available + [node for node in candidates if node not in available]
+    
+    def route(self, session_id: Optional[str]) -> Optional[str]:
+        """Pick the node for a session and record it as served (for load balancers that only need a choice)"""
+        candidates = self.preference_list(session_id)
+        if not candidates:
+            return None
+        self.record_served(session_id, candidates[0])
+        return candidates[0]
+    
+    def record_served(self, session_id: Optional[str], node: str):
+        """Record which node actually served a request for a session"""
+        with self._lock:
+            self.stats["total_requests"] += 1
+            
+            if not session_id:
+                self.stats["unaffined_requests"] += 1
+                return
+            
+            if node == self.ring.get_node(session_id):
+                self.stats["affine_requests"] += 1
+            else:
+                self.stats["affinity_misses"] += 1
+            
+            previous = self._last_node.get(session_id)
+            if previous is not None and previous != node:
+                self.stats["session_moves"] += 1
+            
+            self._last_node[session_id] = node
+            self._last_node.move_to_end(session_id)
+            if len(self._last_node) > self.max_tracked_sessions:
+                self._last_node.popitem(last=False)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Get routing statistics"""
+        with self._lock:
+            stats = dict(self.stats)
+        
+        affined = stats["total_requests"] - stats["unaffined_requests"]
+        stats["affinity_miss_rate"] = stats["affinity_misses"] / affined if affined else 0.0
+        stats["tracked_sessions"] = len(self._last_node)
+        stats["nodes"] = {
+            node: "up" if self.is_available(node) else "down"
+            for node in self.ring.nodes
+        }
+        stats["virtual_nodes"] = self.ring.virtual_nodes
+        return stats
@@ -0,0 +1,256 @@
+"""
+Local intent classifier that picks the right chatbot without an LLM call
+
+Hashed word/bigram/prefix features feed a multinomial logistic regression
+trained offline on labeled examples. Prediction touches a few dozen sparse
+weights, so it stays well under a millisecond on CPU.
+"""
+
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+import json
+import logging
+import math
+import os
+import random
+import re
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+DEFAULT_EXAMPLES_PATH = os.path.join(DATA_DIR, "intent_examples.jsonl")
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9'+#]*")
+
+# Function words carry no topic signal and drown it out in short messages
+STOP_WORDS = frozenset(
+    "a an the i i'm me my we you your it this that is are was be been am do does did "
+    "how what why when where which who can could would should will to of in on at for "
+    "with about and or but if so get just any some there".split()
+)
+
+class HashedFeatureExtractor:
+    """Turns text into L2-normalised hashed unigram, bigram and prefix features"""
+    
+    def __init__(self, n_buckets: int = 2 ** 18, prefix_length: int = 5):
+        if n_buckets & (n_buckets - 1):
+            raise ValueError("n_buckets must be a power of two")
+        self.n_buckets = n_buckets
+        self.prefix_length = prefix_length
+        self._mask = n_buckets - 1
+    
+    def tokenize(self, text: str) -> List[str]:
+        """Lowercase word tokens without stop words"""
+        return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS]
+    
+    def extract(self, text: str) -> Dict[int, float]:
+        """Get sparse feature vector {bucket: weight} for a text"""
+        tokens = self.tokenize(text)
+        terms = list(tokens)
+        terms.extend(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+        # Prefixes let "investing", "investment" and "investor" share evidence
+        terms.extend(f"p:{t[:self.prefix_length]}" for t in tokens if len(t) > self.prefix_length)
+        
+        counts: Dict[int, float] = {}
+        for term in terms:
+            bucket = zlib.crc32(term.encode("utf-8")) & self._mask
+            counts[bucket] = counts.get(bucket, 0.0) + 1.0
+        
+        if not counts:
+            return counts
+        
+        # Sublinear term frequency, then L2 normalisation
+        for bucket, count in counts.items():
+            counts[bucket] = 1.0 + math.log(count)
+        norm = math.sqrt(sum(value * value for value in counts.values()))
+        return {bucket: value / norm for bucket, value in counts.items()}
+
+class IntentClassifier:
+    """Multinomial logistic regression over hashed features"""
+    
+    def __init__(self, labels: List[str], n_buckets: int = 2 ** 18):
+        self.labels = list(labels)
+        self.features = HashedFeatureExtractor(n_buckets)
+        self.weights: Dict[int, List[float]] = {}
+        self.bias: List[float] = [0.0] * len(self.labels)
+    
+    def _scores(self, features: Dict[int, float]) -> List[float]:
+        """Raw linear scores per label"""
+        scores = list(self.bias)
+        for bucket, value in features.items():
+            row = self.weights.get(bucket)
+            if row is not None:
+                for index, weight in enumerate(row):
+                    scores[index] += weight * value
+        return scores
+    
+    @staticmethod
+    def _softmax(scores: List[float]) -> List[float]:
+        top = max(scores)
+        exps = [math.exp(score - top) for score in scores]
+        total = sum(exps)
+        return [value / total for value in exps]
+    
+    def predict_proba(self, text: str) -> Dict[str, float]:
+        """Get probability for every label"""
+        probabilities = self._softmax(self._scores(self.features.extract(text)))
+        return dict(zip(self.labels, probabilities))
+    
+    def predict(self, text: str) -> Tuple[str, float]:
+        """Get the most likely label and its probability"""
+        probabilities = self._softmax(self._scores(self.features.extract(text)))
+        best = max(range(len(probabilities)), key=probabilities.__getitem__)
+        return self.labels[best], probabilities[best]
+    
+    def fit(self, examples: List[Tuple[str, str]], epochs: int = 30, learning_rate: float = 0.5,
+            l2: float = 1e-5, seed: int = 13) -> "IntentClassifier":
+        """Train with SGD on (text, label) pairs"""
+        label_index = {label: index for index, label in enumerate(self.labels)}
+        samples = [
+            (self.features.extract(text), label_index[label])
+            for text, label in examples
+            if label in label_index
+        ]
+        if not samples:
+            raise ValueError("No training examples match the classifier labels")
+        
+        rng = random.Random(seed)
+        n_labels = len(self.labels)
+        
+        for epoch in range(epochs):
+            rng.shuffle(samples)
+            rate = learning_rate / (1.0 + epoch * 0.1)
+            
+            for features, target in samples:
+                probabilities = self._softmax(self._scores(features))
+                gradient = [
+                    probabilities[index] - (1.0 if index == target else 0.0)
+                    for index in range(n_labels)
+                ]
+                for index in range(n_labels):
+                    self.bias[index] -= rate * gradient[index]
+                for bucket, value in features.items():
+                    row = self.weights.setdefault(bucket, [0.0] * n_labels)
+                    for index in range(n_labels):
+                        row[index] -= rate * (gradient[index] * value + l2 * row[index])
+        
+        return self
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialise the model"""
+        return {
+            "labels": self.labels,
+            "n_buckets": self.features.n_buckets,
+            "bias": self.bias,
+            "weights": {str(bucket): row for bucket, row in self.weights.items()}
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "IntentClassifier":
+        """Load a model serialised with to_dict"""
+        model = cls(data["labels"], data["n_buckets"])
+        model.bias = list(data["bias"])
+        model.weights = {int(bucket): list(row) for bucket, row in data["weights"].items()}
+        return model
+    
+    def save(self, path: str):
+        """Write the model as JSON"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+    
+    @classmethod
+    def load(cls, path: str) -> "IntentClassifier":
+        """Read a model written by save"""
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+def load_examples(path: str = DEFAULT_EXAMPLES_PATH) -> List[Tuple[str, str]]:
+    """Read labeled examples from a JSONL file of {"text": ..., "label": ...} lines"""
+    examples = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                record = json.loads(line)
+                examples.append((record["text"], record["label"]))
+    return examples
+
+def train_intent_classifier(examples: Iterable[Tuple[str, str]], labels: Optional[List[str]] = None,
+                            **fit_kwargs) -> IntentClassifier:
+    """Train a classifier; labels default to those seen in the examples, in first-seen order"""
+    examples = list(examples)
+    if labels is None:
+        labels = list(dict.fromkeys(label for _, label in examples))
+    return IntentClassifier(labels).fit(examples, **fit_kwargs)
+
+class IntentRouter:
+    """Picks a chatbot type for a message using the local classifier"""
+    
+    def __init__(self, classifier: IntentClassifier, chatbot_types: Optional[List[str]] = None,
+                 min_confidence: float = 0.0, fallback_type: Optional[str] = None):
+        self.classifier = classifier
+        self.set_chatbot_types(chatbot_types)
+        self.min_confidence = min_confidence
+        self.fallback_type = fallback_type
+    
+    def set_chatbot_types(self, chatbot_types: Optional[List[str]]):
+        """Limit routing to these chatbot types (None allows every label the classifier knows)"""
+        self.chatbot_types = [
+            label for label in self.classifier.labels
+            if chatbot_types is None or label in chatbot_types
+        ]
+        self._available = set(chatbot_types) if chatbot_types is not None else set(self.classifier.labels)
+    
+    @property
+    def routable_fallback(self) -> Optional[str]:
+        """The fallback type if it can be served right now, else None (ask the user to clarify)"""
+        return self.fallback_type if self.fallback_type in self._available else None
+    
+    def route(self, message: str, top_k: int = 3) -> Dict[str, Any]:
+        """Classify a message into a chatbot type with a confidence score
+        
+        Below the confidence floor (or with no routable types) the message goes
+        to the fallback type, or gets chatbot_type None when there is none so the
+        caller can ask the user to clarify.
+        """
+        start_time = time.perf_counter()
+        probabilities = self.classifier.predict_proba(message)
+        
+        # Only routable chatbot types compete; renormalise over them
+        candidates = {label: probabilities[label] for label in self.chatbot_types}
+        total = sum(candidates.values()) or 1.0
+        ranked = sorted(candidates.items(), key=lambda item: item[1], reverse=True)
+        
+        best_type, confidence = (ranked[0][0], ranked[0][1] / total) if ranked else (None, 0.0)
+        low_confidence = best_type is None or confidence < self.min_confidence
+        # A low-confidence guess is only a suggestion, so it stays in the alternatives
+        suggestions = ranked[:top_k] if low_confidence else ranked[1:top_k]
+        
+        return {
+            "chatbot_type": self.routable_fallback if low_confidence else best_type,
+            "confidence": confidence,
+            "low_confidence": low_confidence,
+            "alternatives": [
+                {"chatbot_type": label, "confidence": score / total}
+                for label, score in suggestions
+            ],
+            "classification_ms": (time.perf_counter() - start_time) * 1000
+        }
+
+def create_intent_router(chatbot_types: List[str], model_path: Optional[str] = None,
+                         min_confidence: float = 0.0, fallback_type: Optional[str] = None) -> IntentRouter:
+    """Load the offline-trained model, or train one from the bundled examples if none is configured"""
+    if model_path and os.path.exists(model_path):
+        classifier = IntentClassifier.load(model_path)
+        logger.info(f"Loaded intent model from {model_path}")
+    else:
+        if model_path:
+            logger.warning(f"Intent model {model_path} not found, training from bundled examples")
+        start_time = time.perf_counter()
+        classifier = train_intent_classifier(load_examples())
+        logger.info(f"Trained intent model in {(time.perf_counter() - start_time) * 1000:.0f}ms")
+    router = IntentRouter(classifier, chatbot_types, min_confidence, fallback_type)
+    if fallback_type is not None and router.routable_fallback is None:
+        logger.warning(f"Intent fallback {fallback_type} is not an available chatbot, low-confidence messages will be asked to clarify")
+    return router
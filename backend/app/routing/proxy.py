@@ -0,0 +1,158 @@
+"""
+ASGI front proxy that pins every conversation to the backend node holding its session
+"""
+
+from routing.hashring import SessionAffinityRouter
+from typing import Dict, Any, List, Optional, Iterable
+import httpx
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Headers that describe a single connection and must not be forwarded
+HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailers", "transfer-encoding", "upgrade", "host", "content-length"
+}
+
+STATS_PATH = "/__affinity/stats"
+
+class AffinityProxy:
+    """Minimal ASGI proxy that routes requests by session id over a consistent hash ring"""
+    
+    def __init__(self, nodes: Iterable[str], virtual_nodes: int = 160,
+                 session_header: str = "x-session-id", timeout: float = 60.0,
+                 down_cooldown: float = 10.0):
+        self.router = SessionAffinityRouter(
+            [node.rstrip("/") for node in nodes],
+            virtual_nodes=virtual_nodes,
+            down_cooldown=down_cooldown
+        )
+        self.session_header = session_header.lower().encode("latin-1")
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """Get the shared upstream client, creating it on first use"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+    
+    def _extract_session_id(self, headers: List[tuple], body: bytes) -> Optional[str]:
+        """Read the session id from the session header or from `context.session_id` in a JSON body"""
+        content_type = b""
+        for name, value in headers:
+            if name == self.session_header and value:
+                return value.decode("latin-1")
+            if name == b"content-type":
+                content_type = value
+        
+        if body and b"json" in content_type:
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                return None
+            context = payload.get("context") if isinstance(payload, dict) else None
+            if isinstance(context, dict) and context.get("session_id"):
+                return str(context["session_id"])
+        return None
+    
+    async def _send_json(self, send, status_code: int, content: Dict[str, Any]):
+        """Send a small JSON response generated by the proxy itself"""
+        body = json.dumps(content).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        })
+        await send({"type": "http.response.body", "body": body})
+    
+    async def _lifespan(self, receive, send):
+        """Handle ASGI lifespan events"""
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self._get_client()
+                logger.info(f"Affinity proxy started with nodes: {self.router.ring.nodes}")
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._client is not None:
+                    await self._client.aclose()
+                    self._client = None
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        
+        if scope["path"] == STATS_PATH:
+            await self._send_json(send, 200, self.router.get_stats())
+            return
+        
+        # Buffer the request body; chat payloads are small (messages are capped at 2000 chars)
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+        
+        session_id = self._extract_session_id(scope["headers"], body)
+        headers = [
+            (name.decode("latin-1"), value.decode("latin-1"))
+            for name, value in scope["headers"]
+            if name.decode("latin-1").lower() not in HOP_BY_HOP_HEADERS
+        ]
+        path = scope.get("raw_path") or scope["path"].encode("utf-8")
+        if scope.get("query_string"):
+            path += b"?" + scope["query_string"]
+        
+        client = self._get_client()
+        for node in self.router.preference_list(session_id):
+            request = client.build_request(
+                scope["method"], node + path.decode("latin-1"), headers=headers, content=body
+            )
+            try:
+                upstream = await client.send(request, stream=True)
+            except httpx.TransportError as e:
+                logger.warning(f"Upstream {node} unreachable: {str(e)}")
+                self.router.mark_down(node)
+                continue
+            
+            self.router.record_served(session_id, node)
+            try:
+                response_headers = [
+                    (name.encode("latin-1"), value.encode("latin-1"))
+                    for name, value in upstream.headers.multi_items()
+                    if name.lower() not in HOP_BY_HOP_HEADERS
+                ]
+                response_headers.append((b"x-upstream-node", node.encode("latin-1")))
+                await send({
+                    "type": "http.response.start",
+                    "status": upstream.status_code,
+                    "headers": response_headers
+                })
+                async for chunk in upstream.aiter_raw():
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                await send({"type": "http.response.body", "body": b""})
+            finally:
+                await upstream.aclose()
+            return
+        
+        await self._send_json(send, 502, {
+            "success": False,
+            "error": "No backend node available",
+            "error_type": "upstream_unavailable"
+        })
+
+def create_affinity_proxy(nodes: Iterable[str], virtual_nodes: int = 160, **kwargs) -> AffinityProxy:
+    """Create an affinity proxy for the given backend base URLs"""
+    nodes = [node for node in nodes if node]
+    if not nodes:
+        raise ValueError("At least one backend node is required")
+    return AffinityProxy(nodes, virtual_nodes=virtual_nodes, **kwargs)
@@ -0,0 +1,57 @@
+"""
+Local token counting
+
+Counts tokens without calling the model API. tiktoken's cl100k_base
+encoding is used when it is installed (close to the Llama 3 vocabulary);
+otherwise a regex pre-tokenizer with a word-length heuristic gives an
+estimate that is usually within ~10% for English prose.
+"""
+
+from typing import Optional
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Same split as the GPT-4/Llama 3 pre-tokenizers: contractions, words, 1-3 digit groups, punctuation runs, whitespace
+PRETOKEN_PATTERN = re.compile(r"'(?:s|t|re|ve|m|ll|d)| ?[^\W\d_]+| ?\d{1,3}| ?[^\s\w]+|\s+", re.IGNORECASE)
+
+class ApproximateTokenizer:
+    """Estimates BPE token counts; long words count one token per six characters"""
+    
+    name = "approximate"
+    
+    def count(self, text: str) -> int:
+        total = 0
+        for piece in PRETOKEN_PATTERN.findall(text):
+            total += 1 + (len(piece.strip()) - 1) // 6 if len(piece) > 7 else 1
+        return total
+
+class TiktokenTokenizer:
+    """Exact counts for a tiktoken encoding"""
+    
+    def __init__(self, encoding: str = "cl100k_base"):
+        import tiktoken
+        self._encoding = tiktoken.get_encoding(encoding)
+        self.name = f"tiktoken:{encoding}"
+    
+    def count(self, text: str) -> int:
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+_tokenizer = None
+
+def get_tokenizer():
+    """The process-wide tokenizer, created on first use"""
+    global _tokenizer
+    if _tokenizer is None:
+        try:
+            _tokenizer = TiktokenTokenizer()
+        except Exception as e:
+            # Not installed, or the encoding file can't be loaded offline
+            logger.info(f"Using approximate token counts ({type(e).__name__}: {str(e)})")
+            _tokenizer = ApproximateTokenizer()
+    return _tokenizer
+
+def count_tokens(text: Optional[str]) -> int:
+    """Number of tokens in a text"""
+    return get_tokenizer().count(text) if text else 0
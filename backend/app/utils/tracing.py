@@ -0,0 +1,324 @@
+"""
+Request tracing
+
+The timing middleware starts a root span for a sampled request and keeps the
+current span in a context variable; the handler, chain, cache and LLM layers
+open child spans with start_span. Sampling is decided once, at the root (head
+sampling): an incoming W3C traceparent header's sampled flag is honored up to
+TRACING_PARENT_SAMPLED_PER_SECOND requests a second (any client can send one),
+otherwise TRACING_SAMPLE_RATE decides. When a request is not sampled, or
+tracing is off, there is no current span and start_span returns a shared
+no-op span, so instrumented code costs one context variable lookup.
+
+A finished trace is queued for a background thread that appends it to
+TRACING_EXPORT_PATH as one line of OTLP/JSON (an ExportTraceServiceRequest),
+which the OpenTelemetry Collector's otlpjsonfile receiver and most trace
+viewers can load. Each line is a single write to an O_APPEND descriptor, so
+lines from several workers don't interleave.
+"""
+
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional, Tuple
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3}
+STATUS_CODES = {"unset": 0, "ok": 1, "error": 2}
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+def encode_value(value: Any) -> Dict[str, Any]:
+    """An OTLP AnyValue"""
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def encode_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": encode_value(value)} for key, value in attributes.items()]
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """(trace id, parent span id, sampled) from a W3C traceparent header, or None if malformed"""
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or len(parts[3]) != 2:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+        flags = int(parts[3], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+class NoopSpan:
+    """Stands in for a span when the request is not sampled"""
+    
+    __slots__ = ()
+    
+    def __enter__(self) -> "NoopSpan":
+        return self
+    
+    def __exit__(self, exc_type, exc, traceback) -> bool:
+        return False
+    
+    def set_attribute(self, key: str, value: Any):
+        pass
+    
+    def add_event(self, name: str, attributes: Optional[Dict[str, Any]] = None):
+        pass
+    
+    def record_error(self, error: Any):
+        pass
+
+NOOP_SPAN = NoopSpan()
+
+class Trace:
+    """The spans of one sampled request, exported together when the root span ends"""
+    
+    __slots__ = ("trace_id", "root", "spans", "exporter")
+    
+    def __init__(self, trace_id: str, exporter: Optional["JsonLinesSpanExporter"]):
+        self.trace_id = trace_id
+        self.root: Optional[Span] = None
+        self.spans: List[Span] = []
+        self.exporter = exporter
+    
+    def finish(self, span: "Span"):
+        # list.append is atomic, and chain stages may finish spans on executor threads
+        self.spans.append(span)
+        # Only queues the trace; serialising and writing happen on the exporter thread
+        if span is self.root and self.exporter is not None:
+            self.exporter.export(self)
+
+class Span:
+    """A timed operation within a trace; use as a context manager to make it the current span"""
+    
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "events",
+                 "status", "status_message", "_token")
+    
+    def __init__(self, trace: Trace, name: str, parent_id: Optional[str] = None, kind: str = "internal",
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = {}
+        self.events: List[Tuple[str, int, Dict[str, Any]]] = []
+        self.status = "unset"
+        self.status_message: Optional[str] = None
+        self._token = None
+        if attributes:
+            for key, value in attributes.items():
+                self.set_attribute(key, value)
+    
+    def set_attribute(self, key: str, value: Any):
+        if value is not None:
+            self.attributes[key] = value
+    
+    def add_event(self, name: str, attributes: Optional[Dict[str, Any]] = None):
+        self.events.append((name, time.time_ns(), attributes or {}))
+    
+    def record_error(self, error: Any):
+        self.status = "error"
+        self.status_message = str(error)
+    
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            self.trace.finish(self)
+    
+    def traceparent(self) -> str:
+        return f"00-{self.trace.trace_id}-{self.span_id}-01"
+    
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+    
+    def __exit__(self, exc_type, exc, traceback) -> bool:
+        if exc is not None:
+            self.record_error(exc)
+        _current_span.reset(self._token)
+        self.end()
+        return False
+    
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": SPAN_KINDS[self.kind],
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": encode_attributes(self.attributes),
+            "status": {"code": STATUS_CODES[self.status]}
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.status_message:
+            span["status"]["message"] = self.status_message
+        if self.events:
+            span["events"] = [{"name": name, "timeUnixNano": str(at), "attributes": encode_attributes(attributes)}
+                              for name, at, attributes in self.events]
+        return span
+
+class JsonLinesSpanExporter:
+    """Appends finished traces to a file as OTLP/JSON lines from a background thread"""
+    
+    def __init__(self, path: str, service_name: str, max_queue: int = 1000):
+        self.path = path
+        self.service_name = service_name
+        self.exported = 0
+        self.failed = 0
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Trace]]" = queue.Queue(max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+    
+    def export(self, trace: Trace):
+        """Queue a finished trace; drops it rather than wait when the queue is full"""
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+    
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                self._thread.start()
+    
+    def _run(self):
+        fd = None
+        while True:
+            trace = self._queue.get()
+            try:
+                if trace is None:
+                    break
+                fd = self._write(fd, trace)
+            finally:
+                self._queue.task_done()
+        if fd is not None:
+            os.close(fd)
+    
+    def _write(self, fd: Optional[int], trace: Trace) -> Optional[int]:
+        resource = {"service.name": self.service_name, "process.pid": os.getpid()}
+        request = {"resourceSpans": [{
+            "resource": {"attributes": encode_attributes(resource)},
+            "scopeSpans": [{"scope": {"name": "multi-chatbot"}, "spans": [span.to_otlp() for span in list(trace.spans)]}]
+        }]}
+        line = (json.dumps(request, separators=(",", ":")) + "\n").encode("utf-8")
+        try:
+            if fd is None:
+                fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            # One write per line: O_APPEND places it at the end of the file atomically
+            written = os.write(fd, line)
+            if written != len(line):
+                raise OSError(f"short write ({written} of {len(line)} bytes)")
+            self.exported += 1
+        except OSError as e:
+            self.failed += 1
+            logger.error(f"❌ Failed to export trace {trace.trace_id}: {str(e)}")
+            if fd is not None:
+                os.close(fd)
+            fd = None
+        return fd
+    
+    def flush(self):
+        """Wait until every queued trace is written"""
+        if self._thread is not None:
+            self._queue.join()
+    
+    def close(self):
+        """Write what is queued and stop the export thread"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+
+class Tracer:
+    """Head-sampled request traces"""
+    
+    def __init__(self, sample_rate: float = 0.0, exporter: Optional[JsonLinesSpanExporter] = None,
+                 parent_sampled_per_second: float = 10.0):
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+        self.parent_sampled_per_second = parent_sampled_per_second
+        self._parent_window = 0
+        self._parent_sampled = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+    
+    def start_trace(self, name: str, attributes: Optional[Dict[str, Any]] = None,
+                    traceparent: Optional[str] = None) -> Optional[Span]:
+        """A root span if this request is sampled, otherwise None; enter it to make it current"""
+        if not self.enabled:
+            return None
+        parent = parse_traceparent(traceparent)
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+            if sampled and not self._allow_parent_sampled():
+                sampled = random.random() < self.sample_rate
+        else:
+            trace_id, parent_id, sampled = None, None, random.random() < self.sample_rate
+        if not sampled:
+            return None
+        trace = Trace(trace_id or os.urandom(16).hex(), self.exporter)
+        trace.root = Span(trace, name, parent_id, "server", attributes)
+        return trace.root
+    
+    def _allow_parent_sampled(self) -> bool:
+        """Whether another traceparent may force sampling this second; start_trace runs on the event loop"""
+        window = int(time.monotonic())
+        if window != self._parent_window:
+            self._parent_window, self._parent_sampled = window, 0
+        if self._parent_sampled >= self.parent_sampled_per_second:
+            return False
+        self._parent_sampled += 1
+        return True
+
+# Global tracer instance; configured at startup
+tracer = Tracer()
+
+def configure_tracing(sample_rate: float, export_path: str, service_name: str,
+                      parent_sampled_per_second: float = 10.0, export_queue: int = 1000):
+    tracer.sample_rate = sample_rate
+    tracer.parent_sampled_per_second = parent_sampled_per_second
+    tracer.exporter = JsonLinesSpanExporter(export_path, service_name, export_queue) if sample_rate > 0 else None
+    if tracer.enabled:
+        logger.info(f"✅ Tracing {sample_rate:.0%} of requests to {export_path}")
+
+def shutdown_tracing():
+    """Write the traces still queued for export"""
+    if tracer.exporter is not None:
+        tracer.exporter.close()
+
+def start_span(name: str, attributes: Optional[Dict[str, Any]] = None, kind: str = "internal"):
+    """A child of the current span, or the no-op span when the request is not traced"""
+    parent = _current_span.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(parent.trace, name, parent.span_id, kind, attributes)
+
+def current_span():
+    """The current span, or the no-op span, for adding attributes"""
+    span = _current_span.get()
+    return NOOP_SPAN if span is None else span
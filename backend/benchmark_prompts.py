@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Prompt rendering microbenchmark
+Measures prompt registry lookups, experiment assignment and the per-request cost of filling context placeholders in the system prompts
+against using the static prompt string, for no context, cached signatures and cache misses
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+# Add the app directory to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+from chatbots.prompt_templates import PromptTemplates
+from core.prompting import PromptRenderer
+from core.experiments import ExperimentVariant, PromptExperiment
+
+CONTEXTS = {
+    "no context": {"user_input": "How much sleep do I need?"},
+    "unrelated keys": {"user_input": "How much sleep do I need?", "user_id": "12345", "session_id": "abc123"},
+    "locale + expertise": {"user_input": "How much sleep do I need?", "locale": "en_gb", "expertise_level": "Advanced"}
+}
+
+def time_ns(function, number: int) -> float:
+    """Best of five runs, in nanoseconds per call"""
+    return min(timeit.repeat(function, number=number, repeat=5)) / number * 1e9
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark system prompt rendering")
+    parser.add_argument("--iterations", type=int, default=200_000)
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    lookup_ns = time_ns(lambda: PromptTemplates.get_prompt_by_type("entertainment"), args.iterations)
+    print(f"📚 Registry lookup: {lookup_ns:.0f}ns")
+    
+    prompts = {chatbot_type: PromptTemplates.get_prompt_by_type(chatbot_type) for chatbot_type in PromptTemplates.get_available_types()}
+    
+    compile_ns = time_ns(lambda: [PromptRenderer(prompt) for prompt in prompts.values()], 20) / len(prompts)
+    print(f"🔧 Compile: {compile_ns / 1000:.1f}µs per prompt (once per chatbot at startup)")
+    
+    renderer = PromptRenderer(prompts["medical"])
+    static_prompt = renderer.static_prompt
+    baseline = time_ns(lambda: static_prompt, args.iterations)
+    print(f"\n⏱️  Static prompt (baseline): {baseline:.0f}ns")
+    for name, context in CONTEXTS.items():
+        renderer.render(context)
+        cost = time_ns(lambda: renderer.render(context), args.iterations)
+        print(f"  {name:<20} {cost:7.0f}ns  (+{cost - baseline:.0f}ns)")
+    
+    # Worst case: every request has a context signature not seen before
+    uncached = PromptRenderer(prompts["medical"], cache_size=0)
+    context = CONTEXTS["locale + expertise"]
+    miss = time_ns(lambda: uncached.render(context), args.iterations // 10)
+    print(f"  {'cache miss':<20} {miss:7.0f}ns  (+{miss - baseline:.0f}ns)")
+    print(f"\n✅ Cache: {renderer.get_cache_info()}")
+    
+    experiment = PromptExperiment("bench", "medical", [
+        ExperimentVariant("control", 50), ExperimentVariant("compact", 50, PromptRenderer(prompts["medical"]))
+    ])
+    session = {"session_id": "abc123", "user_input": "How much sleep do I need?"}
+    arm = experiment.assign(session)
+    assign_ns = time_ns(lambda: experiment.assign(session), args.iterations)
+    record_ns = time_ns(lambda: experiment.record(arm, 0.8, True, 1, False, 120), args.iterations)
+    print(f"🧪 Experiment assignment: {assign_ns:.0f}ns, recording: {record_ns:.0f}ns")
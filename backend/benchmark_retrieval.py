@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Retrieval benchmarks on a synthetic corpus
+Builds Zipf-distributed text (BM25) and clustered embeddings (dense), then reports
+build time, query latency percentiles and, for dense, recall@k against exact float32 search;
+the segments benchmark measures search latency while a background merge runs
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Add the app directory to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+from retrieval.bm25 import BM25IndexBuilder, BM25Index
+from retrieval.dense import DenseIndexBuilder, DenseIndex
+from retrieval.embeddings import EmbedderSpec
+from retrieval.segments import SegmentedIndex, SegmentedIndexWriter, merge_segments
+
+def synthetic_vocabulary(size: int):
+    """Pronounceable fake words so the analyzer keeps them all"""
+    consonants, vowels = "bcdfgklmnprstvz", "aeiou"
+    words = []
+    for i in range(size):
+        word, n = "", i + size
+        while n:
+            word += consonants[n % len(consonants)] + vowels[(n // len(consonants)) % len(vowels)]
+            n //= len(consonants) * len(vowels)
+        words.append(word + "x")
+    return words
+
+def synthetic_passages(count: int, vocabulary, length: int, seed: int = 7):
+    """Passages whose term frequencies follow a Zipf law, like natural text"""
+    rng = np.random.default_rng(seed)
+    ranks = np.minimum(rng.zipf(1.15, size=(count, length)) - 1, len(vocabulary) - 1)
+    for row in ranks:
+        yield " ".join(vocabulary[r] for r in row)
+
+def percentiles(samples_ms):
+    samples = np.asarray(samples_ms)
+    return {p: float(np.percentile(samples, p)) for p in (50, 90, 99)}
+
+def benchmark_bm25(args, vocabulary, workdir):
+    print(f"\n🔎 BM25: {args.passages:,} passages of {args.length} terms")
+    index_path = os.path.join(workdir, "bm25")
+    
+    start_time = time.perf_counter()
+    builder = BM25IndexBuilder(index_path)
+    for text in synthetic_passages(args.passages, vocabulary, args.length):
+        builder.add(text)
+    builder.write()
+    del builder
+    print(f"  Build: {time.perf_counter() - start_time:.1f}s")
+    
+    index = BM25Index(index_path)
+    rng = np.random.default_rng(11)
+    queries = [
+        " ".join(vocabulary[r] for r in np.minimum(rng.zipf(1.3, size=args.query_terms) - 1, len(vocabulary) - 1))
+        for _ in range(args.queries)
+    ]
+    
+    for query in queries[:20]:
+        index.search_ids(query, args.top_k)  # warm page cache and per-thread scratch
+    
+    latencies = []
+    for query in queries:
+        start_time = time.perf_counter()
+        index.search(query, args.top_k)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+    
+    stats = percentiles(latencies)
+    print(f"  Query latency: p50 {stats[50]:.2f}ms, p90 {stats[90]:.2f}ms, p99 {stats[99]:.2f}ms")
+    index.close()
+
+def synthetic_embeddings(count: int, dim: int, clusters: int, rng):
+    """Unit vectors scattered around random topic centers, like real embedding spaces"""
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, size=count)] + 0.6 * rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def time_queries(search, queries):
+    latencies, results = [], []
+    for query in queries:
+        start_time = time.perf_counter()
+        results.append(search(query))
+        latencies.append((time.perf_counter() - start_time) * 1000)
+    return percentiles(latencies), results
+
+def recall_at_k(results, exact):
+    hits = sum(len({i for i, _ in found} & {i for i, _ in truth}) for found, truth in zip(results, exact))
+    return hits / max(1, sum(len(truth) for truth in exact))
+
+def benchmark_dense(args, workdir):
+    count, dim, k = args.dense_passages, args.dim, args.top_k
+    nlist = args.nlist or int(np.sqrt(count))
+    print(f"\n🧭 Dense: {count:,} vectors of {dim} dims, top-{k}")
+    rng = np.random.default_rng(5)
+    vectors = synthetic_embeddings(count, dim, max(16, count // 2000), rng)
+    queries = vectors[rng.choice(count, size=args.queries, replace=False)] + 0.3 * rng.standard_normal((args.queries, dim)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    
+    def exact_search(query):
+        scores = vectors @ query
+        top = np.argpartition(-scores, k)[:k]
+        return [(int(i), float(scores[i])) for i in top[np.argsort(-scores[top])]]
+    
+    float32_stats, exact = time_queries(exact_search, queries)
+    print(f"  float32 exact (in RAM, {vectors.nbytes / 2**20:.0f} MiB): "
+          f"p50 {float32_stats[50]:.2f}ms, p90 {float32_stats[90]:.2f}ms, p99 {float32_stats[99]:.2f}ms")
+    
+    for label, lists in (("int8 flat", 0), (f"int8 IVF nlist={nlist}", nlist)):
+        index_path = os.path.join(workdir, f"dense-{lists}")
+        start_time = time.perf_counter()
+        builder = DenseIndexBuilder(index_path, EmbedderSpec(f"hashing:{dim}", dim))
+        for start in range(0, count, 65536):
+            chunk = vectors[start:start + 65536]
+            builder.add_vectors(chunk, [""] * len(chunk))
+        builder.write(nlist=lists)
+        build_seconds = time.perf_counter() - start_time
+        
+        index = DenseIndex(index_path, nprobe=args.nprobe, embedder=EmbedderSpec(f"hashing:{dim}", dim))
+        for query in queries[:20]:
+            index.search_vector(query, k)  # warm page cache
+        stats, results = time_queries(lambda query: index.search_vector(query, k), queries)
+        size_mib = os.path.getsize(os.path.join(index_path, "vectors.npy")) / 2**20
+        probe = f", nprobe={args.nprobe}" if lists else ""
+        print(f"  {label} (mmap, {size_mib:.0f} MiB, build {build_seconds:.1f}s{probe}): "
+              f"recall@{k} {recall_at_k(results, exact):.3f}, "
+              f"p50 {stats[50]:.2f}ms, p90 {stats[90]:.2f}ms, p99 {stats[99]:.2f}ms")
+        index.close()
+
+def benchmark_segments(args, vocabulary, workdir):
+    base, deltas, delta_size = args.segment_passages, args.delta_segments, args.delta_passages
+    print(f"\n🧱 Segments: {base:,}-passage base + {deltas} x {delta_size:,}-passage deltas, merged in the background")
+    path = os.path.join(workdir, "segments")
+    writer = SegmentedIndexWriter(path, "bm25")
+    passages = synthetic_passages(base + deltas * delta_size, vocabulary, args.length)
+    start_time = time.perf_counter()
+    writer.add_segment({"text": next(passages), "source": f"doc{i // 20}"} for i in range(base))
+    for d in range(deltas):
+        offset = base + d * delta_size
+        writer.add_segment({"text": next(passages), "source": f"doc{(offset + i) // 20}"} for i in range(delta_size))
+    print(f"  Build: {time.perf_counter() - start_time:.1f}s")
+    
+    index = SegmentedIndex(path)
+    index.start_maintenance(interval=0.2)
+    rng = np.random.default_rng(13)
+    queries = [
+        " ".join(vocabulary[r] for r in np.minimum(rng.zipf(1.3, size=args.query_terms) - 1, len(vocabulary) - 1))
+        for _ in range(args.queries)
+    ]
+    for query in queries[:20]:
+        index.search(query, args.top_k)
+    
+    def measure(label, keep_going=None):
+        latencies, rounds, segments = [], 0, len(index.snapshot.parts)
+        while True:
+            for query in queries:
+                start = time.perf_counter()
+                index.search(query, args.top_k)
+                latencies.append((time.perf_counter() - start) * 1000)
+            rounds += 1
+            if keep_going is None or not keep_going():
+                break
+        stats = percentiles(latencies)
+        print(f"  {label} ({segments} segments, {len(latencies):,} queries): "
+              f"p50 {stats[50]:.2f}ms, p90 {stats[90]:.2f}ms, p99 {stats[99]:.2f}ms")
+    
+    measure("Before merge")
+    merge = multiprocessing.get_context("spawn").Process(target=merge_segments, args=(path, "bm25", 1, True))
+    start_time = time.perf_counter()
+    merge.start()
+    measure("During merge", keep_going=merge.is_alive)
+    merge.join()
+    print(f"  Merge took {time.perf_counter() - start_time:.1f}s")
+    time.sleep(0.5)  # let the maintenance thread swap to the merged snapshot
+    measure("After merge")
+    index.close()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the retrieval indexes")
+    parser.add_argument("--passages", type=int, default=1_000_000)
+    parser.add_argument("--length", type=int, default=60, help="Terms per passage")
+    parser.add_argument("--vocabulary", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--query-terms", type=int, default=5)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--backend", choices=["bm25", "dense", "segments", "all"], default="all")
+    parser.add_argument("--dense-passages", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--nlist", type=int, default=0, help="IVF lists (default sqrt(passages))")
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--segment-passages", type=int, default=200_000, help="Base segment size")
+    parser.add_argument("--delta-segments", type=int, default=4)
+    parser.add_argument("--delta-passages", type=int, default=5_000)
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    vocabulary = synthetic_vocabulary(args.vocabulary)
+    workdir = tempfile.mkdtemp(prefix="retrieval-bench-")
+    try:
+        if args.backend in ("bm25", "all"):
+            benchmark_bm25(args, vocabulary, workdir)
+        if args.backend in ("dense", "all"):
+            benchmark_dense(args, workdir)
+        if args.backend in ("segments", "all"):
+            benchmark_segments(args, vocabulary, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Offline builder for the FAQ answer store
+Reads question/answer JSONL ({"chatbot_type": ..., "question": ..., "answer": ...}) and writes
+the store served by the chatbots without calling the LLM (set FAQ_STORE_PATH to it)
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+# Add the app directory to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+from retrieval.faq import FAQStore, build_faq_store
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build the FAQ answer store")
+    parser.add_argument("--input", required=True, action="append", help="Question/answer JSONL (repeatable)")
+    parser.add_argument("--output", required=True, help="Where to write the store")
+    parser.add_argument("--chatbot-type", help="Chatbot type for records that do not name one")
+    return parser.parse_args()
+
+def read_records(paths):
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"{path}:{line_number}: invalid JSON ({e})")
+
+if __name__ == "__main__":
+    args = parse_args()
+    store_data = build_faq_store(read_records(args.input), args.chatbot_type)
+    
+    tmp_path = args.output + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(store_data, f, ensure_ascii=False)
+    os.replace(tmp_path, args.output)
+    
+    for chatbot_type, entries in store_data["chatbots"].items():
+        print(f"  ✅ {chatbot_type}: {len(entries)} questions")
+    
+    # Sanity check: every stored question must hit its own answer quickly
+    store = FAQStore.load(args.output)
+    start_time = time.perf_counter()
+    lookups = 0
+    for chatbot_type, entries in store_data["chatbots"].items():
+        for entry in entries:
+            assert store.lookup(chatbot_type, entry["question"]) is not None
+            lookups += 1
+    if lookups:
+        print(f"⚡ Lookup latency: {(time.perf_counter() - start_time) * 1000 / lookups:.3f}ms")
+    print(f"✅ FAQ store written to {args.output}")
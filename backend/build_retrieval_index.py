@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Offline builder for a chatbot's retrieval index (BM25 or dense)
+Reads passage JSONL ({"text": ..., "source": ...}) and writes an index directory;
+place it at <RETRIEVAL_INDEX_DIR>/<chatbot_type>/<backend> to ground that chatbot's answers
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+# Add the app directory to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+from retrieval.bm25 import BM25Index, build_bm25_index
+from retrieval.dense import DenseIndex, build_dense_index
+from retrieval.embeddings import create_embedder
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build a retrieval index")
+    parser.add_argument("--input", required=True, action="append", help="Passage JSONL (repeatable)")
+    parser.add_argument("--output", required=True, help="Index directory, e.g. indexes/medical/bm25")
+    parser.add_argument("--backend", choices=["bm25", "dense"], default="bm25")
+    parser.add_argument("--k1", type=float, default=1.2)
+    parser.add_argument("--b", type=float, default=0.75)
+    parser.add_argument("--embedder", default="hashing:256", help="Dense embedder, e.g. sentence-transformers:all-MiniLM-L6-v2")
+    parser.add_argument("--nlist", type=int, default=0, help="IVF lists for dense indexes (0 = exhaustive scan)")
+    return parser.parse_args()
+
+def read_passages(paths):
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+if __name__ == "__main__":
+    args = parse_args()
+    
+    start_time = time.perf_counter()
+    if args.backend == "dense":
+        embedder = create_embedder(args.embedder)
+        count = build_dense_index(read_passages(args.input), args.output, nlist=args.nlist, embedder=embedder)
+    else:
+        count = build_bm25_index(read_passages(args.input), args.output, k1=args.k1, b=args.b)
+    print(f"✅ Indexed {count:,} passages in {time.perf_counter() - start_time:.1f}s")
+    
+    if args.backend == "dense":
+        index = DenseIndex(args.output)
+        print(f"📝 {index.meta['dim']}-dim int8 vectors, {index.meta['nlist']} IVF lists")
+    else:
+        index = BM25Index(args.output)
+        print(f"📝 {index.meta['num_terms']:,} terms, {index.meta['num_postings']:,} postings")
+    index.close()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Offline comparison of the full and compact prompt variants
+Sends the same sampled questions to every chatbot with each variant and reports
+latency, answer validity, validator issues, output tokens and off-topic redirect compliance
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+from collections import defaultdict
+
+# Add the app directory to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+from chatbots.prompt_templates import PROMPT_VARIANTS, PromptTemplates, get_prompt_registry
+from core.chains import EnhancedChatbotChain
+from routing.intent import DEFAULT_EXAMPLES_PATH, load_examples
+from utils.tokens import count_tokens
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] if ordered else 0.0
+
+def sample_questions(examples, chatbot_type, count, rng):
+    """On-topic questions for a chatbot plus one question meant for another chatbot"""
+    on_topic = [text for text, label in examples if label == chatbot_type]
+    off_topic = [text for text, label in examples if label != chatbot_type]
+    return [(text, True) for text in rng.sample(on_topic, min(count, len(on_topic)))] + [(rng.choice(off_topic), False)]
+
+def summarize(records):
+    durations = [r["duration"] for r in records]
+    answered = [r for r in records if r["success"]]
+    off_topic = [r for r in answered if not r["on_topic"]]
+    return {
+        "requests": len(records),
+        "success_rate": len(answered) / len(records) if records else 0.0,
+        "valid_rate": sum(r["valid"] for r in answered) / len(answered) if answered else 0.0,
+        "issues_per_answer": sum(r["issues"] for r in answered) / len(answered) if answered else 0.0,
+        "p50_seconds": percentile(durations, 50),
+        "p90_seconds": percentile(durations, 90),
+        "output_tokens": sum(r["output_tokens"] for r in answered) / len(answered) if answered else 0.0,
+        "off_topic_redirect_rate": sum(r["redirected"] for r in off_topic) / len(off_topic) if off_topic else 0.0
+    }
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare the full and compact prompt variants against the LLM")
+    parser.add_argument("--examples", default=DEFAULT_EXAMPLES_PATH, help="Labeled JSONL questions to sample from")
+    parser.add_argument("--chatbot", action="append", help="Chatbot type to evaluate (repeatable; default all)")
+    parser.add_argument("--per-chatbot", type=int, default=5, help="On-topic questions per chatbot")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Also write the per-request records and summary as JSON")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    examples = load_examples(args.examples)
+    chatbot_types = args.chatbot or PromptTemplates.get_available_types()
+    registry = get_prompt_registry()
+    rng = random.Random(args.seed)
+    records = []
+    
+    for chatbot_type in chatbot_types:
+        entry = registry.get(chatbot_type)
+        chain = EnhancedChatbotChain(entry.prompt, chatbot_type, entry.compact_prompt)
+        redirect = entry.off_topic_response or ""
+        print(f"\n🔄 {chatbot_type}: {entry.token_count} → {entry.compact_token_count} prompt tokens")
+        for number, (question, on_topic) in enumerate(sample_questions(examples, chatbot_type, args.per_chatbot, rng)):
+            # Alternate which variant goes first so warm-up and rate limits don't favour one
+            variants = PROMPT_VARIANTS if number % 2 == 0 else tuple(reversed(PROMPT_VARIANTS))
+            for variant in variants:
+                result = chain.invoke_sync(question, {"prompt_variant": variant})
+                validation = result.get("validation") or {}
+                response = result.get("response") or ""
+                records.append({
+                    "chatbot_type": chatbot_type,
+                    "variant": variant,
+                    "question": question,
+                    "on_topic": on_topic,
+                    "success": result["success"],
+                    "valid": bool(validation.get("is_valid")),
+                    "issues": len(validation.get("issues", [])),
+                    "duration": result["duration"],
+                    "output_tokens": count_tokens(response),
+                    "redirected": bool(redirect) and redirect[:40].lower() in response.lower(),
+                    "error": result.get("error")
+                })
+                status = "✅" if result["success"] else "❌"
+                print(f"  {status} {variant:<8} {result['duration']:.2f}s  {question[:60]}")
+    
+    summary = {variant: summarize([r for r in records if r["variant"] == variant]) for variant in PROMPT_VARIANTS}
+    print(f"\n📊 {'metric':<26}" + "".join(f"{variant:>12}" for variant in PROMPT_VARIANTS))
+    for metric in summary[PROMPT_VARIANTS[0]]:
+        print(f"  {metric:<26}" + "".join(f"{summary[variant][metric]:>12.3f}" for variant in PROMPT_VARIANTS))
+    
+    by_chatbot = defaultdict(dict)
+    for chatbot_type in chatbot_types:
+        for variant in PROMPT_VARIANTS:
+            by_chatbot[chatbot_type][variant] = summarize([r for r in records if r["chatbot_type"] == chatbot_type and r["variant"] == variant])
+    print("\n⏱️  p50 latency and validity by chatbot (full vs compact):")
+    for chatbot_type, variants in by_chatbot.items():
+        full, compact = variants["full"], variants["compact"]
+        print(f"  {chatbot_type:<14} {full['p50_seconds']:.2f}s vs {compact['p50_seconds']:.2f}s   "
+              f"valid {full['valid_rate']:.0%} vs {compact['valid_rate']:.0%}")
+    
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "by_chatbot": by_chatbot, "records": records}, f, indent=2)
+        print(f"\n💾 Wrote {args.output}")
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Write the built-in prompts to a prompt directory
+The result is a starting point for PROMPT_DIR: edit the .md files and reload
+through POST /api/admin/prompts/reload (or let PROMPT_RELOAD_SECONDS pick them up)
+"""
+
+import argparse
+import json
+import os
+import sys
+
+# Add the app directory to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+from chatbots.prompt_templates import get_builtin_prompts, compact_prompt
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Export the built-in chatbot prompts as editable files")
+    parser.add_argument("--output", required=True, help="Prompt directory to write")
+    parser.add_argument("--compact", action="store_true", help="Also write the derived compact variants")
+    parser.add_argument("--force", action="store_true", help="Overwrite existing files")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    os.makedirs(args.output, exist_ok=True)
+    written = 0
+    for chatbot_type, prompt in get_builtin_prompts().items():
+        files = {f"{chatbot_type}.md": prompt}
+        if args.compact:
+            files[f"{chatbot_type}.compact.md"] = compact_prompt(prompt)
+        for filename, content in files.items():
+            path = os.path.join(args.output, filename)
+            if os.path.exists(path) and not args.force:
+                print(f"⏭️  Skipping existing {path}")
+                continue
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(content + "\n")
+            written += 1
+    print(f"✅ Wrote {written} prompt files to {args.output}")
+    print(f"   Add <chatbot_type>.json files such as {json.dumps({'description': '...', 'enabled': True})} to describe or disable chatbots")
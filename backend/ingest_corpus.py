@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Incremental ingestion of a chatbot's knowledge base
+Streams .txt/.md/.html files into overlapping passages, drops near-duplicates and
+appends them to the segmented retrieval indexes under <RETRIEVAL_INDEX_DIR>/<chatbot_type>;
+re-runs only process files whose content changed, and a running server picks up the
+new segments without a restart
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Add the app directory to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+from retrieval.ingest import IngestConfig, ingest_corpus
+from retrieval.segments import SegmentedIndexWriter
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Ingest a corpus into retrieval indexes")
+    parser.add_argument("--input", required=True, help="Corpus directory")
+    parser.add_argument("--output", required=True, help="Chatbot index directory, e.g. indexes/medical")
+    parser.add_argument("--backend", action="append", choices=["bm25", "dense"], help="Indexes to build (repeatable, default bm25)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--passage-words", type=int, default=200)
+    parser.add_argument("--overlap-words", type=int, default=40)
+    parser.add_argument("--dedup-threshold", type=float, default=0.8, help="Estimated Jaccard similarity treated as duplicate")
+    parser.add_argument("--embedder", default="hashing:256")
+    parser.add_argument("--merge", type=int, default=0, metavar="N", help="Merge segments down to N afterwards (0 = leave to the server)")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    config = IngestConfig(
+        passage_words=args.passage_words,
+        overlap_words=args.overlap_words,
+        dedup_threshold=args.dedup_threshold
+    )
+    
+    start_time = time.perf_counter()
+    backends = args.backend or ["bm25"]
+    stats = ingest_corpus(args.input, args.output, backends, config, args.workers, embedder_name=args.embedder)
+    print(f"📁 {stats['files']:,} files: {stats['processed']:,} processed, "
+          f"{stats['unchanged']:,} unchanged, {stats['removed']:,} removed")
+    if stats["updated"]:
+        print(f"✅ Indexed {stats['passages']:,} passages ({stats['duplicates']:,} near-duplicates dropped) "
+              f"in {time.perf_counter() - start_time:.1f}s")
+    else:
+        print("✅ Indexes are up to date")
+    
+    if args.merge:
+        for backend in backends:
+            merged = SegmentedIndexWriter(os.path.join(args.output, backend), backend).merge(max_segments=args.merge)
+            if merged:
+                print(f"🔀 Merged {backend} segments into {merged}")
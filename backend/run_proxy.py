@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Session-affinity front proxy runner
+Routes each conversation to the backend node that already holds its session
+"""
+
+import argparse
+import os
+import sys
+
+import uvicorn
+
+# Add the app directory to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+from routing.proxy import create_affinity_proxy
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Session-affinity proxy for the Multi-Chatbot Platform")
+    parser.add_argument(
+        "--node", action="append", dest="nodes",
+        help="Backend base URL, e.g. http://10.0.0.5:8000 (repeatable; defaults to AFFINITY_NODES)"
+    )
+    parser.add_argument("--host", default=os.getenv("AFFINITY_PROXY_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("AFFINITY_PROXY_PORT", "8080")))
+    parser.add_argument("--virtual-nodes", type=int, default=int(os.getenv("AFFINITY_VIRTUAL_NODES", "160")))
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    nodes = args.nodes or [node.strip() for node in os.getenv("AFFINITY_NODES", "").split(",")]
+    proxy = create_affinity_proxy(nodes, virtual_nodes=args.virtual_nodes)
+    
+    print(f"Starting affinity proxy on http://{args.host}:{args.port}")
+    print(f"Backend nodes: {', '.join(proxy.router.ring.nodes)}")
+    print(f"Routing stats: http://{args.host}:{args.port}/__affinity/stats")
+    
+    uvicorn.run(proxy, host=args.host, port=args.port, log_level="info")
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Test script for debugging aids
+Covers the slow and failed request samples, the event loop lag monitor and the profilers
+"""
+
+import sys
+import os
+import asyncio
+import threading
+import time
+
+# Add the app directory to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+os.environ.setdefault("GROQ_API_KEY", "test-key")
+
+from app.core.request_samples import RequestSamples
+from app.core.timing import StageTimer
+from app.core.loop_monitor import EventLoopMonitor
+from app.core.profiling import CPUProfiler, MemoryProfiler, collapsed_stacks
+
+def make_timer(chatbot_type="medical", text="x", **details):
+    timer = StageTimer()
+    timer.chatbot_type = chatbot_type
+    timer.add("generation", 0.5)
+    timer.add("ttft", 0.2)
+    timer.details.update(input=text, **details)
+    return timer
+
+def test_keeps_slowest_per_slot():
+    """Each slot keeps its slowest chat requests; older slots age out of the hour"""
+    samples = RequestSamples(slowest=3, slot_seconds=60, slots=5)
+    now = 6000.0
+    for i, duration in enumerate([0.5, 2.0, 0.1, 3.0, 1.0, 0.2]):
+        samples.record(make_timer(text=f"message {i}"), "POST", "/api/chatbots/medical", 200, duration, now=now + i)
+    samples.record(make_timer("legal"), "POST", "/api/chatbots/legal", 200, 0.05, now=now + 60)
+    # Non-chat requests, however slow, never take a slot
+    samples.record(make_timer(None), "GET", "/api/admin/debug/profile/cpu", 200, 30.0, now=now + 60)
+    samples.record(make_timer(None), "GET", "/api/chatbots/metrics/prometheus", 200, 5.0, now=now + 61)
+    
+    result = samples.get_samples(now=now + 60)
+    assert [sample["duration"] for sample in result["slowest"]] == [3.0, 2.0, 1.0, 0.05]
+    slowest = result["slowest"][0]
+    assert slowest["input"] == "message 3" and slowest["chatbot_type"] == "medical"
+    assert list(slowest["stages"]) == ["ttft", "generation"]
+    assert [sample["chatbot_type"] for sample in samples.get_samples(chatbot_type="legal", now=now + 60)["slowest"]] == ["legal"]
+    assert samples.get_samples(limit=2, now=now + 60)["slowest"][1]["duration"] == 2.0
+    
+    # Five minutes later the first slot has left the window
+    assert [sample["duration"] for sample in samples.get_samples(now=now + 300)["slowest"]] == [0.05]
+    assert result["errors"] == []
+    print("✅ Slowest requests are kept per slot")
+
+def test_keeps_recent_errors():
+    """Failed chats and 5xx responses go to a bounded ring, newest first"""
+    samples = RequestSamples(slowest=0, errors=2, input_chars=10)
+    samples.record(make_timer(text="a" * 50, error="Connection error", model="llama", input_tokens=5),
+                   "POST", "/api/chatbots/medical", 200, 0.1, now=1.0)
+    samples.record(make_timer(text="b"), "POST", "/api/chatbots/medical", 200, 9.0, now=2.0)
+    samples.record(make_timer(text="c"), "POST", "/api/chatbots/auto", 500, 0.2, trace_id="abc", now=3.0)
+    samples.record(make_timer(text="d", error="Timeout"), "POST", "/api/chatbots/legal", 200, 0.3, now=4.0)
+    
+    errors = samples.get_samples(now=4.0)["errors"]
+    assert [sample["input"] for sample in errors] == ["d", "c"]
+    assert errors[1]["error"] == "HTTP 500" and errors[1]["trace_id"] == "abc"
+    assert samples.get_samples(now=4.0)["slowest"] == []
+    
+    samples = RequestSamples(errors=5, input_chars=10)
+    samples.record(make_timer(text="a" * 50, error="Connection error", model="llama", input_tokens=5),
+                   "POST", "/api/chatbots/medical", 200, 0.1, now=1.0)
+    error = samples.get_samples(now=1.0)["errors"][0]
+    assert error["input"] == "a" * 10 and error["input_chars"] == 50
+    assert error["model"] == "llama" and error["input_tokens"] == 5 and error["output_tokens"] is None
+    print("✅ Recent errors are kept in a ring")
+
+def block_the_loop(seconds):
+    time.sleep(seconds)
+
+def test_loop_lag_is_measured():
+    """A blocking call shows up as lag on the next tick"""
+    monitor = EventLoopMonitor(interval=0.02)
+    
+    async def run():
+        monitor.start()
+        await asyncio.sleep(0.1)
+        block_the_loop(0.15)
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+    
+    asyncio.run(run())
+    status = monitor.get_status()
+    assert status["lag"]["count"] >= 4 and not status["running"]
+    assert 0.1 <= status["max_lag"] < 0.5, status["max_lag"]
+    assert status["blocks"] == [] and status["blocks_detected"] == 0
+    print("✅ Event loop lag is measured")
+
+def test_blocking_callbacks_get_stack_samples():
+    """In debug mode the watchdog samples the stack of the code holding the loop"""
+    monitor = EventLoopMonitor(interval=0.5, block_threshold=0.05)
+    
+    async def run():
+        monitor.start()
+        await asyncio.sleep(0.05)
+        block_the_loop(0.3)
+        await asyncio.sleep(0.05)
+        await monitor.stop()
+    
+    asyncio.run(run())
+    assert monitor.blocks_detected == 1, monitor.get_status()
+    block = monitor.get_status()["blocks"][0]
+    assert 0.25 <= block["blocked_seconds"] < 0.6
+    assert "in block_the_loop: time.sleep(seconds)" in block["stack"][-1]
+    assert any("in run: block_the_loop(0.3)" in line for line in block["stack"])
+    print("✅ Blocking callbacks are caught with a stack sample")
+
+def spin_cpu(stop):
+    total = 0
+    while not stop.is_set():
+        total += sum(range(1000))
+    return total
+
+def profile_while_busy(profiler, results):
+    time.sleep(0.05)
+    try:
+        profiler.profile(0.1)
+    except RuntimeError as e:
+        results.append(str(e))
+
+def test_cpu_profile_collapses_stacks():
+    """Busy threads show up in collapsed stacks; idle ones are left out; one profile at a time"""
+    profiler = CPUProfiler(max_seconds=5)
+    stop = threading.Event()
+    busy = threading.Thread(target=spin_cpu, args=(stop,), name="busy")
+    idle = threading.Thread(target=stop.wait, name="idle")
+    busy.start()
+    idle.start()
+    results = []
+    second = threading.Thread(target=profile_while_busy, args=(profiler, results))
+    second.start()
+    try:
+        profile = profiler.profile(0.3, interval=0.005)
+    finally:
+        stop.set()
+        busy.join()
+        idle.join()
+        second.join()
+    
+    assert profile["samples"] >= 20 and 0.3 <= profile["seconds"] < 1.0
+    lines = collapsed_stacks(profile).splitlines()
+    busy_samples = sum(int(line.rsplit(" ", 1)[1]) for line in lines if line.startswith("busy;"))
+    assert busy_samples >= profile["samples"] * 0.8, (busy_samples, profile["samples"])
+    assert any("spin_cpu (" in line and "test_debug.py" in line for line in lines)
+    assert not any(line.startswith("idle;") for line in lines)
+    assert results == ["A CPU profile is already running"]
+    assert not profiler.running
+    print("✅ CPU profiles collapse sampled stacks")
+
+def allocate_blocks(count):
+    return [bytearray(10000) for _ in range(count)]
+
+def test_memory_snapshot_diff():
+    """A diff against the baseline points at the line that allocated"""
+    profiler = MemoryProfiler(max_seconds=30)
+    try:
+        profiler.diff()
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError("diff needs a baseline")
+    
+    profiler.start(frames=5)
+    try:
+        try:
+            profiler.start()
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError("tracing already running")
+        profiler.snapshot()
+        kept = allocate_blocks(200)
+        diff = profiler.diff(limit=5)
+        top = diff["top"][0]
+        assert top["location"].endswith("test_debug.py:" + str(allocate_blocks.__code__.co_firstlineno + 1)), top
+        assert top["size_diff"] >= 200 * 10000 and top["count_diff"] >= 200
+        assert diff["tracing"] and diff["size_diff"] >= 200 * 10000
+        
+        trace = profiler.diff(key_type="traceback", limit=1)["top"][0]
+        assert trace["location"] == top["location"] and len(trace["traceback"]) > 1
+        del kept
+    finally:
+        profiler.stop()
+    assert not profiler.get_status()["tracing"] and profiler.baseline is None
+    print("✅ Memory diffs find allocation growth")
+
+if __name__ == "__main__":
+    print("🚀 Testing Debugging Aids")
+    print("=" * 50)
+    test_keeps_slowest_per_slot()
+    test_keeps_recent_errors()
+    test_loop_lag_is_measured()
+    test_blocking_callbacks_get_stack_samples()
+    test_cpu_profile_collapses_stacks()
+    test_memory_snapshot_diff()
+    print("\n🎉 All debugging aid tests passed!")
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Test script for the local fast paths that answer without calling the LLM
+Covers the off-topic short-circuit, the crisis fast path and the FAQ store
+"""
+
+import sys
+import os
+import asyncio
+import time
+
+# Add the app directory to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+# No real LLM calls are made here (the crisis test uses a fake chat model), but importing the chatbots package loads settings
+os.environ.setdefault("GROQ_API_KEY", "test-key")
+
+from app.chatbots.prompt_templates import PromptTemplates
+from app.chatbots.relevance import create_off_topic_gate
+from app.chatbots.crisis import PhraseMatcher, create_crisis_detector
+from app.routing.intent import load_examples, train_intent_classifier
+from app.retrieval.faq import FAQStore, build_faq_store
+from app.chatbots.handlers import EnhancedChatbotManager
+from app.core.chains import EnhancedChatbotChain
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+CLASSIFIER = train_intent_classifier(load_examples())
+CHATBOT_TYPES = PromptTemplates.get_available_types()
+
+def test_every_prompt_has_a_redirect():
+    """Each prompt's Off-Topic Handling section yields its canned sentence"""
+    for chatbot_type in CHATBOT_TYPES:
+        redirect = PromptTemplates.get_off_topic_response(chatbot_type)
+        assert redirect in PromptTemplates.get_prompt_by_type(chatbot_type)
+    print(f"✅ Extracted {len(CHATBOT_TYPES)} off-topic redirects")
+
+def test_enforce_mode_short_circuits_off_topic():
+    """Clearly off-topic messages get the redirect; on-topic ones go to the LLM"""
+    gate = create_off_topic_gate(CLASSIFIER, CHATBOT_TYPES, mode="enforce")
+    
+    decision = gate.check("medical", "Give me a recipe for chocolate chip cookies")
+    assert gate.should_short_circuit(decision), decision
+    assert gate.get_redirect("medical").startswith("I specialize in health")
+    
+    decision = gate.check("medical", "I have a fever and a sore throat")
+    assert not gate.should_short_circuit(decision), decision
+    
+    metrics = gate.get_metrics("medical")
+    assert metrics["checked"] == 2 and metrics["short_circuited"] == 1
+    assert metrics["short_circuit_rate"] == 0.5
+    print("✅ Enforce mode short-circuits only off-topic messages")
+
+def test_shadow_mode_tracks_accuracy():
+    """Shadow decisions never short-circuit and are scored against the LLM answer"""
+    gate = create_off_topic_gate(CLASSIFIER, CHATBOT_TYPES, mode="shadow")
+    
+    decision = gate.check("finance", "Give me a recipe for chocolate chip cookies")
+    assert decision["off_topic"] and not gate.should_short_circuit(decision)
+    gate.record_shadow_outcome("finance", decision, gate.get_redirect("finance"))
+    
+    decision = gate.check("finance", "What's the weather going to be like tomorrow?")
+    gate.record_shadow_outcome("finance", decision, "Expect sunshine and a light breeze all afternoon.")
+    
+    decision = gate.check("finance", "How do I build an emergency fund?")
+    gate.record_shadow_outcome("finance", decision, gate.get_redirect("finance"))
+    
+    metrics = gate.get_metrics("finance")
+    assert metrics["short_circuited"] == 0
+    assert metrics["shadow_agreed"] == 1
+    assert metrics["shadow_false_positives"] == 1
+    assert metrics["shadow_false_negatives"] == 1
+    assert metrics["shadow_precision"] == 0.5
+    print("✅ Shadow mode records agreement with the LLM")
+
+def test_phrase_matcher_respects_word_boundaries():
+    """Phrases match whole words, any case, straight or curly apostrophes"""
+    matcher = PhraseMatcher({"kill myself": "self_harm", "can't breathe": "emergency", "cant breathe": "emergency"})
+    assert matcher.search("Sometimes I want to KILL   myself") == ("kill myself", "self_harm")
+    assert matcher.search("I can’t breathe properly") == ("can't breathe", "emergency")
+    assert matcher.search("She is killing myselfie contests") is None
+    assert matcher.find_all("cant breathe and I could kill myself") == [
+        ("cant breathe", "emergency"), ("kill myself", "self_harm")
+    ]
+    print("✅ Phrase matcher handles boundaries, case and apostrophes")
+
+def test_crisis_detector_prioritises_self_harm():
+    """Self-harm wins over medical emergency and only configured bots are checked"""
+    detector = create_crisis_detector()
+    result = detector.detect("medical", "I took an overdose because I want to die")
+    assert result["category"] == "self_harm"
+    assert "988" in result["resources"]
+    
+    result = detector.detect("medical", "My dad has crushing chest pain")
+    assert result["category"] == "medical_emergency"
+    
+    assert detector.detect("mental_health", "I feel a bit stressed about exams") is None
+    assert not detector.handles("finance")
+    assert detector.get_metrics("medical") == {"checked": 2, "matched": 2, "self_harm": 1, "medical_emergency": 1}
+    print("✅ Crisis detector prioritises self-harm resources")
+
+def test_crisis_matching_costs_microseconds():
+    """Matching a typical message stays in the microsecond range"""
+    detector = create_crisis_detector()
+    message = "I have been feeling stressed about work and my manager keeps adding tasks every single day. " * 2
+    start_time = time.perf_counter()
+    for _ in range(10000):
+        detector.detect("mental_health", message)
+    per_message_us = (time.perf_counter() - start_time) * 1e6 / 10000
+    assert per_message_us < 100, per_message_us
+    print(f"✅ Crisis matching: {per_message_us:.1f}µs per message")
+
+INFORMATIONAL_QUESTIONS = [
+    "What are the warning signs of a heart attack?",
+    "How is epilepsy treated? My son had a seizure last year",
+    "What is the suicide rate among teens?",
+    "Is chest pain after running normal?"
+]
+
+def test_crisis_keywords_still_get_an_answer():
+    """Questions that only mention a crisis keyword get resources before a real answer; statements of intent get them at once"""
+    detector = create_crisis_detector(chatbot_types=["medical"])
+    for question in INFORMATIONAL_QUESTIONS:
+        assert detector.detect("medical", question)["immediate"] is False, question
+    assert detector.detect("medical", "I want to kill myself")["immediate"] is True
+    assert detector.detect("medical", "My dad is having a heart attack")["immediate"] is True
+    
+    manager = EnhancedChatbotManager()
+    manager.crisis_detector = detector
+    chain = EnhancedChatbotChain(PromptTemplates.get_prompt_by_type("medical"), "medical")
+    chain.llm = FakeListChatModel(responses=["Here is what to know, but consult a professional."])
+    manager.chatbots = {"medical": chain}
+    
+    for question in INFORMATIONAL_QUESTIONS:
+        response = asyncio.run(manager.chat("medical", question))
+        assert response["success"] and "short_circuit" not in response, (question, response)
+        assert response["response"].startswith(detector.resources[response["crisis"]["category"]])
+        assert "Here is what to know" in response["response"]
+    
+    response = asyncio.run(manager.chat("medical", "I want to kill myself"))
+    assert response["short_circuit"] == "crisis" and response["crisis"]["category"] == "self_harm"
+    assert "988" in response["response"] and "Here is what to know" not in response["response"]
+    print(f"✅ {len(INFORMATIONAL_QUESTIONS)} crisis-keyword questions still reach the LLM")
+
+FAQ_RECORDS = [
+    {"chatbot_type": "finance", "question": "What is an index fund?", "answer": "An index fund tracks a market index."},
+    {"chatbot_type": "finance", "question": "How does compound interest work?", "answer": "Interest earns interest over time."},
+    {"chatbot_type": "finance", "question": "what is an INDEX fund", "answer": "An index fund tracks a market index at low cost."},
+    {"chatbot_type": "career", "question": "How do I write a cover letter?", "answer": "Open with the role, then match your experience to it."}
+]
+
+def test_faq_builder_merges_duplicate_questions():
+    """Questions that normalise the same collapse into one entry, last answer wins"""
+    store_data = build_faq_store(FAQ_RECORDS)
+    finance = store_data["chatbots"]["finance"]
+    assert len(finance) == 2
+    assert finance[0]["answer"] == "An index fund tracks a market index at low cost."
+    assert finance[0]["aliases"] == []
+    print("✅ FAQ builder merges duplicate questions")
+
+def test_faq_store_exact_and_ngram_hits():
+    """Exact, near-duplicate and unrelated questions behave as expected"""
+    store = FAQStore(build_faq_store(FAQ_RECORDS)["chatbots"], min_similarity=0.85)
+    
+    hit = store.lookup("finance", "what is an index fund")
+    assert hit["match"] == "exact" and hit["similarity"] == 1.0
+    
+    hit = store.lookup("finance", "How does compound interest works?")
+    assert hit["match"] == "ngram" and hit["answer"] == "Interest earns interest over time."
+    
+    assert store.lookup("finance", "Should I buy a house or keep renting?") is None
+    assert store.lookup("career", "What is an index fund?") is None
+    assert not store.handles("medical")
+    
+    metrics = store.get_metrics("finance")
+    assert metrics["lookups"] == 3 and metrics["exact_hits"] == 1 and metrics["ngram_hits"] == 1
+    print("✅ FAQ store serves exact and near-duplicate questions")
+
+def test_faq_fuzzy_hits_keep_polarity():
+    """Near-duplicates that flip a negation or a content word fall through to the LLM"""
+    store = FAQStore(build_faq_store([
+        {"chatbot_type": "finance", "question": "Should I pay off my credit card debt first?", "answer": "Yes, high-interest debt first."},
+        {"chatbot_type": "medical", "question": "Is it safe to take ibuprofen with alcohol?", "answer": "No, it raises the risk of stomach bleeding."}
+    ])["chatbots"], min_similarity=0.85)
+    
+    assert store.lookup("finance", "Should I not pay off my credit card debt first?") is None
+    assert store.lookup("finance", "Shouldn't I pay off my credit card debt first?") is None
+    assert store.lookup("medical", "Is it safe to take ibuprofen without alcohol?") is None
+    assert store.lookup("medical", "Is it unsafe to take ibuprofen with alcohol?") is None
+    
+    hit = store.lookup("finance", "should i pay off my credit cards debt first")
+    assert hit["match"] == "ngram" and hit["answer"] == "Yes, high-interest debt first."
+    print("✅ FAQ fuzzy hits keep polarity")
+
+def test_faq_lookup_is_fast():
+    """A lookup over a few hundred questions stays far under 10ms"""
+    records = [
+        {"chatbot_type": "finance", "question": f"Question number {i} about budgeting topic {i * 7}", "answer": f"Answer {i}"}
+        for i in range(500)
+    ]
+    store = FAQStore(build_faq_store(records)["chatbots"])
+    start_time = time.perf_counter()
+    for i in range(200):
+        store.lookup("finance", f"question number {i} about budgeting topics {i * 7}")
+    per_lookup_ms = (time.perf_counter() - start_time) * 1000 / 200
+    assert per_lookup_ms < 10, per_lookup_ms
+    print(f"✅ FAQ lookup: {per_lookup_ms:.3f}ms")
+
+if __name__ == "__main__":
+    print("🚀 Testing Local Fast Paths")
+    print("=" * 50)
+    test_every_prompt_has_a_redirect()
+    test_enforce_mode_short_circuits_off_topic()
+    test_shadow_mode_tracks_accuracy()
+    test_phrase_matcher_respects_word_boundaries()
+    test_crisis_detector_prioritises_self_harm()
+    test_crisis_matching_costs_microseconds()
+    test_crisis_keywords_still_get_an_answer()
+    test_faq_builder_merges_duplicate_questions()
+    test_faq_store_exact_and_ngram_hits()
+    test_faq_fuzzy_hits_keep_polarity()
+    test_faq_lookup_is_fast()
+    print("\n🎉 All fast path tests passed!")
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Test script for passive chatbot health, canaries and SLOs
+Covers traffic-based status, probe fallback, readiness, the canary loop, rate limiting and burn rates
+"""
+
+import sys
+import os
+import asyncio
+import time
+
+# Add the app directory to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+os.environ.setdefault("GROQ_API_KEY", "test-key")
+
+from app.chatbots.health import HealthMonitor
+from app.chatbots.canary import CanaryScheduler, canary_prompts_from_examples
+from app.core.ratelimit import TokenBucket
+from app.core.slo import SLOTracker
+from app.core.chains import ChatbotChainMetrics, EnhancedChatbotChain, brownout_policy
+from app.chatbots.prompt_templates import PromptTemplates
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+class FakeChatbot:
+    """Just enough of EnhancedChatbotChain for the health monitor"""
+    
+    def __init__(self, chatbot_type, succeed=True):
+        self.chatbot_type = chatbot_type
+        self.metrics = ChatbotChainMetrics()
+        self.succeed = succeed
+        self.calls = 0
+        self.inputs = []
+    
+    async def invoke(self, user_input, context=None, synthetic=False):
+        self.calls += 1
+        self.inputs.append(user_input)
+        if not synthetic:
+            self.metrics.record_invocation(self.chatbot_type, 0.01, self.succeed)
+        return {"success": self.succeed, "duration": 0.01, "error": None if self.succeed else "Connection error"}
+
+def test_status_from_recent_traffic():
+    """Error rate and latency over five minutes decide the status once there is enough traffic"""
+    chatbots = {"medical": FakeChatbot("medical"), "legal": FakeChatbot("legal"), "career": FakeChatbot("career")}
+    monitor = HealthMonitor(lambda: chatbots, min_requests=5, latency_seconds=2.0)
+    for i in range(10):
+        chatbots["medical"].metrics.record_invocation("medical", 0.5, True)
+        chatbots["legal"].metrics.record_invocation("legal", 0.5, i % 2 == 0)
+        chatbots["career"].metrics.record_invocation("career", 3.0, True)
+    health = monitor.get_health()
+    assert health["chatbots"]["medical"]["status"] == "healthy"
+    assert health["chatbots"]["legal"]["status"] == "unhealthy"
+    assert health["chatbots"]["career"]["status"] == "degraded"
+    assert health["status"] == "degraded" and health["healthy"] == 1
+    print("✅ Health follows recent error rates and latency")
+
+def test_probe_fallback_and_readiness():
+    """Quiet chatbots use their last fresh probe; readiness fails only when all are unhealthy"""
+    chatbots = {"medical": FakeChatbot("medical", succeed=False)}
+    monitor = HealthMonitor(lambda: chatbots, probe_seconds=60)
+    assert monitor.get_health()["chatbots"]["medical"]["status"] == "unknown"
+    assert monitor.is_ready()
+    
+    canaries = CanaryScheduler(lambda: chatbots, 60, callbacks=[monitor.record_probe])
+    asyncio.run(canaries.probe("medical", chatbots["medical"]))
+    health = monitor.get_health()["chatbots"]["medical"]
+    assert health["status"] == "unhealthy" and "Connection error" in health["reason"]
+    assert not monitor.is_ready()
+    
+    monitor.probes["medical"]["checked_at"] -= 3 * 60 + 1
+    assert monitor.get_health()["chatbots"]["medical"]["status"] == "unknown"
+    assert not HealthMonitor(lambda: {}).is_ready()
+    print("✅ Probes cover quiet chatbots and drive readiness")
+
+def test_background_canaries_cycle():
+    """The canary loop visits every chatbot once per interval and rotates its prompts"""
+    chatbots = {name: FakeChatbot(name) for name in ("medical", "legal", "career", "finance")}
+    monitor = HealthMonitor(lambda: chatbots, probe_seconds=0.2)
+    prompts = canary_prompts_from_examples([("fever", "medical"), ("rash", "medical"), ("contract", "legal")])
+    canaries = CanaryScheduler(lambda: chatbots, 0.2, prompts=prompts, default_prompt="hi",
+                               callbacks=[monitor.record_probe])
+    
+    async def run():
+        canaries.start()
+        await asyncio.sleep(0.45)
+        await canaries.stop()
+    
+    asyncio.run(run())
+    calls = [chatbot.calls for chatbot in chatbots.values()]
+    assert min(calls) >= 1 and max(calls) <= 3, calls
+    assert set(monitor.probes) == set(chatbots)
+    assert chatbots["medical"].inputs[:2] == ["fever", "rash"]
+    assert chatbots["legal"].inputs[0] == "contract" and chatbots["career"].inputs[0] == "hi"
+    print("✅ Background canaries are spread over the interval")
+
+def test_canaries_are_rate_limited():
+    """Canaries wait for the token bucket however many chatbots there are"""
+    limiter = TokenBucket(rate=20, capacity=1)
+    chatbots = {f"bot{i}": FakeChatbot(f"bot{i}") for i in range(5)}
+    canaries = CanaryScheduler(lambda: chatbots, 0.01, limiter=limiter)
+    
+    async def run():
+        started = time.monotonic()
+        for chatbot_type, chatbot in chatbots.items():
+            await canaries.probe(chatbot_type, chatbot)
+        return time.monotonic() - started
+    
+    # One token up front, then 20 per second for the other four
+    assert asyncio.run(run()) >= 0.18
+    assert limiter.throttled == 4
+    assert sum(canaries.sent.values()) == 5
+    print("✅ Canaries respect the rate limit")
+
+def test_canaries_are_not_user_traffic():
+    """A canary feeds only its callbacks, not the chain metrics, brownout or variant counts"""
+    chain = EnhancedChatbotChain(PromptTemplates.get_prompt_by_type("medical"), "medical")
+    chain.llm = FakeListChatModel(responses=["Rest and fluids help, but consult a professional."])
+    variant_counts = dict(chain.prompt_variant_counts)
+    probes = []
+    canaries = CanaryScheduler(lambda: {"medical": chain}, 60, prompts={"medical": ["fever"]},
+                               callbacks=[lambda *result: probes.append(result)])
+    
+    asyncio.run(canaries.probe("medical", chain))
+    assert probes[0][:2] == ("medical", True)
+    assert chain.get_metrics() == {} and chain.metrics.get_tokens("medical") == (0, 0)
+    assert chain.prompt_variant_counts == variant_counts and brownout_policy.in_flight == 0
+    
+    # A zero canary rate disables canaries instead of dividing by zero
+    limiter = TokenBucket(rate=0)
+    assert limiter.try_acquire() and not limiter.try_acquire() and limiter.delay() == float("inf")
+    CanaryScheduler(lambda: {"medical": chain}, 60, limiter=limiter).start()
+    print("✅ Canaries stay out of user traffic metrics")
+
+def test_slo_burn_rates_and_alerts():
+    """Burn rate is the bad-event share over the error budget; alerts need both windows burning"""
+    tracker = SLOTracker(availability_target=0.99, latency_seconds=1.0, latency_target=0.9)
+    now = 60 * 16667 - 1.0  # End of a one-minute slot, so the 5m window spans exactly five minutes
+    # Six hours of clean traffic, then a five-minute outage
+    for minute in range(354):
+        tracker.record("medical", True, 0.5, now=now - 21600 + minute * 60)
+    for second in range(0, 300, 10):
+        tracker.record("medical", False, 0.1, now=now - 299 + second)
+    status = tracker.status("medical", now=now)
+    
+    five = status["windows"]["5m"]
+    assert five["events"] == 30 and five["availability"] == 0.0
+    assert abs(five["availability_burn_rate"] - 100.0) < 1e-9
+    assert abs(five["latency_burn_rate"] - 10.0) < 1e-9
+    assert 0 < status["windows"]["1h"]["availability_burn_rate"] < 100.0
+    assert status["error_budget_remaining_6h"]["availability"] < 0
+    assert {(alert["severity"], alert["objective"]) for alert in status["alerts"]} >= {("page", "availability")}
+    
+    quiet = tracker.status("legal", now=now)
+    assert quiet["windows"]["1h"]["events"] == 0 and quiet["alerts"] == []
+    assert quiet["error_budget_remaining_6h"] == {"availability": 1.0, "latency": 1.0}
+    
+    # Once the outage slides out of the short window, the page clears
+    later = tracker.status("medical", now=now + 600)
+    assert not any(alert["severity"] == "page" for alert in later["alerts"])
+    print("✅ SLO burn rates and alerts follow the multi-window rule")
+
+if __name__ == "__main__":
+    print("🚀 Testing Chatbot Health")
+    print("=" * 50)
+    test_status_from_recent_traffic()
+    test_probe_fallback_and_readiness()
+    test_background_canaries_cycle()
+    test_canaries_are_rate_limited()
+    test_canaries_are_not_user_traffic()
+    test_slo_burn_rates_and_alerts()
+    print("\n🎉 All chatbot health tests passed!")
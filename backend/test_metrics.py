@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Test script for latency histograms and chain metrics
+Covers bucket accuracy, sliding windows, thread safety, the per-chatbot metrics output
+per-request stage timers, the Prometheus exposition and cross-process aggregation
+"""
+
+import sys
+import os
+import multiprocessing
+import random
+import tempfile
+import threading
+
+# Add the app directory to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+os.environ.setdefault("GROQ_API_KEY", "test-key")
+
+from app.core.metrics import LogHistogram, WindowedHistogram, LatencyTracker, percentile_key
+from app.core.chains import ChatbotChainMetrics
+from app.core.prometheus import MetricsWriter
+from app.core.shared_metrics import WorkerMetricsFile, parse_records, read_worker_file, HEADER_SIZE
+from app.core.timing import (
+    StageMetrics, StageTimer, start_stage_timer, get_stage_timer, record_stage,
+    mark_request_validated, untimed
+)
+
+def exact_percentile(ordered, p):
+    return ordered[max(0, int(len(ordered) * p / 100 + 0.999999) - 1)]
+
+def test_histogram_percentiles_are_accurate():
+    """Bucketed percentiles stay within the bucket width of the exact ones"""
+    rng = random.Random(3)
+    values = [rng.lognormvariate(-1, 1) for _ in range(20000)]
+    histogram = LogHistogram()
+    for value in values:
+        histogram.record(value)
+    ordered = sorted(values)
+    for p, estimate in zip((50, 90, 99, 99.9), histogram.percentiles().values()):
+        exact = exact_percentile(ordered, p)
+        assert abs(estimate - exact) / exact < 0.025, (p, estimate, exact)
+    assert histogram.count == len(values) and histogram.max == max(values)
+    assert percentile_key(99.9) == "p999" and percentile_key(50) == "p50"
+    print("✅ Histogram percentiles are within 2.5% of exact")
+
+def test_histogram_bounds():
+    """Values outside the range land in the underflow and overflow buckets"""
+    histogram = LogHistogram()
+    histogram.record(0.0)
+    histogram.record(10000.0)
+    assert histogram.counts[0] == 1 and histogram.counts[histogram.size - 1] == 1
+    assert histogram.percentiles()["p999"] <= 10000.0
+    assert LogHistogram().percentiles() == {"p50": 0.0, "p90": 0.0, "p99": 0.0, "p999": 0.0}
+    print("✅ Out-of-range values are counted")
+
+def test_windows_expire_old_slots():
+    """Windowed summaries only include slots inside the window"""
+    window = WindowedHistogram(slot_seconds=15, slots=20)
+    for _ in range(10):
+        window.record(1.0, True, now=1000.0)
+    window.record(5.0, False, now=1100.0)
+    recent = window.summary(60, now=1100.0)
+    assert recent["count"] == 1 and recent["error_rate"] == 1.0 and abs(recent["p50"] - 5.0) < 0.1
+    five_minutes = window.summary(300, now=1100.0)
+    assert five_minutes["count"] == 11
+    # A slot reused after the ring wraps is cleared first
+    window.record(2.0, True, now=1000.0 + 300)
+    assert window.summary(300, now=1300.0)["count"] == 2
+    assert window.summary(60, now=5000.0)["count"] == 0
+    print("✅ Sliding windows drop expired slots")
+
+def test_tracker_is_thread_safe():
+    """Concurrent records are all counted"""
+    tracker = LatencyTracker()
+    
+    def worker():
+        for i in range(2000):
+            tracker.record(0.01 * (i % 7 + 1), i % 100 != 0)
+    
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    summary = tracker.summary()
+    assert summary["count"] == 8000 and summary["errors"] == 80
+    assert summary["1m"]["count"] == 8000 and summary["5m"]["count"] == 8000
+    assert 0.03 < summary["p50"] < 0.05
+    print("✅ Tracker counts concurrent records")
+
+def test_chain_metrics_output():
+    """Chain metrics keep the old keys and add latency percentiles"""
+    metrics = ChatbotChainMetrics()
+    assert metrics.get_metrics("medical") == {}
+    for duration in (0.5, 1.0, 1.5):
+        metrics.record_invocation("medical", duration, True)
+    metrics.record_invocation("medical", 2.0, False)
+    medical = metrics.get_metrics("medical")
+    assert medical["total_invocations"] == 4 and medical["successful_invocations"] == 3
+    assert abs(medical["average_duration"] - 1.25) < 1e-9 and abs(medical["total_duration"] - 5.0) < 1e-9
+    assert isinstance(medical["last_invocation"], str)
+    assert set(medical["latency"]) >= {"p50", "p90", "p99", "p999", "1m", "5m"}
+    assert medical["latency"]["1m"]["error_rate"] == 0.25
+    assert list(metrics.get_metrics()) == ["medical"]
+    print("✅ Chain metrics report percentiles and windows")
+
+def test_stage_timer_header():
+    """Stages are listed in pipeline order with millisecond durations"""
+    timer = StageTimer()
+    timer.add("generation", 0.5)
+    timer.add("validation", 0.002)
+    timer.add("generation", 0.25)
+    header = timer.server_timing(total=1.0)
+    assert header == "validation;dur=2.00, generation;dur=750.00, total;dur=1000.00", header
+    print("✅ Server-Timing lists stages in pipeline order")
+
+def test_stage_timer_context():
+    """Stages go to the current request's timer and nowhere outside a request"""
+    record_stage("prompt", 1.0)
+    assert get_stage_timer() is None
+    timer = start_stage_timer()
+    mark_request_validated()
+    record_stage("prompt", 0.125)
+    with untimed():
+        record_stage("prompt", 1.0)
+        assert get_stage_timer() is None
+    assert get_stage_timer() is timer
+    assert timer.stages["prompt"] == 0.125 and "validation" in timer.stages
+    
+    metrics = StageMetrics()
+    metrics.record("legal", timer.stages)
+    metrics.record("legal", {"prompt": 0.25})
+    summary = metrics.get_metrics("legal")
+    assert summary["prompt"]["count"] == 2 and summary["validation"]["count"] == 1
+    assert metrics.get_metrics("medical") == {}
+    print("✅ Stage timers follow the request context")
+
+def test_prometheus_exposition():
+    """Families are grouped, labels escaped and histogram buckets cumulative"""
+    tracker = LatencyTracker()
+    for value in (0.003, 0.02, 0.02, 0.4, 7.0):
+        tracker.record(value, value < 5)
+    writer = MetricsWriter()
+    for chatbot_type in ("medical", 'we"ird'):
+        labels = (("chatbot", chatbot_type),)
+        writer.counter("requests_total", "Requests", 5, labels)
+        writer.histogram("request_duration_seconds", "Latency", tracker, labels)
+    writer.gauge("in_flight_requests", "In flight", 2)
+    writer.gauge("skipped", "Not reported", None)
+    text = writer.render()
+    lines = text.splitlines()
+    
+    assert lines[0] == "# HELP chatbot_requests_total Requests" and lines[1] == "# TYPE chatbot_requests_total counter"
+    assert lines[2:4] == ['chatbot_requests_total{chatbot="medical"} 5', 'chatbot_requests_total{chatbot="we\\"ird"} 5']
+    assert text.count("# TYPE chatbot_request_duration_seconds histogram") == 1
+    buckets = {line.split("le=")[1].split('"')[1]: int(line.rsplit(" ", 1)[1])
+               for line in lines if line.startswith('chatbot_request_duration_seconds_bucket{chatbot="medical"')}
+    assert buckets["0.005"] == 1 and buckets["0.025"] == 3 and buckets["0.5"] == 4 and buckets["5.0"] == 4
+    assert buckets["10.0"] == 5 and buckets["+Inf"] == 5
+    assert 'chatbot_request_duration_seconds_count{chatbot="medical"} 5' in lines
+    assert "chatbot_in_flight_requests 2" in lines and "skipped" not in text
+    assert text.endswith("\n")
+    print("✅ Prometheus exposition is well formed")
+
+def record_in_worker(path, values, tokens):
+    """Child process body: record into a worker file as a chain would"""
+    worker_file = WorkerMetricsFile(path, 1024 * 1024)
+    tracker = LatencyTracker(worker_file.histogram("request|medical"))
+    for value in values:
+        tracker.record(value, value < 1.0)
+    counters = worker_file.counters("tokens|medical", 2)
+    counters[0] += tokens
+    counters[1] += tokens // 2
+
+def test_worker_files_add_up():
+    """Histograms and counters from separate processes sum when merged"""
+    with tempfile.TemporaryDirectory() as directory:
+        context = multiprocessing.get_context("fork")
+        workers = [
+            context.Process(target=record_in_worker, args=(os.path.join(directory, "worker-1.metrics"), [0.1, 0.2, 1.5], 100)),
+            context.Process(target=record_in_worker, args=(os.path.join(directory, "worker-2.metrics"), [0.3] * 5, 40))
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+            assert worker.exitcode == 0
+        
+        merged = {"histograms": {}, "counters": {}, "workers": []}
+        for filename in sorted(os.listdir(directory)):
+            data = read_worker_file(os.path.join(directory, filename))
+            # Only the used records are read, not the whole sparse file
+            assert HEADER_SIZE < len(data) < 4096
+            parse_records(data, merged)
+        
+        # A new worker with a reused pid must not wipe a dead worker's counts
+        try:
+            WorkerMetricsFile(os.path.join(directory, "worker-1.metrics"), 1024 * 1024)
+            assert False, "existing metrics file reopened"
+        except FileExistsError:
+            pass
+    
+    series = merged["histograms"]["request|medical"]
+    assert sum(series["counts"]) == 8 and series["errors"] == 1
+    assert abs(series["total"] - 3.3) < 1e-9
+    assert merged["counters"]["tokens|medical"] == [140, 70]
+    
+    # The in-process view of a tracker backed by a record matches what was written
+    worker_file = WorkerMetricsFile(None, 64 * 1024)
+    tracker = LatencyTracker(worker_file.histogram("request|legal"))
+    tracker.record(0.5)
+    local = {"histograms": {}, "counters": {}, "workers": []}
+    parse_records(worker_file.snapshot(), local)
+    assert sum(local["histograms"]["request|legal"]["counts"]) == tracker.summary()["count"] == 1
+    print("✅ Worker metrics files add up across processes")
+
+def test_full_worker_file_falls_back():
+    """Series that don't fit stay process-local instead of failing"""
+    worker_file = WorkerMetricsFile(None, 4096)
+    assert worker_file.histogram("request|medical") is not None
+    assert worker_file.histogram("request|legal") is None
+    counters = worker_file.counters("tokens|legal", 2)
+    counters[0] += 5
+    assert counters[0] == 5
+    print("✅ A full worker file falls back to process-local series")
+
+if __name__ == "__main__":
+    print("🚀 Testing Latency Metrics")
+    print("=" * 50)
+    test_histogram_percentiles_are_accurate()
+    test_histogram_bounds()
+    test_windows_expire_old_slots()
+    test_tracker_is_thread_safe()
+    test_chain_metrics_output()
+    test_stage_timer_header()
+    test_stage_timer_context()
+    test_prometheus_exposition()
+    test_worker_files_add_up()
+    test_full_worker_file_falls_back()
+    print("\n🎉 All latency metrics tests passed!")
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Test script for the retrieval indexes
+Covers BM25 keyword retrieval, the int8 dense index, corpus ingestion and hybrid ranking
+"""
+
+import math
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Add the app directory to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+from app.retrieval.bm25 import BM25Index, build_bm25_index
+from app.retrieval.dense import DenseIndex, DenseIndexBuilder, build_dense_index, quantize_int8
+from app.retrieval.embeddings import HashingEmbedder
+from app.retrieval.dedup import MinHasher, NearDuplicateFilter, estimate_similarity
+from app.retrieval.ingest import IngestConfig, ingest_corpus, split_passages
+from app.retrieval.segments import SegmentedIndex, SegmentedIndexWriter, read_manifest
+from app.retrieval.hybrid import HybridRetriever, LexicalReranker, RetrievalCache, reciprocal_rank_fusion
+from app.retrieval.text import analyze
+
+PASSAGES = [
+    {"text": "Fever is a temporary rise in body temperature, usually caused by an infection.", "source": "CDC"},
+    {"text": "Drink plenty of fluids and rest when you have a fever or the flu.", "source": "WHO"},
+    {"text": "An index fund tracks a market index and keeps fees low.", "source": "SEC"},
+    {"text": "Tenants can ask for their security deposit back after moving out.", "source": "HUD"},
+    {"text": "Infections caused by bacteria may need antibiotics; viral infections do not.", "source": "NIH"},
+    {"text": "Compound interest means interest is earned on previously earned interest.", "source": "Fed"}
+]
+
+def brute_force_bm25(query, k1=1.2, b=0.75):
+    """Reference BM25 scores computed directly from the passages"""
+    docs = [analyze(p["text"]) for p in PASSAGES]
+    avg_length = sum(len(d) for d in docs) / len(docs)
+    scores = {}
+    for doc_id, doc in enumerate(docs):
+        score = 0.0
+        for term in set(analyze(query)):
+            df = sum(1 for d in docs if term in d)
+            tf = doc.count(term)
+            if tf:
+                idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+                score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(doc) / avg_length))
+        if score > 0:
+            scores[doc_id] = score
+    return scores
+
+def test_bm25_matches_reference_scores():
+    """Index scores equal the textbook BM25 formula (up to float16 storage)"""
+    with tempfile.TemporaryDirectory() as path:
+        build_bm25_index(PASSAGES, path)
+        index = BM25Index(path)
+        for query in ["fever infection", "index fund fees", "security deposit tenants", "interest"]:
+            expected = brute_force_bm25(query)
+            results = index.search_ids(query, top_k=len(PASSAGES))
+            assert {doc_id for doc_id, _ in results} == set(expected), query
+            for doc_id, score in results:
+                assert abs(score - expected[doc_id]) < 0.01 * max(1.0, expected[doc_id]), (query, doc_id)
+            scores = [score for _, score in results]
+            assert scores == sorted(scores, reverse=True)
+        index.close()
+    print("✅ BM25 scores match the reference implementation")
+
+def test_bm25_returns_passages_with_sources():
+    """Search returns stored text and source; unknown terms return nothing"""
+    with tempfile.TemporaryDirectory() as path:
+        build_bm25_index(PASSAGES, path)
+        index = BM25Index(path)
+        results = index.search("What should I do about a fever?", top_k=2)
+        assert {r["source"] for r in results} == {"WHO", "CDC"}
+        assert "fever" in results[0]["text"].lower()
+        assert index.search("zzzz qqqq", top_k=3) == []
+        index.close()
+    print("✅ BM25 search returns passages with sources")
+
+def test_bm25_postings_cap_keeps_best_postings():
+    """Capping postings per term keeps the highest-impact passages"""
+    with tempfile.TemporaryDirectory() as path:
+        passages = [{"text": "fever " * (1 + i % 5) + f"filler{i}", "source": str(i)} for i in range(200)]
+        build_bm25_index(passages, path)
+        exact = BM25Index(path).search_ids("fever", top_k=5)
+        capped = BM25Index(path, max_postings_per_term=10).search_ids("fever", top_k=5)
+        assert [score for _, score in capped] == [score for _, score in exact]
+    print("✅ Impact-ordered postings survive the per-term cap")
+
+def test_int8_quantization_preserves_inner_products():
+    """Dequantized int8 vectors score within a small error of float32"""
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((100, 64)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    codes, scales = quantize_int8(vectors)
+    assert codes.dtype == np.int8
+    query = vectors[0]
+    error = np.abs((codes.astype(np.float32) @ query) * scales - vectors @ query).max()
+    assert error < 0.02, error
+    print("✅ int8 quantization preserves inner products")
+
+def test_dense_index_flat_and_ivf_search():
+    """Exhaustive and IVF search find a query's own vector; probing every list matches a full scan"""
+    rng = np.random.default_rng(1)
+    embedder = HashingEmbedder(dim=32)
+    vectors = rng.standard_normal((2000, 32)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    with tempfile.TemporaryDirectory() as root:
+        for nlist in (0, 16):
+            path = os.path.join(root, str(nlist))
+            builder = DenseIndexBuilder(path, embedder)
+            builder.add_vectors(vectors, [f"passage {i}" for i in range(len(vectors))])
+            builder.write(nlist=nlist)
+            index = DenseIndex(path, nprobe=4)
+            assert index.meta["nlist"] == nlist
+            for i in (0, 17, 1999):
+                assert index.search_vector(vectors[i], top_k=1)[0][0] == i
+            found = {i for i, _ in index.search_vector(vectors[5], top_k=10, nprobe=nlist or None)}
+            assert len(found & set(np.argsort(-(vectors @ vectors[5]))[:10].tolist())) >= 9
+            index.close()
+    print("✅ Dense index finds nearest vectors (flat and IVF)")
+
+def test_dense_index_text_search():
+    """Text queries are embedded with the index's own embedder"""
+    with tempfile.TemporaryDirectory() as path:
+        build_dense_index(PASSAGES, path)
+        index = DenseIndex(path)
+        assert index.meta["embedder"] == "hashing:256"
+        results = index.search("security deposit for tenants", top_k=1)
+        assert results[0]["source"] == "HUD"
+        assert index.search("compound interest", top_k=1)[0]["source"] == "Fed"
+        index.close()
+    print("✅ Dense index answers text queries")
+
+def test_split_passages_overlap():
+    """Word windows overlap by the configured amount and keep the tail"""
+    words = " ".join(f"w{i}" for i in range(10))
+    passages = list(split_passages([words[:13], words[13:]], passage_words=4, overlap_words=1))
+    assert passages == ["w0 w1 w2 w3", "w3 w4 w5 w6", "w6 w7 w8 w9"]
+    assert list(split_passages(["one two"], passage_words=4, overlap_words=1)) == ["one two"]
+    print("✅ Passages overlap as configured")
+
+def test_minhash_flags_near_duplicates():
+    """Lightly edited text is a duplicate; different text is not"""
+    hasher = MinHasher()
+    base = " ".join(f"token{i}" for i in range(120))
+    edited = base.replace("token7 ", "changed ")
+    other = " ".join(f"other{i}" for i in range(120))
+    assert estimate_similarity(hasher.signature(base), hasher.signature(edited)) > 0.85
+    assert estimate_similarity(hasher.signature(base), hasher.signature(other)) < 0.2
+    duplicates = NearDuplicateFilter(threshold=0.8)
+    assert not duplicates.is_duplicate(hasher.signature(base))
+    assert duplicates.is_duplicate(hasher.signature(edited))
+    assert not duplicates.is_duplicate(hasher.signature(other))
+    print("✅ MinHash flags near-duplicates")
+
+def test_ingestion_is_incremental():
+    """Re-runs skip unchanged files and append edits as a delta segment; duplicates are dropped"""
+    with tempfile.TemporaryDirectory() as root:
+        corpus, output = os.path.join(root, "corpus"), os.path.join(root, "medical")
+        os.makedirs(corpus)
+        fever = "A fever is a temporary rise in body temperature caused by infection. " * 3
+        with open(os.path.join(corpus, "fever.md"), "w") as f:
+            f.write(f"# Fever\n{fever}")
+        with open(os.path.join(corpus, "fever-copy.txt"), "w") as f:
+            f.write(fever)
+        with open(os.path.join(corpus, "deposit.html"), "w") as f:
+            f.write("<html><style>p {}</style><p>Tenants can ask for their security deposit back.</p></html>")
+        config = IngestConfig(passage_words=50, overlap_words=10)
+        
+        stats = ingest_corpus(corpus, output, ["bm25"], config, workers=2)
+        assert (stats["processed"], stats["passages"], stats["duplicates"]) == (3, 2, 1)
+        index = SegmentedIndex(os.path.join(output, "bm25"))
+        assert index.search("security deposit", top_k=1)[0]["source"] == "deposit.html"
+        assert "style" not in index.search("security deposit", top_k=1)[0]["text"]
+        
+        stats = ingest_corpus(corpus, output, ["bm25"], config, workers=2)
+        assert (stats["processed"], stats["unchanged"], stats["updated"]) == (0, 3, False)
+        
+        with open(os.path.join(corpus, "deposit.html"), "a") as f:
+            f.write("<p>Landlords must return it within thirty days.</p>")
+        os.remove(os.path.join(corpus, "fever-copy.txt"))
+        stats = ingest_corpus(corpus, output, ["bm25"], config, workers=2)
+        assert (stats["processed"], stats["unchanged"], stats["removed"]) == (1, 1, 1)
+        # fever.md's passage was dropped as a copy of the removed file, so it is re-added
+        assert (stats["updated"], stats["segments"], stats["passages"]) == (True, 1, 2)
+        assert len(os.listdir(os.path.join(output, "ingest", "cache"))) == 2
+        
+        assert index.refresh()
+        assert len(index.snapshot.parts) == 2 and len(index) == 2
+        results = index.search("security deposit", top_k=5)
+        assert len(results) == 1 and "thirty days" in results[0]["text"]
+        assert index.search("fever", top_k=5)[0]["source"] == "fever.md"
+    print("✅ Ingestion only reprocesses changed files")
+
+def test_identical_files_keep_their_own_sources():
+    """Files with the same content share a cache entry but are cited by their own path"""
+    with tempfile.TemporaryDirectory() as root:
+        corpus, output = os.path.join(root, "corpus"), os.path.join(root, "medical")
+        os.makedirs(corpus)
+        text = "Rest and fluids help the body recover from a common cold. " * 3
+        for name in ("a.txt", "b.txt"):
+            with open(os.path.join(corpus, name), "w") as f:
+                f.write(text)
+        config = IngestConfig(passage_words=50, overlap_words=10)
+        
+        stats = ingest_corpus(corpus, output, ["bm25"], config, workers=2)
+        assert (stats["passages"], stats["duplicates"]) == (1, 1)
+        assert len(os.listdir(os.path.join(output, "ingest", "cache"))) == 1
+        index = SegmentedIndex(os.path.join(output, "bm25"))
+        assert index.search("common cold", top_k=1)[0]["source"] == "a.txt"
+        
+        os.remove(os.path.join(corpus, "b.txt"))
+        ingest_corpus(corpus, output, ["bm25"], config, workers=2)
+        assert index.refresh()
+        assert [p["source"] for p in index.search("common cold", top_k=5)] == ["a.txt"]
+    print("✅ Identical files keep their own sources")
+
+def test_rewriting_the_kept_copy_restores_duplicates():
+    """When the file holding the kept copy changes, passages dropped from other files come back"""
+    with tempfile.TemporaryDirectory() as root:
+        corpus, output = os.path.join(root, "corpus"), os.path.join(root, "medical")
+        os.makedirs(corpus)
+        text = "Rest and fluids help the body recover from a common cold. " * 3
+        with open(os.path.join(corpus, "a.txt"), "w") as f:
+            f.write(text)
+        with open(os.path.join(corpus, "b.txt"), "w") as f:
+            f.write(text.replace("Rest and", "Sleep and", 1))
+        config = IngestConfig(passage_words=50, overlap_words=10)
+        
+        stats = ingest_corpus(corpus, output, ["bm25"], config, workers=2)
+        assert (stats["passages"], stats["duplicates"]) == (1, 1)
+        
+        with open(os.path.join(corpus, "a.txt"), "w") as f:
+            f.write("Antibiotics do not work against viruses. " * 5)
+        stats = ingest_corpus(corpus, output, ["bm25"], config, workers=2)
+        assert (stats["processed"], stats["passages"], stats["duplicates"]) == (1, 2, 0)
+        index = SegmentedIndex(os.path.join(output, "bm25"))
+        assert [p["source"] for p in index.search("common cold", top_k=5)] == ["b.txt"]
+        assert index.search("antibiotics", top_k=5)[0]["source"] == "a.txt"
+    print("✅ Rewriting a kept copy restores dropped duplicates")
+
+def test_segments_update_and_merge():
+    """Delta segments supersede sources, deletions mask them and merges keep the live passages"""
+    for backend in ("bm25", "dense"):
+        with tempfile.TemporaryDirectory() as path:
+            writer = SegmentedIndexWriter(path, backend, retire_grace_seconds=0)
+            writer.add_segment([PASSAGES[0], PASSAGES[1]])
+            index = SegmentedIndex(path)
+            old_snapshot = index.snapshot
+            
+            writer.add_segment([{"text": "Fever guidance: call a doctor above 39 degrees.", "source": "CDC"}])
+            writer.add_segment([PASSAGES[3]])
+            writer.delete_sources(["WHO"])
+            assert index.search("security deposit tenants", top_k=1) == [] or backend == "dense"
+            assert index.refresh() and index.snapshot is not old_snapshot
+            sources = [(p["source"], p["text"]) for p in index.search("fever", top_k=5)]
+            assert ("CDC", "Fever guidance: call a doctor above 39 degrees.") in sources
+            assert all(source != "WHO" and "temporary rise" not in text for source, text in sources)
+            assert len(index) == 2
+            
+            merged = writer.merge(full=True)
+            assert [s["name"] for s in read_manifest(path)["segments"]] == [merged]
+            assert index.refresh() and len(index.snapshot.parts) == 1 and len(index) == 2
+            assert index.search("security deposit", top_k=1)[0]["source"] == "HUD"
+            assert sorted(n for n in os.listdir(path) if n.startswith("seg-")) == [merged]
+    print("✅ Segments update, delete and merge consistently")
+
+class StaticIndex:
+    """Index stand-in returning fixed results, optionally after a delay"""
+    
+    def __init__(self, passages, delay=0.0):
+        self.passages = passages
+        self.delay = delay
+        self.calls = 0
+    
+    def search(self, query, top_k=5):
+        self.calls += 1
+        time.sleep(self.delay)
+        return [dict(p) for p in self.passages[:top_k]]
+
+def test_reciprocal_rank_fusion():
+    """Passages found by both retrievers outrank those found by one"""
+    a, b, c = PASSAGES[0], PASSAGES[1], PASSAGES[4]
+    fused = reciprocal_rank_fusion({"bm25": [a, b], "dense": [c, b]})
+    assert fused[0]["text"] == b["text"] and fused[0]["retrievers"] == ["bm25", "dense"]
+    assert abs(fused[0]["score"] - (1 / 62 + 1 / 62)) < 1e-9
+    reranked = LexicalReranker().rerank("bacteria antibiotics", fused)
+    assert reranked[0]["source"] == "NIH"
+    print("✅ Reciprocal rank fusion and reranking order candidates")
+
+def test_hybrid_budget_and_cache():
+    """A slow index is dropped at the budget; complete results are cached per normalized query"""
+    keyword = StaticIndex([PASSAGES[0], PASSAGES[1]])
+    slow_dense = StaticIndex([PASSAGES[4]], delay=0.3)
+    cache = RetrievalCache()
+    retriever = HybridRetriever("medical", keyword, slow_dense, cache=cache, budget_ms=50)
+    start_time = time.perf_counter()
+    results = retriever.search("What is a fever?", top_k=3)
+    assert time.perf_counter() - start_time < 0.2
+    assert [r["source"] for r in results] == ["CDC", "WHO"]
+    assert retriever.get_metrics()["partial_results"] == 1
+    
+    # The slow search is still running: it is skipped, not queued behind
+    assert [r["source"] for r in retriever.search("What is a fever?", top_k=3)] == ["CDC", "WHO"]
+    assert slow_dense.calls == 1 and retriever.get_metrics()["timeouts"] == 2
+    time.sleep(0.3)
+    retriever.search("What is a fever?", top_k=3)
+    assert slow_dense.calls == 2
+    
+    fast = HybridRetriever("medical", keyword, StaticIndex([PASSAGES[4]]), cache=cache, budget_ms=500)
+    first = fast.search("What is a fever?", top_k=3)
+    assert {r["source"] for r in first} == {"CDC", "WHO", "NIH"}
+    calls = keyword.calls
+    assert fast.search("  what is a FEVER ", top_k=3) == first
+    assert keyword.calls == calls
+    assert cache.get_metrics("medical")["hits"] == 1
+    print("✅ Hybrid retrieval honours its budget and caches results")
+
+if __name__ == "__main__":
+    print("🚀 Testing Retrieval Indexes")
+    print("=" * 50)
+    test_bm25_matches_reference_scores()
+    test_bm25_returns_passages_with_sources()
+    test_bm25_postings_cap_keeps_best_postings()
+    test_int8_quantization_preserves_inner_products()
+    test_dense_index_flat_and_ivf_search()
+    test_dense_index_text_search()
+    test_split_passages_overlap()
+    test_minhash_flags_near_duplicates()
+    test_ingestion_is_incremental()
+    test_identical_files_keep_their_own_sources()
+    test_rewriting_the_kept_copy_restores_duplicates()
+    test_segments_update_and_merge()
+    test_reciprocal_rank_fusion()
+    test_hybrid_budget_and_cache()
+    print("\n🎉 All retrieval tests passed!")
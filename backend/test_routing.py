@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Test script for request routing components
+Covers the session-affinity hash ring and the local intent router
+"""
+
+import sys
+import os
+import time
+
+# Add the app directory to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+from app.routing import ConsistentHashRing, SessionAffinityRouter
+from app.routing.intent import IntentClassifier, IntentRouter, create_intent_router
+
+CHATBOT_TYPES = ['medical', 'mental_health', 'education', 'finance', 'legal', 'career', 'developer', 'entertainment']
+
+SESSIONS = [f"session-{i}" for i in range(5000)]
+
+def test_ring_is_deterministic():
+    """Same key always maps to the same node, across ring instances"""
+    ring_a = ConsistentHashRing(["node-a", "node-b", "node-c"])
+    ring_b = ConsistentHashRing(["node-c", "node-a", "node-b"])
+    assert all(ring_a.get_node(s) == ring_b.get_node(s) for s in SESSIONS)
+    print("✅ Ring placement is deterministic")
+
+def test_virtual_nodes_balance_load():
+    """Virtual nodes keep every node's share close to 1/N"""
+    nodes = [f"node-{i}" for i in range(4)]
+    ring = ConsistentHashRing(nodes, virtual_nodes=160)
+    counts = {node: 0 for node in nodes}
+    for session in SESSIONS:
+        counts[ring.get_node(session)] += 1
+    expected = len(SESSIONS) / len(nodes)
+    assert all(abs(count - expected) / expected < 0.25 for count in counts.values()), counts
+    print(f"✅ Load spread: {counts}")
+
+def test_join_and_leave_move_few_sessions():
+    """Adding or removing one node only remaps roughly its own share"""
+    ring = ConsistentHashRing(["node-a", "node-b", "node-c"])
+    before = {s: ring.get_node(s) for s in SESSIONS}
+    
+    ring.add_node("node-d")
+    after_join = {s: ring.get_node(s) for s in SESSIONS}
+    moved = [s for s in SESSIONS if before[s] != after_join[s]]
+    assert all(after_join[s] == "node-d" for s in moved)
+    assert len(moved) / len(SESSIONS) < 0.4
+    
+    ring.remove_node("node-d")
+    assert {s: ring.get_node(s) for s in SESSIONS} == before
+    print(f"✅ Join moved {len(moved)}/{len(SESSIONS)} sessions, leave restored placement")
+
+def test_router_counts_affinity_misses():
+    """Failover away from a down node is counted as a miss and a session move"""
+    router = SessionAffinityRouter(["node-a", "node-b"], down_cooldown=60)
+    session = "session-42"
+    affine = router.route(session)
+    assert router.route(session) == affine
+    
+    router.mark_down(affine)
+    fallback = router.route(session)
+    assert fallback != affine
+    
+    stats = router.get_stats()
+    assert stats["total_requests"] == 3
+    assert stats["affine_requests"] == 2
+    assert stats["affinity_misses"] == 1
+    assert stats["session_moves"] == 1
+    assert stats["nodes"][affine] == "down"
+    print(f"✅ Router stats: miss rate {stats['affinity_miss_rate']:.2f}")
+
+def test_router_without_session_round_robins():
+    """Requests without a session id are spread and counted as unaffined"""
+    router = SessionAffinityRouter(["node-a", "node-b"])
+    chosen = {router.route(None) for _ in range(4)}
+    assert chosen == {"node-a", "node-b"}
+    assert router.get_stats()["unaffined_requests"] == 4
+    print("✅ Session-less requests are round-robined")
+
+def test_intent_router_picks_obvious_bots():
+    """Clear-cut messages go to the right chatbot"""
+    router = create_intent_router(CHATBOT_TYPES)
+    cases = {
+        "I have a fever and a bad cough": "medical",
+        "I feel anxious and overwhelmed all the time": "mental_health",
+        "How do I start investing in index funds?": "finance",
+        "My landlord won't return my security deposit": "legal",
+        "How do I prepare for a job interview?": "career",
+        "Why does my Python code throw a TypeError?": "developer",
+        "Recommend a good horror movie": "entertainment",
+        "Can you explain photosynthesis?": "education"
+    }
+    for message, expected in cases.items():
+        result = router.route(message)
+        assert result["chatbot_type"] == expected, (message, result)
+        assert 0.0 < result["confidence"] <= 1.0
+    print(f"✅ Intent router classified {len(cases)} messages correctly")
+
+def test_intent_router_confidence_floor():
+    """Greetings and gibberish fall below the floor and go to the fallback, or ask to clarify"""
+    router = create_intent_router(CHATBOT_TYPES, min_confidence=0.25)
+    for message in ["hello", "thanks", "asdf qwerty"]:
+        result = router.route(message)
+        assert result["chatbot_type"] is None and result["low_confidence"], (message, result)
+        assert len(result["alternatives"]) == 3 and result["confidence"] < 0.25
+    assert router.route("Recommend a good horror movie")["chatbot_type"] == "entertainment"
+    
+    router = create_intent_router(CHATBOT_TYPES, min_confidence=0.25, fallback_type="education")
+    assert router.route("hello")["chatbot_type"] == "education"
+    # A fallback that is disabled or unknown is not routed to
+    router.set_chatbot_types([t for t in CHATBOT_TYPES if t != "education"])
+    assert router.route("hello")["chatbot_type"] is None
+    assert create_intent_router(CHATBOT_TYPES, min_confidence=0.25, fallback_type="astrology").route("hello")["chatbot_type"] is None
+    
+    result = IntentRouter(router.classifier, chatbot_types=[]).route("I have a fever")
+    assert result["chatbot_type"] is None and result["alternatives"] == [] and result["confidence"] == 0.0
+    print("✅ Low-confidence messages fall back instead of guessing")
+
+def test_intent_router_drops_disabled_types():
+    """A chatbot removed from the routable set loses to the runner-up"""
+    router = create_intent_router(CHATBOT_TYPES)
+    message = "I have a fever and a bad cough"
+    assert router.route(message)["chatbot_type"] == "medical"
+    
+    router.set_chatbot_types([t for t in CHATBOT_TYPES if t != "medical"])
+    result = router.route(message)
+    assert result["chatbot_type"] not in (None, "medical")
+    assert all(alternative["chatbot_type"] != "medical" for alternative in result["alternatives"])
+    
+    router.set_chatbot_types(CHATBOT_TYPES)
+    assert router.route(message)["chatbot_type"] == "medical"
+    print(f"✅ Disabled chatbots fall through to {result['chatbot_type']}")
+
+def test_intent_router_is_fast():
+    """Classification stays far below a millisecond per message"""
+    router = create_intent_router(CHATBOT_TYPES)
+    message = "What is the best way to pay off my credit card debt while saving for retirement?"
+    start_time = time.perf_counter()
+    for _ in range(1000):
+        router.route(message)
+    per_message_ms = (time.perf_counter() - start_time) * 1000 / 1000
+    assert per_message_ms < 1.0, per_message_ms
+    print(f"✅ Intent classification: {per_message_ms:.3f}ms per message")
+
+def test_intent_model_round_trip():
+    """A saved model predicts exactly like the original"""
+    router = create_intent_router(CHATBOT_TYPES)
+    restored = IntentClassifier.from_dict(router.classifier.to_dict())
+    message = "Suggest a board game for family night"
+    assert restored.predict(message) == router.classifier.predict(message)
+    print("✅ Intent model serialisation round-trips")
+
+if __name__ == "__main__":
+    print("🚀 Testing Routing Components")
+    print("=" * 50)
+    test_ring_is_deterministic()
+    test_virtual_nodes_balance_load()
+    test_join_and_leave_move_few_sessions()
+    test_router_counts_affinity_misses()
+    test_router_without_session_round_robins()
+    test_intent_router_picks_obvious_bots()
+    test_intent_router_confidence_floor()
+    test_intent_router_drops_disabled_types()
+    test_intent_router_is_fast()
+    test_intent_model_round_trip()
+    print("\n🎉 All routing tests passed!")
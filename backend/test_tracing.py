@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Test script for request tracing
+Covers span nesting, head sampling, traceparent propagation, the no-op path and OTLP/JSON export
+"""
+
+import sys
+import os
+import asyncio
+import contextvars
+import json
+import tempfile
+import threading
+import time
+
+# Add the app directory to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+os.environ.setdefault("GROQ_API_KEY", "test-key")
+
+from app.utils.tracing import (
+    Tracer, JsonLinesSpanExporter, NOOP_SPAN, start_span, current_span, parse_traceparent
+)
+
+def read_traces(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+def test_spans_nest_and_export_as_otlp():
+    """Child spans, including ones finished on executor threads, are exported with the root"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "traces.jsonl")
+        tracer = Tracer(1.0, JsonLinesSpanExporter(path, "test-service"))
+        
+        async def handle():
+            with tracer.start_trace("POST /api/chatbots/medical", {"http.request.method": "POST"}) as root:
+                with start_span("chatbot.chat", {"chatbot.type": "medical"}):
+                    def retrieve():
+                        with start_span("cache.lookup", {"cache.name": "retrieval"}) as span:
+                            span.set_attribute("cache.hit", False)
+                    context = contextvars.copy_context()
+                    await asyncio.get_running_loop().run_in_executor(None, context.run, retrieve)
+                    with start_span("llm.generate", kind="client") as span:
+                        span.add_event("first_token")
+                        span.set_attribute("gen_ai.usage.output_tokens", 42)
+                        current_span().set_attribute("gen_ai.usage.estimated", True)
+                root.set_attribute("http.response.status_code", 200)
+            return root
+        
+        root = asyncio.run(handle())
+        assert current_span() is NOOP_SPAN
+        tracer.exporter.flush()
+        traces = read_traces(path)
+        assert len(traces) == 1
+        resource_spans = traces[0]["resourceSpans"][0]
+        assert {"key": "service.name", "value": {"stringValue": "test-service"}} in resource_spans["resource"]["attributes"]
+        spans = {span["name"]: span for span in resource_spans["scopeSpans"][0]["spans"]}
+        assert set(spans) == {"POST /api/chatbots/medical", "chatbot.chat", "cache.lookup", "llm.generate"}
+        assert "parentSpanId" not in spans["POST /api/chatbots/medical"]
+        assert spans["chatbot.chat"]["parentSpanId"] == root.span_id
+        assert spans["cache.lookup"]["parentSpanId"] == spans["chatbot.chat"]["spanId"]
+        assert spans["llm.generate"]["kind"] == 3 and spans["llm.generate"]["events"][0]["name"] == "first_token"
+        attributes = {item["key"]: item["value"] for item in spans["llm.generate"]["attributes"]}
+        assert attributes == {"gen_ai.usage.output_tokens": {"intValue": "42"}, "gen_ai.usage.estimated": {"boolValue": True}}
+        assert len({span["traceId"] for span in spans.values()}) == 1
+        for span in spans.values():
+            assert int(span["endTimeUnixNano"]) >= int(span["startTimeUnixNano"])
+    print("✅ Spans nest across threads and export as OTLP/JSON")
+
+def test_errors_mark_span_status():
+    """An exception leaving a span marks it as an error"""
+    collected = []
+    
+    class Collector:
+        def export(self, trace):
+            collected.append({span.name: span for span in trace.spans})
+    
+    tracer = Tracer(1.0, Collector())
+    try:
+        with tracer.start_trace("GET /boom"):
+            with start_span("chatbot.chat"):
+                raise ValueError("LLM unavailable")
+    except ValueError:
+        pass
+    spans = collected[0]
+    assert spans["chatbot.chat"].to_otlp()["status"] == {"code": 2, "message": "LLM unavailable"}
+    assert spans["GET /boom"].status == "error"
+    print("✅ Errors are recorded on spans")
+
+def test_head_sampling_and_traceparent():
+    """Sampling is decided at the root; an incoming traceparent's decision wins"""
+    assert Tracer(0.0).start_trace("GET /") is None
+    assert Tracer(1.0).start_trace("GET /") is not None
+    sampled = sum(Tracer(0.25).start_trace("GET /") is not None for _ in range(4000))
+    assert 800 < sampled < 1200, sampled
+    
+    trace_id, parent_id = "4bf92f3577b34da6a3ce929d0e0e4736", "00f067aa0ba902b7"
+    assert parse_traceparent(f"00-{trace_id}-{parent_id}-01") == (trace_id, parent_id, True)
+    assert parse_traceparent("00-xyz-00f067aa0ba902b7-01") is None
+    assert parse_traceparent(f"00-{'0' * 32}-{parent_id}-01") is None
+    assert Tracer(0.01).start_trace("GET /", traceparent=f"00-{trace_id}-{parent_id}-00") is None
+    root = Tracer(0.01).start_trace("GET /", traceparent=f"00-{trace_id}-{parent_id}-01")
+    assert root.trace.trace_id == trace_id and root.parent_id == parent_id
+    assert root.traceparent().startswith(f"00-{trace_id}-{root.span_id}")
+    print("✅ Head sampling honors the rate and traceparent")
+
+def test_parent_forced_sampling_is_capped():
+    """Clients sending sampled traceparents can't force more than the cap into tracing"""
+    tracer = Tracer(1e-9, parent_sampled_per_second=3)
+    header = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+    sampled = sum(tracer.start_trace("GET /", traceparent=header) is not None for _ in range(100))
+    assert sampled == 3, sampled
+    print("✅ Parent-forced sampling is capped")
+
+def test_export_runs_off_the_caller_thread():
+    """export only queues; concurrent traces come out as whole lines and a full queue drops"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "traces.jsonl")
+        exporter = JsonLinesSpanExporter(path, "test-service")
+        tracer = Tracer(1.0, exporter)
+        
+        def emit(count):
+            for i in range(count):
+                with tracer.start_trace("GET /") as root:
+                    root.set_attribute("payload", "x" * 5000)
+        
+        threads = [threading.Thread(target=emit, args=(50,)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        exporter.close()
+        assert len(read_traces(path)) == 200 and exporter.exported == 200
+        
+        full = JsonLinesSpanExporter(path, "test-service", max_queue=1)
+        full._thread = threading.current_thread()  # never drained
+        full.export(tracer.start_trace("GET /").trace)
+        full.export(tracer.start_trace("GET /").trace)
+        assert full.dropped == 1
+    print("✅ Traces export on a background thread")
+
+def test_untraced_spans_are_noops():
+    """Without a sampled root, instrumented code gets the shared no-op span"""
+    with start_span("chatbot.chat", {"chatbot.type": "medical"}) as span:
+        span.set_attribute("cache.hit", True)
+        span.add_event("first_token")
+    assert span is NOOP_SPAN
+    
+    started = time.perf_counter()
+    for _ in range(100000):
+        with start_span("prompt") as span:
+            span.set_attribute("prompt.chars", 1)
+    per_span = (time.perf_counter() - started) / 100000
+    assert per_span < 5e-6, per_span
+    print(f"✅ Untraced spans cost {per_span * 1e9:.0f}ns")
+
+if __name__ == "__main__":
+    print("🚀 Testing Request Tracing")
+    print("=" * 50)
+    test_spans_nest_and_export_as_otlp()
+    test_errors_mark_span_status()
+    test_head_sampling_and_traceparent()
+    test_parent_forced_sampling_is_capped()
+    test_export_runs_off_the_caller_thread()
+    test_untraced_spans_are_noops()
+    print("\n🎉 All tracing tests passed!")
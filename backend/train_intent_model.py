@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Offline trainer for the local intent router
+Reads labeled JSONL ({"text": ..., "label": ...}) and writes the model used by /api/chatbots/auto
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+# Add the app directory to Python path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'app'))
+
+from routing.intent import DEFAULT_EXAMPLES_PATH, load_examples, train_intent_classifier
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train the chatbot intent classifier")
+    parser.add_argument("--examples", default=DEFAULT_EXAMPLES_PATH, help="Labeled JSONL examples")
+    parser.add_argument("--output", required=True, help="Where to write the model (set INTENT_MODEL_PATH to it)")
+    parser.add_argument("--epochs", type=int, default=30)
+    parser.add_argument("--holdout", type=float, default=0.2, help="Fraction of examples held out for evaluation")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    examples = load_examples(args.examples)
+    labels = list(dict.fromkeys(label for _, label in examples))
+    print(f"📝 Loaded {len(examples)} examples across {len(labels)} labels")
+    
+    # Evaluate on a held-out split before training on everything
+    if args.holdout > 0:
+        shuffled = list(examples)
+        random.Random(7).shuffle(shuffled)
+        split = int(len(shuffled) * (1 - args.holdout))
+        model = train_intent_classifier(shuffled[:split], labels, epochs=args.epochs)
+        held_out = shuffled[split:]
+        correct = sum(1 for text, label in held_out if model.predict(text)[0] == label)
+        print(f"🎯 Held-out accuracy: {correct}/{len(held_out)} ({correct / max(len(held_out), 1) * 100:.1f}%)")
+    
+    model = train_intent_classifier(examples, labels, epochs=args.epochs)
+    
+    start_time = time.perf_counter()
+    for text, _ in examples:
+        model.predict(text)
+    per_message_ms = (time.perf_counter() - start_time) * 1000 / len(examples)
+    print(f"⚡ Classification latency: {per_message_ms:.3f}ms per message")
+    
+    model.save(args.output)
+    print(f"✅ Model written to {args.output}")